@@ -1,66 +1,336 @@
 """
 Appraisal Agent for the Appraisal AI application.
-This module provides the AppraisalAgent class that handles property appraisal tasks.
+This module provides the AppraisalAgent class that runs the tool-calling loop
+behind the agent endpoints: the model may call tools over several steps (e.g.
+search comparables, then value the property, then draft the report) before it
+gives its final answer.
 """
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import json
-from langchain.agents import Tool
-from langchain.agents import AgentExecutor
-from langchain.memory import ConversationBufferMemory
+import time
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.services.llm_service import Message
+from app.tools.tool_context import ToolContext
+from app.tools.tool_executor import create_tool_context, execute_tool
+
+logger = logging.getLogger(__name__)
+
+# Seconds a completion is given even when the time budget is spent, so that the final answer can still be made
+MIN_COMPLETION_TIMEOUT = 5.0
+
+async def execute_tool_call(
+    tool_call: Dict[str, Any],
+    context: Optional[ToolContext] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Execute a single tool call from the LLM and return it as a tool result message.
+
+    Args:
+        tool_call: Tool call from the LLM response
+        context: Lookups shared with the other tool calls of the same request
+        timeout: Seconds the tool may run, when less than TOOL_CALL_TIMEOUT
+    """
+    function_data = tool_call.get("function", {})
+    tool_name = function_data.get("name", "")
+    tool_args = function_data.get("arguments", "{}")
+    timeout = settings.TOOL_CALL_TIMEOUT if timeout is None else max(min(timeout, settings.TOOL_CALL_TIMEOUT), 0)
+
+    try:
+        # Parse arguments
+        if isinstance(tool_args, str):
+            tool_args = json.loads(tool_args)
+
+        # Execute the tool
+        result = await asyncio.wait_for(execute_tool(tool_name, tool_args, context), timeout=timeout)
+        content = json.dumps(result)
+    except asyncio.TimeoutError:
+        content = json.dumps({"error": f"Tool {tool_name} timed out after {round(timeout, 1)} seconds"})
+    except Exception as e:
+        content = json.dumps({"error": str(e)})
+
+    return {
+        "tool_call_id": tool_call.get("id", ""),
+        "role": "tool",
+        "name": tool_name,
+        "content": content
+    }
+
+def append_tool_results(
+    messages: List[Message],
+    tool_calls: List[Dict[str, Any]],
+    tool_results: List[Dict[str, Any]]
+) -> None:
+    """Add the assistant's tool calls and their results to the conversation."""
+    # Content is empty for tool calls
+    messages.append(Message(role="assistant", content="", tool_calls=tool_calls))
+
+    for result in tool_results:
+        messages.append(Message(
+            role="tool",
+            content=result["content"],
+            name=result["name"],
+            tool_call_id=result["tool_call_id"]
+        ))
+
+def summarize_tool_results(tool_results: List[Dict[str, Any]]) -> str:
+    """Create a simple response from raw tool results when the LLM cannot summarize them."""
+    response_content = f"I've analyzed your request and gathered the following information:\n\n"
+
+    for result in tool_results:
+        try:
+            result_data = json.loads(result["content"])
+            response_content += f"**{result['name']} results:**\n"
+
+            # Format based on tool type
+            if result["name"] == "property_search":
+                properties = result_data.get("results", [])
+                response_content += f"Found {len(properties)} properties in {result_data.get('query', {}).get('location', 'the specified location')}.\n\n"
+            elif result["name"] == "market_analysis":
+                trends = result_data.get("trends", {})
+                if trends:
+                    response_content += f"Market in {trends.get('location', 'the specified location')} shows "
+                    price_change = trends.get("price_trends", {}).get("last_year", 0)
+                    response_content += f"{price_change}% price change over the last year.\n\n"
+            elif result["name"] == "valuation_calculator":
+                valuation = result_data.get("valuation", {})
+                if valuation:
+                    response_content += f"Estimated value: ${valuation.get('estimated_value', 0):,.2f}\n\n"
+                # Values by approach, as returned by the valuation engine
+                valuations = result_data.get("valuations", {})
+                for approach, value in valuations.items():
+                    response_content += f"{approach.replace('_', ' ').capitalize()} value: ${value:,.2f}\n"
+                if valuations:
+                    response_content += "\n"
+            else:
+                response_content += f"{json.dumps(result_data, indent=2)}\n\n"
+        except:
+            response_content += f"Error parsing result for {result['name']}\n\n"
+
+    return response_content
+
+def _tool_call_signature(tool_call: Dict[str, Any]) -> str:
+    """Get a key identifying a tool call by its name and arguments."""
+    function_data = tool_call.get("function", {})
+    arguments = function_data.get("arguments", "{}")
+    try:
+        arguments = json.dumps(json.loads(arguments) if isinstance(arguments, str) else arguments, sort_keys=True)
+    except (TypeError, ValueError):
+        pass
+    return f"{function_data.get('name', '')}:{arguments}"
 
 class AppraisalAgent:
     """
     Agent for handling property appraisal tasks.
-    This implementation uses langchain instead of llama_stack.
+
+    Each step sends the conversation to the LLM and runs the tool calls it asks
+    for, until the model answers without calling tools, `max_steps` completions
+    have been made or `time_budget` seconds have passed. The last completion is
+    made without tools so that the model has to answer. A tool call repeated
+    with the same arguments within a turn reuses the earlier result.
     """
-    
-    def __init__(self, tools=None):
+
+    def __init__(
+        self,
+        llm_service: Any,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        max_steps: int = 5,
+        time_budget: float = 60,
+        use_cache: Optional[bool] = None
+    ):
         """
-        Initialize the appraisal agent with the given tools.
-        
+        Initialize the appraisal agent.
+
         Args:
-            tools: List of tools available to the agent
+            llm_service: LLM service to generate completions with
+            tools: Tools available to the agent, in the OpenAI function format
+            max_steps: Maximum number of LLM completions per turn
+            time_budget: Seconds after which no further tool steps are started;
+                completions and tool calls are only given the time left
+            use_cache: Whether to use the completion cache; streamed steps only
+                use it when this is True, and then send the answer as one token
+
+        Raises:
+            ValueError: If `max_steps` is less than 1
         """
+        if max_steps < 1:
+            raise ValueError(f"The agent needs at least one step per turn, got max_steps={max_steps}")
+        self.llm_service = llm_service
         self.tools = tools or []
-        self.memory = ConversationBufferMemory(return_messages=True)
-    
-    async def run(self, query: str, property_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.max_steps = max_steps
+        self.time_budget = time_budget
+        self.use_cache = use_cache
+
+    async def run(self, messages: List[Message]) -> Dict[str, Any]:
         """
-        Run the agent on the given query.
-        
+        Run the agent on a conversation.
+
         Args:
-            query: The user query to process
-            property_data: Optional property data to include in the context
-            
+            messages: The conversation, including any system prompt; tool calls
+                and results are appended to it
+
         Returns:
-            The agent's response
+            The final `done` event of `run_steps`
+
+        Raises:
+            RuntimeError: If the loop ends without a `done` event
         """
-        # In a real implementation, this would use langchain to run the agent
-        # For now, we'll return a simple response
-        response = {
-            "response": f"I've analyzed your query about property appraisal: {query}",
-            "tool_calls": []
-        }
-        
-        if property_data:
-            response["response"] += f"\n\nBased on the property data provided, I can tell you that this is a {property_data.get('property_type', 'unknown')} property."
-        
-        return response
-    
-    def add_tool(self, tool: Tool):
+        async for event in self.run_steps(messages):
+            if event["type"] == "done":
+                return event
+        raise RuntimeError("The agent loop ended without a response")
+
+    async def run_steps(self, messages: List[Message], stream: bool = False) -> AsyncIterator[Dict[str, Any]]:
         """
-        Add a tool to the agent.
-        
+        Run the agent on a conversation, yielding events as each step happens.
+
         Args:
-            tool: The tool to add
+            messages: The conversation, including any system prompt; tool calls
+                and results are appended to it
+            stream: Whether to stream the LLM completions token by token
+
+        Yields:
+            `token` events with assistant tokens (when streaming), `tool_call_start`
+            and `tool_call_end` events around each tool call, each with its `step`,
+            and finally a `done` event with the response, all tool calls made, the
+            number of steps and whether the response is `degraded` (a summary of
+            the tool results because the LLM failed)
+
+        Raises:
+            LLMServiceError: If the first completion fails
         """
-        self.tools.append(tool)
-    
-    def get_tools(self) -> List[Tool]:
+        deadline = time.monotonic() + self.time_budget
+        context = create_tool_context()
+        all_tool_calls = []
+        all_tool_results = []
+        results_by_signature: Dict[str, Dict[str, Any]] = {}
+
+        for step in range(1, self.max_steps + 1):
+            last_step = step == self.max_steps or time.monotonic() >= deadline
+
+            message = {}
+            try:
+                timeout = max(deadline - time.monotonic(), MIN_COMPLETION_TIMEOUT)
+                async for event in self._complete(messages, [] if last_step else self.tools, stream, timeout):
+                    if event["type"] == "token":
+                        yield {"type": "token", "content": event["content"], "step": step}
+                    else:
+                        message = event["message"]
+            except Exception as e:
+                if not all_tool_results:
+                    raise
+                logger.warning(f"Agent step {step} failed, summarizing tool results: {str(e)}")
+                yield self._done(summarize_tool_results(all_tool_results), all_tool_calls, step, degraded=True)
+                return
+
+            tool_calls = [tool_call for tool_call in message.get("tool_calls") or [] if tool_call.get("type") == "function"]
+            if not tool_calls or last_step:
+                yield self._done(message.get("content"), all_tool_calls, step)
+                return
+
+            for tool_call in tool_calls:
+                yield {
+                    "type": "tool_call_start",
+                    "id": tool_call.get("id"),
+                    "name": tool_call["function"]["name"],
+                    "arguments": tool_call["function"]["arguments"],
+                    "step": step
+                }
+
+            tool_results = {}
+            async for index, result, reused in self._execute_step(tool_calls, results_by_signature, context, deadline):
+                tool_results[index] = result
+                yield {
+                    "type": "tool_call_end",
+                    "id": tool_calls[index].get("id"),
+                    "name": result["name"],
+                    "result": json.loads(result["content"]),
+                    "reused": reused,
+                    "step": step
+                }
+
+            step_results = [tool_results[index] for index in range(len(tool_calls))]
+            append_tool_results(messages, tool_calls, step_results)
+            all_tool_calls.extend(tool_calls)
+            all_tool_results.extend(step_results)
+
+    async def _complete(
+        self,
+        messages: List[Message],
+        tools: List[Dict[str, Any]],
+        stream: bool,
+        timeout: float
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Get one completion as `stream_completion` events, within `timeout` seconds."""
+        if stream and not self.use_cache:
+            async for event in self.llm_service.stream_completion(messages=messages, tools=tools, timeout=timeout):
+                yield event
+            return
+
+        response = await self.llm_service.generate_with_tools(
+            messages=messages,
+            tools=tools,
+            use_cache=self.use_cache,
+            timeout=timeout
+        )
+        choices = response.get("choices") or [{}]
+        message = choices[0].get("message") or {}
+        if stream and message.get("content"):
+            # A cached completion is streamed as a single token
+            yield {"type": "token", "content": message["content"]}
+        yield {"type": "message", "message": message, "finish_reason": choices[0].get("finish_reason")}
+
+    async def _execute_step(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        results_by_signature: Dict[str, Dict[str, Any]],
+        context: ToolContext,
+        deadline: float
+    ) -> AsyncIterator[Any]:
         """
-        Get the tools available to the agent.
-        
-        Returns:
-            List of tools
+        Execute the tool calls of a step concurrently, reusing the results of
+        calls already made this turn. Calls still running at the `deadline`
+        (monotonic time) time out.
+
+        Yields:
+            (index, result, reused) for each tool call as it finishes
         """
-        return self.tools
+        tasks: Dict[asyncio.Future, List[int]] = {}
+        scheduled: Dict[str, asyncio.Future] = {}
+        for index, tool_call in enumerate(tool_calls):
+            signature = _tool_call_signature(tool_call)
+            if signature in results_by_signature:
+                yield index, {**results_by_signature[signature], "tool_call_id": tool_call.get("id", "")}, True
+            elif signature in scheduled:
+                tasks[scheduled[signature]].append(index)
+            else:
+                scheduled[signature] = asyncio.ensure_future(
+                    execute_tool_call(tool_call, context, timeout=deadline - time.monotonic())
+                )
+                tasks[scheduled[signature]] = [index]
+
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    indexes = tasks[task]
+                    results_by_signature[_tool_call_signature(tool_calls[indexes[0]])] = task.result()
+                    for position, index in enumerate(indexes):
+                        yield index, {**task.result(), "tool_call_id": tool_calls[index].get("id", "")}, position > 0
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _done(self, response: Optional[str], tool_calls: List[Dict[str, Any]], steps: int, degraded: bool = False) -> Dict[str, Any]:
+        """Build the final event of a turn."""
+        return {
+            "type": "done",
+            "response": response,
+            "tool_calls": tool_calls,
+            "steps": steps,
+            "degraded": degraded
+        }
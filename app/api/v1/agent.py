@@ -2,14 +2,18 @@
 Agent endpoints for the Appraisal AI Agent.
 """
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
+import os
 import json
 
-from app.services.llm_service import Message
-from app.services.dependencies import get_llm_service, get_property_data_service
+from app.agents.appraisal_agent import AppraisalAgent, execute_tool_call, summarize_tool_results
+from app.services.llm_service import LLMCircuitOpenError, Message
+from app.services.dependencies import get_history_manager, get_llm_service, get_property_data_service
+from app.services.batch_service import BatchRunningError, get_batch_paths, get_batch_status, start_batch
 from app.tools.tool_registry import get_available_tools
-from app.tools.tool_executor import execute_tool
+from app.tools.tool_executor import execute_tool, invalidate_tool_results, tool_cache
 from app.core.config import settings
 
 router = APIRouter()
@@ -17,21 +21,80 @@ router = APIRouter()
 class AgentRequest(BaseModel):
     """Request model for agent interactions."""
     messages: List[Message]
+    conversation_id: Optional[str] = None
     property_id: Optional[str] = None
     project_id: Optional[str] = None
     tools_to_use: Optional[List[str]] = None
+    use_cache: Optional[bool] = None
+
+class BatchRequest(BaseModel):
+    """Request model for batch completions."""
+    batch_id: str
+    jobs: Optional[List[Dict[str, Any]]] = None
+    concurrency: int = settings.BATCH_CONCURRENCY
+
+class BatchStatusResponse(BaseModel):
+    """Response model for batch completion progress."""
+    batch_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
 
 class AgentResponse(BaseModel):
     """Response model for agent interactions."""
     response: str
     tool_calls: Optional[List[Dict[str, Any]]] = None
     property_data: Optional[Dict[str, Any]] = None
+    steps: int = 1
+    degraded: bool = False
+
+async def _degraded_response(
+    messages: List[Message],
+    property_id: Optional[str],
+    property_data: Optional[Dict[str, Any]]
+) -> str:
+    """
+    Create a response without the LLM while its circuit is open, from the tool
+    results already in the conversation and the property data. Without earlier
+    tool results, the property is valued with the valuation calculator, which
+    does not need the LLM.
+    """
+    response_content = "The AI assistant is temporarily unavailable, so this is an automatic summary of the data available.\n\n"
+    
+    tool_results = [
+        {"name": msg.name or "tool", "content": msg.content}
+        for msg in messages if msg.role == "tool"
+    ]
+    if not tool_results and property_id:
+        result = await execute_tool_call({
+            "id": "degraded_valuation",
+            "type": "function",
+            "function": {"name": "valuation_calculator", "arguments": {"property_id": property_id, "method": "all"}}
+        })
+        if "error" not in json.loads(result["content"]):
+            tool_results.append(result)
+    if tool_results:
+        response_content += summarize_tool_results(tool_results)
+    
+    if property_data:
+        response_content += f"**Property data:**\n{json.dumps(property_data, indent=2)}\n\n"
+    
+    if not tool_results and not property_data:
+        response_content += "Please try again in a few moments."
+    
+    return response_content
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @router.post("", response_model=AgentResponse)
 async def query_agent(
     request: AgentRequest,
     llm_service = Depends(get_llm_service),
-    property_service = Depends(get_property_data_service)
+    property_service = Depends(get_property_data_service),
+    history_manager = Depends(get_history_manager)
 ):
     """
     Query the appraisal AI agent.
@@ -39,9 +102,10 @@ async def query_agent(
     This endpoint processes user messages and returns AI-generated responses
     with optional tool calls for appraisal-related tasks.
     """
-    # Prepare messages with system prompt
+    # Prepare messages with system prompt, summarizing older turns of long conversations
     system_message = Message(role="system", content=settings.SYSTEM_PROMPT)
-    all_messages = [system_message] + request.messages
+    history = await history_manager.compact(request.messages, llm_service, request.conversation_id)
+    all_messages = [system_message] + history
     
     # Get available tools based on request
     tools = get_available_tools(request.tools_to_use or settings.TOOLS_ENABLED)
@@ -54,126 +118,110 @@ async def query_agent(
         except Exception as e:
             raise HTTPException(status_code=404, detail=f"Property not found: {str(e)}")
     
-    # Generate response with tools
+    agent = AppraisalAgent(
+        llm_service,
+        tools=tools,
+        max_steps=settings.AGENT_MAX_STEPS,
+        time_budget=settings.AGENT_TIME_BUDGET,
+        use_cache=request.use_cache
+    )
+    
+    # Run the agent loop of tool calls and completions
     try:
-        llm_response = await llm_service.generate_with_tools(
-            messages=all_messages,
-            tools=tools
-        )
-        
-        # Extract response and tool calls
-        choices = llm_response.get("choices", [{}])
-        if not choices:
-            raise ValueError("No choices in LLM response")
-            
-        message = choices[0].get("message", {})
-        response_content = message.get("content", "")
-        tool_calls = message.get("tool_calls", [])
-        
-        # Handle tool calls if present and content is None
-        if tool_calls and response_content is None:
-            # Execute tool calls and get results
-            tool_results = []
-            for tool_call in tool_calls:
-                if tool_call.get("type") == "function":
-                    function_data = tool_call.get("function", {})
-                    tool_name = function_data.get("name", "")
-                    tool_args = function_data.get("arguments", "{}")
-                    
-                    try:
-                        # Parse arguments
-                        if isinstance(tool_args, str):
-                            tool_args = json.loads(tool_args)
-                        
-                        # Execute the tool
-                        result = await execute_tool(tool_name, tool_args)
-                        
-                        # Add result to tool results
-                        tool_results.append({
-                            "tool_call_id": tool_call.get("id", ""),
-                            "role": "tool",
-                            "name": tool_name,
-                            "content": json.dumps(result)
-                        })
-                    except Exception as e:
-                        tool_results.append({
-                            "tool_call_id": tool_call.get("id", ""),
-                            "role": "tool",
-                            "name": tool_name,
-                            "content": json.dumps({"error": str(e)})
-                        })
-            
-            # If we have tool results, add them to messages and call LLM again
-            if tool_results:
-                # Add the assistant's message with tool calls
-                all_messages.append(Message(
-                    role="assistant",
-                    content=""  # Content is empty for tool calls
-                ))
-                
-                # Add tool results as messages
-                for result in tool_results:
-                    all_messages.append(Message(
-                        role="tool",
-                        content=result["content"],
-                        name=result["name"],
-                        tool_call_id=result["tool_call_id"]
-                    ))
-                
-                # Call LLM again to get a response based on tool results
-                try:
-                    second_response = await llm_service.generate_completion(
-                        messages=all_messages,
-                        tools=[]  # No tools for the second call
-                    )
-                    
-                    # Extract the final response
-                    second_choices = second_response.get("choices", [{}])
-                    if second_choices:
-                        second_message = second_choices[0].get("message", {})
-                        response_content = second_message.get("content", "")
-                except Exception as e:
-                    print(f"Error in second LLM call: {str(e)}")
-                    response_content = f"I've analyzed your request and gathered the following information:\n\n"
-                    
-                    # Create a simple response based on tool results
-                    for result in tool_results:
-                        try:
-                            result_data = json.loads(result["content"])
-                            response_content += f"**{result['name']} results:**\n"
-                            
-                            # Format based on tool type
-                            if result["name"] == "property_search":
-                                properties = result_data.get("results", [])
-                                response_content += f"Found {len(properties)} properties in {result_data.get('query', {}).get('location', 'the specified location')}.\n\n"
-                            elif result["name"] == "market_analysis":
-                                trends = result_data.get("trends", {})
-                                if trends:
-                                    response_content += f"Market in {trends.get('location', 'the specified location')} shows "
-                                    price_change = trends.get("price_trends", {}).get("last_year", 0)
-                                    response_content += f"{price_change}% price change over the last year.\n\n"
-                            elif result["name"] == "valuation_calculator":
-                                valuation = result_data.get("valuation", {})
-                                if valuation:
-                                    response_content += f"Estimated value: ${valuation.get('estimated_value', 0):,.2f}\n\n"
-                            else:
-                                response_content += f"{json.dumps(result_data, indent=2)}\n\n"
-                        except:
-                            response_content += f"Error parsing result for {result['name']}\n\n"
+        try:
+            result = await agent.run(all_messages)
+        except LLMCircuitOpenError:
+            return AgentResponse(
+                response=await _degraded_response(request.messages, request.property_id, property_data),
+                property_data=property_data,
+                steps=0,
+                degraded=True
+            )
         
-        # Ensure response_content is a string (not None)
+        # Ensure the response is a string (not None)
+        response_content = result["response"]
         if response_content is None:
             response_content = "I apologize, but I couldn't generate a proper response. Please try again or rephrase your question."
-            print(f"Warning: Received None response from LLM API. Full response: {llm_response}")
+            print(f"Warning: Received None response from LLM API after {result['steps']} steps")
         
         return AgentResponse(
             response=response_content,
-            tool_calls=tool_calls,
-            property_data=property_data
+            tool_calls=result["tool_calls"],
+            property_data=property_data,
+            steps=result["steps"],
+            degraded=result["degraded"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@router.post("/stream")
+async def stream_agent(
+    request: AgentRequest,
+    llm_service = Depends(get_llm_service),
+    property_service = Depends(get_property_data_service),
+    history_manager = Depends(get_history_manager)
+):
+    """
+    Query the appraisal AI agent with a streamed response.
+    
+    Returns server-sent events as they happen: `token` for assistant tokens,
+    `tool_call_start` and `tool_call_end` around each tool execution (the latter
+    carrying the tool result), each with the number of the agent step, and a
+    final `done` event with the same fields as the non-streaming endpoint.
+    Failures are reported as an `error` event. With `use_cache` set to true,
+    completions come from the completion cache when possible and are sent as a
+    single `token` event.
+    """
+    # Prepare messages with system prompt, summarizing older turns of long conversations
+    system_message = Message(role="system", content=settings.SYSTEM_PROMPT)
+    history = await history_manager.compact(request.messages, llm_service, request.conversation_id)
+    all_messages = [system_message] + history
+    
+    # Get available tools based on request
+    tools = get_available_tools(request.tools_to_use or settings.TOOLS_ENABLED)
+    
+    # Get property data if property_id is provided
+    property_data = None
+    if request.property_id:
+        try:
+            property_data = await property_service.get_property_details(request.property_id)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"Property not found: {str(e)}")
+    
+    agent = AppraisalAgent(
+        llm_service,
+        tools=tools,
+        max_steps=settings.AGENT_MAX_STEPS,
+        time_budget=settings.AGENT_TIME_BUDGET,
+        use_cache=request.use_cache
+    )
+    
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in agent.run_steps(all_messages, stream=True):
+                event_type = event.pop("type")
+                if event_type == "done":
+                    if event["response"] is None:
+                        event["response"] = "I apologize, but I couldn't generate a proper response. Please try again or rephrase your question."
+                    event["property_data"] = property_data
+                yield _sse_event(event_type, event)
+        except LLMCircuitOpenError:
+            yield _sse_event("done", {
+                "response": await _degraded_response(request.messages, request.property_id, property_data),
+                "tool_calls": [],
+                "steps": 0,
+                "property_data": property_data,
+                "degraded": True
+            })
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"Error generating response: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/execute-tool")
 async def execute_tool_endpoint(
     tool_call: Dict[str, Any],
@@ -195,3 +243,89 @@ async def execute_tool_endpoint(
         return {"tool_id": tool_id, "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error executing tool {tool_name}: {str(e)}")
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    llm_service = Depends(get_llm_service)
+):
+    """
+    Get hit/miss metrics for the LLM completion cache.
+    """
+    if llm_service.cache is None:
+        return {"enabled": False}
+    
+    return {"enabled": True, **llm_service.cache.stats()}
+
+@router.get("/tools/cache/stats")
+async def get_tool_cache_stats():
+    """
+    Get hit/miss metrics for the tool result cache.
+    """
+    return tool_cache.stats()
+
+@router.delete("/tools/cache")
+async def invalidate_tool_cache(tool_name: Optional[str] = None):
+    """
+    Remove cached tool results, for one tool or all of them.
+    """
+    return {"invalidated": invalidate_tool_results(tool_name)}
+
+@router.get("/llm/stats")
+async def get_llm_stats(
+    llm_service = Depends(get_llm_service)
+):
+    """
+    Get metrics for the LLM completion cache, request coalescing,
+    concurrency limiter and request hedging.
+    """
+    return llm_service.get_stats()
+
+@router.post("/batch", response_model=BatchStatusResponse)
+async def create_batch(
+    request: BatchRequest,
+    llm_service = Depends(get_llm_service)
+):
+    """
+    Start or resume a batch of completions.
+    
+    Each job has an `id` and either `messages` or a `prompt` (with an optional
+    `system` prompt). Results are written to a JSONL file as they complete;
+    posting the same batch ID without jobs resumes it, skipping completed jobs.
+    Posting jobs for an existing batch ID replaces its jobs and results.
+    """
+    try:
+        start_batch(request.batch_id, llm_service, jobs=request.jobs, concurrency=request.concurrency)
+        return get_batch_status(request.batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except BatchRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/batch/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch(batch_id: str):
+    """
+    Get the progress of a batch of completions.
+    """
+    try:
+        return get_batch_status(batch_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/batch/{batch_id}/results")
+async def get_batch_results(batch_id: str):
+    """
+    Download the results of a batch of completions as JSONL.
+    """
+    try:
+        results_path = get_batch_paths(batch_id)["results"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.exists(results_path):
+        raise HTTPException(status_code=404, detail=f"No results for batch {batch_id}")
+    
+    return FileResponse(results_path, media_type="application/x-ndjson", filename=f"{batch_id}.jsonl")
@@ -1,18 +1,13 @@
 """
 Health check endpoints for the Appraisal AI Agent.
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Response
 from pydantic import BaseModel
+from typing import Optional
 from datetime import datetime
 
 from app.core.config import settings
-
-# Try to import the LLM service, but provide a fallback if it's not available
-try:
-    from app.services.dependencies import get_llm_service
-    has_llm_service = True
-except ImportError:
-    has_llm_service = False
+from app.services.dependencies import get_health_monitor
 
 router = APIRouter()
 
@@ -23,34 +18,58 @@ class HealthResponse(BaseModel):
     environment: str
     timestamp: str
     llm_status: str
+    database_status: str
+
+class ReadinessResponse(BaseModel):
+    """Readiness probe response model."""
+    status: str
+    llm_status: str
+    database_status: str
+    checked_at: Optional[str] = None
 
 @router.get("/", response_model=HealthResponse)
-async def health_check(llm_service=None):
+async def health_check():
     """
     Health check endpoint.
-    Returns the status of the API and its dependencies.
-    """
-    # Check LLM service status
-    llm_status = "unknown"
-    
-    if has_llm_service:
-        try:
-            # Only try to get the LLM service if the import was successful
-            if llm_service is None:
-                from app.services.dependencies import get_llm_service
-                llm_service = get_llm_service()
-            
-            await llm_service.check_connection()
-            llm_status = "ok"
-        except Exception as e:
-            llm_status = f"error: {str(e)}"
-    
+    Returns the status of the API and the cached status of its dependencies,
+    which is refreshed in the background every HEALTH_CHECK_INTERVAL seconds.
+    """
+    health_monitor = get_health_monitor()
+
     return HealthResponse(
         status="ok",
         version="1.0.0",
         environment=settings.ENVIRONMENT,
         timestamp=datetime.now().isoformat(),
-        llm_status=llm_status
+        llm_status=health_monitor.llm_status,
+        database_status=health_monitor.database_status
+    )
+
+@router.get("/live", response_model=dict)
+async def liveness():
+    """
+    Liveness probe.
+    Does no I/O; a response means the process is serving requests.
+    """
+    return {"status": "ok"}
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness(response: Response):
+    """
+    Readiness probe.
+    Returns the cached LLM and database status, with a 503 status code until
+    the service is ready to take traffic.
+    """
+    status = get_health_monitor().status()
+
+    if not status["ready"]:
+        response.status_code = 503
+
+    return ReadinessResponse(
+        status="ok" if status["ready"] else "unavailable",
+        llm_status=status["llm_status"],
+        database_status=status["database_status"],
+        checked_at=status["checked_at"]
     )
 
 @router.get("/ping", response_model=dict)
@@ -2,12 +2,23 @@
 Property management endpoints for the Appraisal AI Agent.
 """
 from fastapi import APIRouter, HTTPException, Depends, File, UploadFile
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import uuid
+import os
+import asyncio
 
 from app.services.dependencies import get_property_data_service
+from app.services.revaluation_service import (
+    RevaluationRunningError,
+    get_revaluation_paths,
+    get_revaluation_status,
+    start_revaluation
+)
+from app.services.valuation_engine import METHODS, value_properties
+from app.tools.tool_context import ToolContext
 
 router = APIRouter()
 
@@ -42,10 +53,87 @@ class Property(PropertyBase):
     valuation: Optional[Dict[str, Any]] = None
     images: Optional[List[Dict[str, Any]]] = []
 
+class ValuationSubject(BaseModel):
+    """A property to value, given by its data or by its ID."""
+    property_id: Optional[str] = None
+    address: Optional[Dict[str, Any]] = None
+    type: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+    valuation: Optional[Dict[str, Any]] = None
+    comparables: Optional[List[Dict[str, Any]]] = None
+
+class BatchValuationRequest(BaseModel):
+    """Request model for valuing many properties at once."""
+    properties: List[ValuationSubject]
+    method: str = "all"
+
+class BatchValuationResponse(BaseModel):
+    """Response model for batch valuations."""
+    method: str
+    count: int
+    results: List[Dict[str, Any]]
+
+class Sale(BaseModel):
+    """A past sale to index for comparable selection."""
+    id: Optional[str] = None
+    type: str
+    latitude: float
+    longitude: float
+    price: Optional[float] = None
+    size: Optional[float] = None
+    year_built: Optional[int] = None
+    bedrooms: Optional[int] = None
+    bathrooms: Optional[float] = None
+    sale_date: Optional[str] = None
+    address: Optional[Any] = None
+
+class RevaluationRequest(BaseModel):
+    """Request model for portfolio revaluations."""
+    revaluation_id: str
+    properties: Optional[List[Dict[str, Any]]] = None
+    method: Optional[str] = None
+    chunk_size: Optional[int] = None
+    workers: Optional[int] = None
+
+class RevaluationStatusResponse(BaseModel):
+    """Response model for portfolio revaluation progress."""
+    revaluation_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    elapsed_seconds: float
+    properties_per_second: float
+
+def _index_property_sale(property_service: Any, property_data: Dict[str, Any]) -> None:
+    """Index a property's last sale as a comparable sale, if it has coordinates and a last sale."""
+    coordinates = (property_data.get("address") or {}).get("coordinates") or {}
+    details = property_data.get("details") or {}
+    if details.get("last_sale_price") is not None:
+        property_service.add_sales([{
+            "id": property_data["id"],
+            "type": property_data.get("type"),
+            "address": property_data.get("address"),
+            "latitude": coordinates.get("latitude"),
+            "longitude": coordinates.get("longitude"),
+            "price": details["last_sale_price"],
+            "size": details.get("size"),
+            "year_built": details.get("year_built"),
+            "bedrooms": details.get("bedrooms"),
+            "bathrooms": details.get("bathrooms"),
+            "sale_date": details.get("last_sale_date")
+        }])
+
 @router.post("", response_model=Property)
-async def create_property(property_data: PropertyCreate):
+async def create_property(
+    property_data: PropertyCreate,
+    property_service = Depends(get_property_data_service)
+):
     """
     Create a new property.
+    
+    Properties with coordinates and a last sale are also indexed as
+    comparable sales.
     """
     property_id = str(uuid.uuid4())
     now = datetime.now()
@@ -59,8 +147,164 @@ async def create_property(property_data: PropertyCreate):
     }
     
     PROPERTIES_DB[property_id] = new_property
+    _index_property_sale(property_service, new_property)
+    
     return new_property
 
+@router.post("/valuation/batch", response_model=BatchValuationResponse)
+async def batch_valuation(
+    request: BatchValuationRequest,
+    property_service = Depends(get_property_data_service)
+):
+    """
+    Value many properties at once.
+    
+    Each property is given either by its data (`type`, `details`, `valuation`
+    and optionally `address` and `comparables`) or by a `property_id` whose
+    details are fetched. Comparables missing for the sales comparison approach
+    are the sales most similar to each property, selected as by the valuation
+    calculator tool, and all properties are then valued together by the
+    vectorized valuation engine.
+    """
+    if request.method not in METHODS + ("all",):
+        raise HTTPException(status_code=400, detail=f"Unknown valuation method: {request.method}")
+    
+    context = ToolContext(property_service)
+    needs_comparables = request.method in ("sales_comparison", "all")
+    
+    async def resolve(subject: ValuationSubject) -> Dict[str, Any]:
+        property_data = subject.dict(exclude_none=True)
+        if subject.type is None:
+            if subject.property_id is None:
+                raise HTTPException(status_code=400, detail="Each property needs a property_id or its type and details")
+            try:
+                details = await context.get_property_details(subject.property_id)
+            except Exception as e:
+                raise HTTPException(status_code=404, detail=f"Property not found: {str(e)}")
+            property_data = {**details, **property_data}
+        
+        if needs_comparables and subject.comparables is None:
+            # Selected as by the valuation calculator tool, so both value a property alike
+            property_data["comparables"] = await context.get_subject_comparables(property_data)
+        return property_data
+    
+    try:
+        subjects = await asyncio.gather(*[resolve(subject) for subject in request.properties])
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching comparables: {str(e)}")
+    
+    try:
+        valuations = value_properties(
+            subjects,
+            [subject.get("comparables", []) for subject in subjects] if needs_comparables else None,
+            request.method
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "method": request.method,
+        "count": len(valuations),
+        "results": [
+            {"property_id": subject.get("property_id"), "valuations": valuation}
+            for subject, valuation in zip(subjects, valuations)
+        ]
+    }
+
+@router.post("/revaluation", response_model=RevaluationStatusResponse)
+async def create_revaluation(
+    request: RevaluationRequest,
+    property_service = Depends(get_property_data_service)
+):
+    """
+    Start or resume a portfolio revaluation.
+    
+    Each property has a `property_id` and optionally its data, as for batch
+    valuations. The portfolio is valued in chunks across worker processes and
+    the results are written to a CSV file as they complete; posting the same
+    revaluation ID without properties resumes it, skipping valued properties,
+    with the method and chunk size it was started with.
+    """
+    try:
+        start_revaluation(
+            request.revaluation_id,
+            property_service,
+            properties=request.properties,
+            method=request.method,
+            chunk_size=request.chunk_size,
+            workers=request.workers
+        )
+        return get_revaluation_status(request.revaluation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RevaluationRunningError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/revaluation/{revaluation_id}", response_model=RevaluationStatusResponse)
+async def get_revaluation(revaluation_id: str):
+    """
+    Get the progress and throughput of a portfolio revaluation.
+    """
+    try:
+        return get_revaluation_status(revaluation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/revaluation/{revaluation_id}/results")
+async def get_revaluation_results(revaluation_id: str):
+    """
+    Download the results of a portfolio revaluation as CSV.
+    """
+    try:
+        results_path = get_revaluation_paths(revaluation_id)["results"]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not os.path.exists(results_path):
+        raise HTTPException(status_code=404, detail=f"No results for revaluation {revaluation_id}")
+    
+    return FileResponse(results_path, media_type="text/csv", filename=f"{revaluation_id}.csv")
+
+@router.post("/sales")
+async def index_sales(
+    sales: List[Sale],
+    property_service = Depends(get_property_data_service)
+):
+    """
+    Index past sales for comparable selection by location.
+    """
+    indexed = property_service.add_sales([sale.dict(exclude_none=True) for sale in sales])
+    return {"indexed": indexed, "total": property_service.sales_index.count()}
+
+@router.get("/sales/nearest")
+async def get_nearest_sales(
+    latitude: float,
+    longitude: float,
+    property_type: str,
+    limit: int = 10,
+    radius_miles: Optional[float] = None,
+    sold_within_months: Optional[float] = None,
+    property_service = Depends(get_property_data_service)
+):
+    """
+    Get the nearest indexed sales of a property type, optionally within a
+    radius and a recent sale period.
+    """
+    return property_service.sales_index.nearest(
+        latitude,
+        longitude,
+        property_type,
+        k=limit,
+        radius_miles=radius_miles,
+        sold_within_months=sold_within_months
+    )
+
 @router.get("", response_model=List[Property])
 async def list_properties(
     property_type: Optional[str] = None,
@@ -116,7 +360,11 @@ async def get_property(
     return property_data
 
 @router.put("/{property_id}", response_model=Property)
-async def update_property(property_id: str, property_update: PropertyUpdate):
+async def update_property(
+    property_id: str,
+    property_update: PropertyUpdate,
+    property_service = Depends(get_property_data_service)
+):
     """
     Update a property.
     """
@@ -139,10 +387,18 @@ async def update_property(property_id: str, property_update: PropertyUpdate):
     current_property["updated_at"] = datetime.now()
     
     PROPERTIES_DB[property_id] = current_property
+    
+    # Reindex its last sale, which may have moved or changed
+    property_service.remove_sales([property_id])
+    _index_property_sale(property_service, current_property)
+    
     return current_property
 
 @router.delete("/{property_id}")
-async def delete_property(property_id: str):
+async def delete_property(
+    property_id: str,
+    property_service = Depends(get_property_data_service)
+):
     """
     Delete a property.
     """
@@ -150,6 +406,7 @@ async def delete_property(property_id: str):
         raise HTTPException(status_code=404, detail="Property not found")
     
     del PROPERTIES_DB[property_id]
+    property_service.remove_sales([property_id])
     return {"message": "Property deleted successfully"}
 
 @router.post("/{property_id}/images")
@@ -240,7 +497,8 @@ async def get_property_comparables(
     property_service = Depends(get_property_data_service)
 ):
     """
-    Get comparable properties for a property.
+    Get comparable properties for a property, ranked by similarity in size,
+    age, bedrooms, bathrooms, distance and sale recency.
     """
     if property_id not in PROPERTIES_DB:
         raise HTTPException(status_code=404, detail="Property not found")
@@ -251,12 +509,17 @@ async def get_property_comparables(
     location = property_data["address"].get("city", "") + ", " + property_data["address"].get("state", "")
     property_type = property_data["type"]
     
-    # Get comparables from property service
+    coordinates = property_data["address"].get("coordinates") or {}
+    
+    # Get the comparables most similar to the property from the property service
     try:
         comparables = await property_service.get_comparable_properties(
             location=location,
             property_type=property_type,
-            limit=limit
+            limit=limit,
+            latitude=coordinates.get("latitude"),
+            longitude=coordinates.get("longitude"),
+            subject=property_data
         )
         
         return {
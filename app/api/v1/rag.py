@@ -1,15 +1,16 @@
 """
 RAG (Retrieval-Augmented Generation) API endpoints.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
-from app.db.session import get_db
+from app.db.session import get_db, SessionLocal
 from app.services.rag_service import RAGService
-from app.services.dependencies import get_llm_service
-from app.models.rag import Document
+from app.services.reindex_service import ReindexService
+from app.services.dependencies import get_llm_service, get_embedding_provider
+from app.models.rag import Document, EmbeddingReindexJob
 
 router = APIRouter()
 
@@ -51,6 +52,19 @@ class RAGResponse(BaseModel):
     """Response model for RAG-generated responses."""
     response: str
     sources: List[Dict[str, Any]]
+    degraded: bool = False
+
+class ReindexJobResponse(BaseModel):
+    """Response model for embedding reindex jobs."""
+    id: int
+    target_model_id: str
+    status: str
+    last_chunk_id: int
+    processed_chunks: int
+    total_chunks: Optional[int] = None
+    error: Optional[str] = None
+    created_at: str
+    completed_at: Optional[str] = None
 
 class UsageStatistics(BaseModel):
     """Response model for usage statistics."""
@@ -278,6 +292,109 @@ async def generate_response(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@router.post("/embeddings/fit")
+async def fit_embedding_model(
+    background_tasks: BackgroundTasks,
+    batch_size: int = 500,
+    db: Session = Depends(get_db)
+):
+    """
+    Fit the local embedding model on the current corpus.
+
+    This endpoint fits the offline embedding model on all document chunks and
+    saves it to disk, then starts a background reindex job that re-embeds the
+    stored chunks with it; its progress is at /embeddings/reindex/{job_id}.
+    """
+    rag_service = RAGService(db)
+
+    try:
+        stats = await rag_service.fit_embedding_model()
+        job = ReindexService(db, rag_service.embedding_provider).start_job()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fitting embedding model: {str(e)}")
+
+    background_tasks.add_task(_run_reindex_job, job.id, batch_size)
+    return {**stats, "reindex_job": _reindex_job_response(job)}
+
+def _reindex_job_response(job: EmbeddingReindexJob) -> Dict[str, Any]:
+    """Convert a reindex job to its response format."""
+    return {
+        "id": job.id,
+        "target_model_id": job.target_model_id,
+        "status": job.status,
+        "last_chunk_id": job.last_chunk_id,
+        "processed_chunks": job.processed_chunks,
+        "total_chunks": job.total_chunks,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None
+    }
+
+async def _run_reindex_job(job_id: int, batch_size: int) -> None:
+    """Run a reindex job in the background with its own database session."""
+    db = SessionLocal()
+    try:
+        reindex_service = ReindexService(db, get_embedding_provider())
+        job = reindex_service.get_job(job_id)
+        if job:
+            await reindex_service.run(job, batch_size=batch_size)
+    finally:
+        db.close()
+
+@router.post("/embeddings/reindex", response_model=ReindexJobResponse)
+async def start_reindex(
+    background_tasks: BackgroundTasks,
+    batch_size: int = 500,
+    db: Session = Depends(get_db)
+):
+    """
+    Start or resume re-embedding all chunks with the current embedding model.
+
+    The job runs in the background, checkpoints after every batch and switches
+    search over to the new vectors once all chunks are re-embedded.
+    """
+    reindex_service = ReindexService(db, get_embedding_provider())
+
+    try:
+        active_job = reindex_service.get_active_job()
+        if active_job and active_job.target_model_id == reindex_service.embedding_provider.model_id:
+            return _reindex_job_response(active_job)
+
+        job = reindex_service.start_job()
+        background_tasks.add_task(_run_reindex_job, job.id, batch_size)
+        return _reindex_job_response(job)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting reindex: {str(e)}")
+
+@router.get("/embeddings/reindex", response_model=List[ReindexJobResponse])
+async def get_reindex_jobs(
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the most recent embedding reindex jobs.
+    """
+    reindex_service = ReindexService(db, get_embedding_provider())
+    return [_reindex_job_response(job) for job in reindex_service.get_jobs(limit)]
+
+@router.get("/embeddings/reindex/{job_id}", response_model=ReindexJobResponse)
+async def get_reindex_job(
+    job_id: int,
+    db: Session = Depends(get_db)
+):
+    """
+    Get the progress of an embedding reindex job.
+    """
+    reindex_service = ReindexService(db, get_embedding_provider())
+    job = reindex_service.get_job(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Reindex job with ID {job_id} not found")
+
+    return _reindex_job_response(job)
+
 @router.get("/statistics", response_model=UsageStatistics)
 async def get_statistics(
     db: Session = Depends(get_db)
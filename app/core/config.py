@@ -35,6 +35,123 @@ class Settings(BaseSettings):
     NEBIUS_API_KEY: str = os.getenv("NEBIUS_API_KEY", "")
     NEBIUS_ENDPOINT: str = os.getenv("NEBIUS_ENDPOINT", "https://api.studio.nebius.com/v1/chat/completions")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "meta-llama/Meta-Llama-3.1-70B-Instruct")
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "60"))  # seconds
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))  # seconds
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))  # seconds
+    LLM_REQUEST_DEADLINE: float = float(os.getenv("LLM_REQUEST_DEADLINE", "120"))  # seconds, including queueing and retries
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))  # seconds
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))  # seconds
+    
+    # Adaptive (AIMD) concurrency limit for LLM calls
+    LLM_CONCURRENCY_INITIAL: int = int(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+    LLM_CONCURRENCY_MIN: int = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+    LLM_CONCURRENCY_MAX: int = int(os.getenv("LLM_CONCURRENCY_MAX", "100"))
+    LLM_LATENCY_THRESHOLD: float = float(os.getenv("LLM_LATENCY_THRESHOLD", "30"))  # seconds; slower calls count as overload
+    
+    # Circuit breaker for LLM outages
+    LLM_CIRCUIT_BREAKER_ENABLED: bool = os.getenv("LLM_CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))  # consecutive failures
+    LLM_CIRCUIT_RECOVERY_TIMEOUT: float = float(os.getenv("LLM_CIRCUIT_RECOVERY_TIMEOUT", "30"))  # seconds before a trial call
+    
+    # Hedging of slow LLM requests
+    LLM_HEDGING_ENABLED: bool = os.getenv("LLM_HEDGING_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))  # hedge requests slower than this latency percentile
+    LLM_HEDGE_BUDGET: float = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))  # maximum hedges per request
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    
+    # LLM completion cache (used for temperature 0 or when a caller asks for it)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_TTL: float = float(os.getenv("LLM_CACHE_TTL", "3600"))  # seconds
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "")  # empty disables the disk tier
+    LLM_CACHE_MAX_DISK_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "10000"))
+    LLM_COALESCE_REQUESTS: bool = os.getenv("LLM_COALESCE_REQUESTS", "true").lower() == "true"  # share identical in-flight requests
+    LLM_STREAM_INCLUDE_USAGE: bool = os.getenv("LLM_STREAM_INCLUDE_USAGE", "true").lower() == "true"  # ask for usage in streams; off for backends rejecting stream_options
+    # USD per million [prompt, completion] tokens, used to estimate spend in /metrics
+    LLM_MODEL_PRICES: Dict[str, List[float]] = {
+        "meta-llama/Meta-Llama-3.1-70B-Instruct": [0.13, 0.40],
+        "meta-llama/Meta-Llama-3.1-8B-Instruct": [0.02, 0.06]
+    }
+
+    # Embedding Configuration
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "local")  # local, openai or stub
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "BAAI/bge-en-icl")  # Used by the openai provider
+    EMBEDDING_DIMENSION: int = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "app/data/embeddings/cache.sqlite3")
+    EMBEDDING_REDUCTION: str = os.getenv("EMBEDDING_REDUCTION", "none")  # none, pca or random
+    EMBEDDING_REDUCED_DIMENSION: int = int(os.getenv("EMBEDDING_REDUCED_DIMENSION", "256"))
+    EMBEDDING_REDUCER_PATH: str = os.getenv("EMBEDDING_REDUCER_PATH", "app/data/embeddings/reducer.joblib")
+
+    # Model routing: simple turns go to SMALL_MODEL_NAME, everything else to MODEL_NAME
+    MODEL_ROUTING_ENABLED: bool = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+    SMALL_MODEL_NAME: str = os.getenv("SMALL_MODEL_NAME", "meta-llama/Meta-Llama-3.1-8B-Instruct")
+    ROUTER_SIMPLE_MAX_CHARS: int = int(os.getenv("ROUTER_SIMPLE_MAX_CHARS", "280"))
+    ROUTER_SIMPLE_PATTERNS: List[str] = [
+        r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|great|good (morning|afternoon|evening)|bye)\b",
+        r"\b(status|progress|deadline|due date|who is assigned)\b",
+        r"\b(format|reformat|rephrase|reword|rewrite|shorten|proofread|translate|bullet points?|as a table|spell)\b"
+    ]
+    ROUTER_COMPLEX_KEYWORDS: List[str] = [
+        "valuation", "value", "appraise", "comparable", "comps", "cap rate", "capitalization",
+        "income approach", "cost approach", "sales comparison", "market analysis", "analyze", "analysis",
+        "adjustment", "estimate", "forecast", "calculate", "compliance", "uspap", "ivsc", "why", "explain"
+    ]
+    
+    # Batch completions
+    BATCH_DIR: str = os.getenv("BATCH_DIR", "app/data/batches")
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "32"))
+    
+    # Portfolio revaluation
+    REVALUATION_DIR: str = os.getenv("REVALUATION_DIR", "app/data/revaluations")
+    REVALUATION_CHUNK_SIZE: int = int(os.getenv("REVALUATION_CHUNK_SIZE", "500"))  # properties per worker task
+    REVALUATION_WORKERS: int = int(os.getenv("REVALUATION_WORKERS", str(os.cpu_count() or 1)))  # worker processes
+    
+    # Health checks
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "60"))  # seconds between background checks
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "10"))  # seconds
+    HEALTH_REQUIRE_LLM: bool = os.getenv("HEALTH_REQUIRE_LLM", "false").lower() == "true"  # report not ready while the LLM is down
+    
+    # Agent conversation history compaction
+    HISTORY_MAX_TURNS: int = int(os.getenv("HISTORY_MAX_TURNS", "6"))  # recent turns kept verbatim
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))
+    HISTORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "512"))
+    HISTORY_SUMMARY_CACHE_SIZE: int = int(os.getenv("HISTORY_SUMMARY_CACHE_SIZE", "1000"))  # conversations
+    
+    # Agent tools enabled by default when a request does not name any
+    TOOLS_ENABLED: List[str] = [
+        "property_search",
+        "market_analysis",
+        "valuation_calculator",
+        "report_generator",
+        "compliance_checker",
+        "image_analyzer",
+        "gis_mapper"
+    ]
+    TOOL_CALL_TIMEOUT: float = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))  # seconds per tool call; calls in one turn run concurrently
+    AGENT_MAX_STEPS: int = int(os.getenv("AGENT_MAX_STEPS", "5"))  # LLM completions per agent turn
+    AGENT_TIME_BUDGET: float = float(os.getenv("AGENT_TIME_BUDGET", "60"))  # seconds after which no more tool steps start
+    TOOL_CACHE_ENABLED: bool = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+    TOOL_CACHE_MAX_ENTRIES: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+    # Seconds tool results stay cached, by tool; tools not listed are never cached
+    TOOL_CACHE_TTLS: Dict[str, float] = {
+        "market_analysis": 24 * 3600,
+        "property_search": 3600,
+        "compliance_checker": 7 * 24 * 3600
+    }
+    
+    # Comparable selection
+    COMPARABLE_CANDIDATE_POOL: int = int(os.getenv("COMPARABLE_CANDIDATE_POOL", "50"))  # candidates ranked per subject
+    COMPARABLE_KD_TREE_THRESHOLD: int = int(os.getenv("COMPARABLE_KD_TREE_THRESHOLD", "2000"))  # candidates above which a KD-tree is searched
+    COMPARABLE_FEATURE_WEIGHTS: Dict[str, Dict[str, float]] = {
+        "default": {"size": 1.0, "age": 0.5, "bedrooms": 0.0, "bathrooms": 0.0, "distance": 1.0, "recency": 0.5},
+        "residential": {"size": 1.0, "age": 0.6, "bedrooms": 0.8, "bathrooms": 0.6, "distance": 1.0, "recency": 0.7},
+        "commercial": {"size": 1.0, "age": 0.4, "bedrooms": 0.0, "bathrooms": 0.0, "distance": 0.8, "recency": 0.5}
+    }
     
     # External APIs
     CADASTRE_API_URL: str = os.getenv("CADASTRE_API_URL", "https://api.cadastre.example.com")
@@ -1,9 +1,11 @@
 """
 Main application file for the Appraisal AI Agent.
 """
+import asyncio
 import uvicorn
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
@@ -15,6 +17,7 @@ from app.api.v1.api import api_router
 from app.api.direct import router as direct_router
 from app.db.init_db import init_db
 from app.db.session import engine, SessionLocal
+from app.services.metrics_service import EndpointLabelMiddleware, registry as metrics_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -58,7 +61,25 @@ try:
     
     # Create a database session
     db = SessionLocal()
-    
+
+    # Add embedding model tracking columns to existing RAG chunk tables
+    try:
+        from sqlalchemy import inspect
+
+        existing_columns = {column["name"] for column in inspect(engine).get_columns("rag_document_chunks")}
+        for column_name, column_type in [
+            ("embedding_model", "VARCHAR(255)"),
+            ("shadow_embedding", "JSON"),
+            ("shadow_embedding_model", "VARCHAR(255)")
+        ]:
+            if column_name not in existing_columns:
+                logger.info(f"Adding {column_name} column to rag_document_chunks table")
+                db.execute(text(f"ALTER TABLE rag_document_chunks ADD COLUMN {column_name} {column_type};"))
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error adding embedding columns: {e}")
+        db.rollback()
+
     # Check if we're using PostgreSQL
     if "postgresql" in DATABASE_URL:
         logger.info("PostgreSQL database detected, checking for schema issues")
@@ -146,6 +167,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Label LLM metrics with the endpoint that made the call
+app.add_middleware(EndpointLabelMiddleware)
+
 # Add direct router for testing
 app.include_router(direct_router, prefix="/api", tags=["test"])
 
@@ -205,6 +229,37 @@ except ImportError as e:
     
     app.include_router(web_router)
 
+def index_stored_properties() -> int:
+    """Index the last sales of the stored properties for comparable selection."""
+    from app.models.property import Property
+    from app.services.dependencies import get_property_data_service
+
+    db = SessionLocal()
+    try:
+        properties = db.query(Property).filter(Property.latitude.isnot(None), Property.longitude.isnot(None)).all()
+        return get_property_data_service().index_stored_properties(properties)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def start_services():
+    """Start background health checks and index the stored properties' sales."""
+    from app.services.dependencies import get_health_monitor
+    get_health_monitor().start()
+
+    try:
+        indexed = await asyncio.to_thread(index_stored_properties)
+        logger.info(f"Indexed the sales of {indexed} stored properties")
+    except Exception as e:
+        logger.error(f"Error indexing stored properties: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """Stop background tasks and release shared resources such as the LLM connection pool."""
+    from app.services.dependencies import close_llm_service, get_health_monitor
+    await get_health_monitor().stop()
+    await close_llm_service()
+
 @app.get("/")
 async def root():
     """Root endpoint that redirects to the UI."""
@@ -215,6 +270,11 @@ async def root():
         "status": "running"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for LLM calls."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
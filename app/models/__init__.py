@@ -24,6 +24,7 @@ from .report import Report, ReportStatus
 from .rag import (
     Document,
     DocumentChunk,
+    EmbeddingReindexJob,
     RAGQuery,
     RAGQueryChunk,
     WebsiteUsage
@@ -31,6 +31,9 @@ class DocumentChunk(Base, TimestampMixin):
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
     embedding = Column(JSON, nullable=True)  # Vector embedding for semantic search stored as JSON
+    embedding_model = Column(String(255), nullable=True)  # Model id that produced the embedding
+    shadow_embedding = Column(JSON, nullable=True)  # Written by a reindex job until it switches over
+    shadow_embedding_model = Column(String(255), nullable=True)
     
     # Relationships
     document = relationship("Document", back_populates="chunks")
@@ -44,6 +47,23 @@ class DocumentChunk(Base, TimestampMixin):
         return f"<DocumentChunk(id={self.id}, document_id={self.document_id}, chunk_index={self.chunk_index})>"
 
 
+class EmbeddingReindexJob(Base, TimestampMixin):
+    """Model for tracking and checkpointing embedding reindex jobs."""
+    __tablename__ = "rag_reindex_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target_model_id = Column(String(255), nullable=False)  # Model id the chunks are re-embedded with
+    status = Column(String(20), nullable=False, default="running")  # running, completed, failed, superseded
+    last_chunk_id = Column(Integer, nullable=False, default=0)  # Keyset pagination checkpoint
+    processed_chunks = Column(Integer, nullable=False, default=0)
+    total_chunks = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<EmbeddingReindexJob(id={self.id}, target='{self.target_model_id}', status='{self.status}')>"
+
+
 class RAGQuery(Base, TimestampMixin):
     """Model for storing user queries and their results for analytics and improvement."""
     __tablename__ = "rag_queries"
@@ -0,0 +1,285 @@
+"""
+Batch completion service for the Appraisal AI Agent.
+This service runs large lists of prompt jobs (e.g. report narratives for a
+portfolio review) through the LLM service with high concurrency, writing each
+result to a JSONL file as soon as it completes. The results file doubles as the
+checkpoint: rerunning a batch skips every job already in it.
+"""
+import os
+import re
+import json
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.config import settings
+from app.services.llm_service import Message
+
+logger = logging.getLogger(__name__)
+
+BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Running batches by ID
+_batch_tasks: Dict[str, asyncio.Task] = {}
+
+class BatchRunningError(Exception):
+    """Raised when new jobs are posted for a batch that is still running."""
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """
+    Load prompt jobs from a JSONL file.
+
+    Each line is an object with an `id` and either `messages` (a list of
+    role/content objects) or a `prompt` string with an optional `system` prompt.
+    `temperature`, `max_tokens` and `model` may be set per job.
+    """
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                jobs.append(json.loads(line))
+    validate_jobs(jobs)
+    return jobs
+
+def validate_jobs(jobs: List[Dict[str, Any]]) -> None:
+    """
+    Check that prompt jobs are well-formed (see `load_jobs`).
+
+    Raises:
+        ValueError: If a job has no `id`, no `messages` or `prompt`, or an
+            ID used by another job
+    """
+    ids = set()
+    for i, job in enumerate(jobs):
+        if not isinstance(job, dict) or job.get("id") is None:
+            raise ValueError(f"Batch job {i} has no id")
+        if str(job["id"]) in ids:
+            raise ValueError(f"Batch job ID {job['id']} is not unique")
+        ids.add(str(job["id"]))
+
+        if not isinstance(job.get("messages"), list) and not isinstance(job.get("prompt"), str):
+            raise ValueError(f"Batch job {job['id']} needs either messages or a prompt")
+        try:
+            _job_messages(job)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Batch job {job['id']} has invalid messages: {str(e)}")
+
+def read_completed_ids(path: str) -> Set[str]:
+    """
+    Get the IDs of the jobs already in a results file.
+
+    A line left incomplete by a crash is removed so new results append cleanly.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    if content and not content.endswith("\n"):
+        content = content[:content.rfind("\n") + 1]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    return {str(json.loads(line)["id"]) for line in content.splitlines() if line.strip()}
+
+def _job_messages(job: Dict[str, Any]) -> List[Message]:
+    """Get the conversation for a job."""
+    if "messages" in job:
+        return [Message(**message) for message in job["messages"]]
+
+    messages = []
+    if job.get("system"):
+        messages.append(Message(role="system", content=job["system"]))
+    messages.append(Message(role="user", content=job["prompt"]))
+    return messages
+
+
+class BatchCompletionRunner:
+    """Runs prompt jobs concurrently through the LLM service and streams results to JSONL."""
+
+    def __init__(self, llm_service: Any, concurrency: int = 32):
+        """
+        Initialize the batch runner.
+
+        Args:
+            llm_service: LLM service to run the jobs with; its adaptive limiter
+                still bounds how many calls reach the backend at once
+            concurrency: Number of jobs in progress at once
+        """
+        self.llm_service = llm_service
+        self.concurrency = concurrency
+
+    async def run(
+        self,
+        jobs: List[Dict[str, Any]],
+        output_path: str,
+        errors_path: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Run the jobs not yet in the results file.
+
+        Args:
+            jobs: Prompt jobs, each with a unique `id`
+            output_path: JSONL file that successful results are appended to
+            errors_path: JSONL file for failed jobs (defaults to `<output>.errors.jsonl`);
+                failed jobs are retried on the next run
+
+        Returns:
+            Counts of total, skipped, completed and failed jobs
+        """
+        if errors_path is None:
+            errors_path = f"{os.path.splitext(output_path)[0]}.errors.jsonl"
+
+        ids = [str(job["id"]) for job in jobs]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Batch job IDs must be unique")
+
+        completed_ids = read_completed_ids(output_path)
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            if str(job["id"]) not in completed_ids:
+                queue.put_nowait(job)
+
+        counts = {
+            "total": len(jobs),
+            "skipped": len(jobs) - queue.qsize(),
+            "completed": 0,
+            "failed": 0
+        }
+        logger.info(f"Running {queue.qsize()} batch jobs ({counts['skipped']} already completed)")
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "a", encoding="utf-8") as output, open(errors_path, "w", encoding="utf-8") as errors:
+            async def worker() -> None:
+                while not queue.empty():
+                    job = queue.get_nowait()
+                    record = await self._run_job(job)
+
+                    if "error" in record:
+                        counts["failed"] += 1
+                        errors.write(json.dumps(record) + "\n")
+                        errors.flush()
+                    else:
+                        counts["completed"] += 1
+                        output.write(json.dumps(record) + "\n")
+                        output.flush()
+
+            await asyncio.gather(*[worker() for _ in range(min(self.concurrency, queue.qsize()))])
+
+        logger.info(f"Batch finished: {counts}")
+        return counts
+
+    async def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one job and return its result record."""
+        try:
+            response = await self.llm_service.generate_completion(
+                messages=_job_messages(job),
+                temperature=job.get("temperature", 0.7),
+                max_tokens=job.get("max_tokens", 1024),
+                model=job.get("model")
+            )
+            choice = response["choices"][0]
+            return {
+                "id": job["id"],
+                "model": response.get("model"),
+                "content": choice["message"]["content"],
+                "finish_reason": choice.get("finish_reason"),
+                "usage": response.get("usage")
+            }
+        except Exception as e:
+            logger.warning(f"Batch job {job.get('id')} failed: {str(e)}")
+            return {"id": job.get("id"), "error": str(e)}
+
+
+def get_batch_paths(batch_id: str) -> Dict[str, str]:
+    """Get the jobs, results and errors file paths of a stored batch."""
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise ValueError("Batch IDs may only contain letters, digits, '-' and '_'")
+
+    base = os.path.join(settings.BATCH_DIR, batch_id)
+    return {
+        "jobs": f"{base}.jobs.jsonl",
+        "results": f"{base}.jsonl",
+        "errors": f"{base}.errors.jsonl"
+    }
+
+def start_batch(batch_id: str, llm_service: Any, jobs: Optional[List[Dict[str, Any]]] = None, concurrency: int = 32) -> None:
+    """
+    Start or resume a stored batch in the background.
+
+    Args:
+        batch_id: ID of the batch
+        llm_service: LLM service to run the jobs with
+        jobs: Jobs for a new batch, replacing any stored jobs and results of
+            the same ID; when omitted the stored jobs are resumed
+        concurrency: Number of jobs in progress at once
+
+    Raises:
+        ValueError: If the batch ID, jobs or concurrency are invalid
+        BatchRunningError: If jobs are given for a batch that is still running
+        FileNotFoundError: If no jobs are given and the batch is not stored
+    """
+    paths = get_batch_paths(batch_id)
+    if concurrency < 1:
+        raise ValueError("Batch concurrency must be at least 1")
+
+    if batch_id in _batch_tasks and not _batch_tasks[batch_id].done():
+        if jobs is not None:
+            raise BatchRunningError(f"Batch {batch_id} is still running")
+        return
+
+    if jobs is not None:
+        # Checked before the stored batch is replaced, rather than failing in the runner
+        validate_jobs(jobs)
+        os.makedirs(settings.BATCH_DIR, exist_ok=True)
+        # Results of earlier jobs under this ID would otherwise be skipped as completed
+        for path in (paths["results"], paths["errors"]):
+            if os.path.exists(path):
+                os.remove(path)
+        with open(paths["jobs"], "w", encoding="utf-8") as f:
+            for job in jobs:
+                f.write(json.dumps(job) + "\n")
+    elif not os.path.exists(paths["jobs"]):
+        raise FileNotFoundError(f"Batch {batch_id} not found")
+
+    runner = BatchCompletionRunner(llm_service, concurrency=concurrency)
+    _batch_tasks[batch_id] = asyncio.ensure_future(
+        runner.run(load_jobs(paths["jobs"]), paths["results"], paths["errors"])
+    )
+
+def get_batch_status(batch_id: str) -> Dict[str, Any]:
+    """Get the progress of a stored batch."""
+    paths = get_batch_paths(batch_id)
+    if not os.path.exists(paths["jobs"]):
+        raise FileNotFoundError(f"Batch {batch_id} not found")
+
+    def count_lines(path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.endswith("\n"))
+
+    task = _batch_tasks.get(batch_id)
+    total = count_lines(paths["jobs"])
+    completed = count_lines(paths["results"])
+    failed = count_lines(paths["errors"])
+
+    if task is not None and not task.done():
+        status = "running"
+    elif task is not None and task.cancelled():
+        status = "cancelled"
+    elif task is not None and task.exception() is not None:
+        status = "failed"
+    elif completed >= total:
+        status = "completed"
+    else:
+        status = "incomplete"
+
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "total": total,
+        "completed": completed,
+        "failed": failed
+    }
@@ -0,0 +1,212 @@
+"""
+Comparable engine for the Appraisal AI Agent.
+This module ranks candidate sales by their similarity to a subject property
+across size, age, bedrooms, bathrooms, distance and sale recency. The features
+are standardized into a matrix, weighted by property type and searched with a
+weighted k-NN: brute-force NumPy for small candidate pools and a KD-tree for
+large ones.
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+FEATURES = ("size", "age", "bedrooms", "bathrooms", "distance", "recency")
+
+MILES_PER_DEGREE = 69.0
+
+# Subjects whose brute-force distances are computed at once
+BRUTE_FORCE_BLOCK = 256
+
+def _number(value: Any) -> float:
+    """Convert a value to float, NaN when it is missing or not numeric."""
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _field(record: Dict[str, Any], name: str) -> float:
+    """Get a numeric field of a sale record or of a property's `details`."""
+    if record.get(name) is not None:
+        return _number(record.get(name))
+    return _number((record.get("details") or {}).get(name))
+
+def _coordinates(record: Dict[str, Any]) -> np.ndarray:
+    """Get the latitude and longitude of a sale record or of a property's address, NaN when unknown."""
+    if record.get("latitude") is not None and record.get("longitude") is not None:
+        return np.array([_number(record["latitude"]), _number(record["longitude"])])
+    address = record.get("address") if isinstance(record.get("address"), dict) else {}
+    coordinates = address.get("coordinates") or {}
+    return np.array([_number(coordinates.get("latitude")), _number(coordinates.get("longitude"))])
+
+def _days_since(value: Any, as_of: date) -> float:
+    """Get the days from a date to `as_of`, NaN when the date is missing or invalid."""
+    try:
+        return float((np.datetime64(as_of.isoformat(), "D") - np.datetime64(str(value)[:10], "D")).astype(np.int64))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ComparableEngine:
+    """
+    Ranks candidate comparables by weighted similarity to subject properties.
+
+    Each feature is standardized by its spread over the candidates and scaled by
+    the square root of its weight, so that the Euclidean distance between a
+    subject and a candidate is their weighted standardized distance. Distance is
+    measured from coordinates when the subject and candidates have them, and
+    from the candidates' `distance` field (miles from the subject) otherwise.
+    Missing candidate values are imputed with the candidate mean.
+    """
+
+    def __init__(self, weights: Dict[str, Dict[str, float]], kd_tree_threshold: int = 2000):
+        """
+        Initialize the comparable engine.
+
+        Args:
+            weights: Feature weights by property type, with a "default" entry
+                for other types; features left out have no weight
+            kd_tree_threshold: Number of candidates above which a KD-tree is
+                searched instead of computing every distance
+        """
+        self.weights = weights
+        self.kd_tree_threshold = kd_tree_threshold
+
+    def feature_weights(self, property_type: str) -> np.ndarray:
+        """Get the weights of `FEATURES` for a property type."""
+        weights = self.weights.get(property_type) or self.weights.get("default") or {}
+        return np.array([float(weights.get(feature, 0.0)) for feature in FEATURES])
+
+    def rank(
+        self,
+        subject: Dict[str, Any],
+        candidates: Sequence[Dict[str, Any]],
+        k: int = 5,
+        as_of: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """Get the `k` candidates most similar to one subject; see `rank_many`."""
+        return self.rank_many([subject], candidates, k, as_of)[0]
+
+    def rank_many(
+        self,
+        subjects: Sequence[Dict[str, Any]],
+        candidates: Sequence[Dict[str, Any]],
+        k: int = 5,
+        as_of: Optional[date] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Get the candidates most similar to each subject.
+
+        Args:
+            subjects: Properties in the property data format (`type` and
+                `details` with `size`, `year_built`, `bedrooms` and `bathrooms`,
+                and `address.coordinates`) or flat sale records
+            candidates: Candidate sales with `size`, `year_built`, `bedrooms`,
+                `bathrooms`, `sale_date` and `latitude`/`longitude` or `distance`
+            k: Number of comparables per subject
+            as_of: Date ages and sale recency are measured at (defaults to today)
+
+        Returns:
+            For each subject, up to `k` candidates, most similar first, each with
+            its `similarity` from 0 to 1
+        """
+        if not subjects:
+            return []
+        if not candidates or k <= 0:
+            return [[] for _ in subjects]
+
+        as_of = as_of or date.today()
+        k = min(k, len(candidates))
+        subject_matrix, candidate_matrix, geographic = self._features(subjects, candidates, as_of)
+
+        # Missing values are imputed with the candidate mean, so a subject missing a feature favours typical candidates
+        known = ~np.isnan(candidate_matrix)
+        counts = known.sum(axis=0)
+        means = np.divide(np.nansum(candidate_matrix, axis=0), counts, out=np.zeros(len(counts)), where=counts > 0)
+        candidate_matrix = np.where(np.isnan(candidate_matrix), means, candidate_matrix)
+        subject_matrix = np.where(np.isnan(subject_matrix), means, subject_matrix)
+
+        scales = candidate_matrix.std(axis=0)
+        if geographic:
+            # Both coordinate columns share a scale so that distances are not distorted
+            scales[-3:-1] = np.sqrt((scales[-3] ** 2 + scales[-2] ** 2) / 2)
+        scales[scales == 0] = 1.0
+
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(subjects)
+        by_type: Dict[str, List[int]] = {}
+        for i, subject in enumerate(subjects):
+            by_type.setdefault(subject.get("type", ""), []).append(i)
+
+        for property_type, rows in by_type.items():
+            weights = self.feature_weights(property_type)
+            total_weight = np.sqrt(weights.sum()) or 1.0
+            if geographic:
+                # The distance weight applies to both coordinate columns
+                weights = np.concatenate([weights[:4], weights[4:5], weights[4:]])
+            scale = np.sqrt(weights) / scales
+            points = candidate_matrix * scale
+            queries = subject_matrix[rows] * scale
+
+            if len(candidates) > self.kd_tree_threshold:
+                distances, indexes = KDTree(points).query(queries, k=k)
+            else:
+                indexes = np.empty((len(rows), k), dtype=int)
+                distances = np.empty((len(rows), k))
+                # In blocks of subjects to bound the size of the distance matrix
+                for start in range(0, len(rows), BRUTE_FORCE_BLOCK):
+                    block = slice(start, start + BRUTE_FORCE_BLOCK)
+                    all_distances = np.sqrt(((queries[block, None, :] - points[None, :, :]) ** 2).sum(axis=2))
+                    indexes[block] = np.argsort(all_distances, axis=1, kind="stable")[:, :k]
+                    distances[block] = np.take_along_axis(all_distances, indexes[block], axis=1)
+
+            for row, row_indexes, row_distances in zip(rows, indexes, distances):
+                results[row] = [
+                    {**candidates[j], "similarity": round(float(1 / (1 + d / total_weight)), 4)}
+                    for j, d in zip(row_indexes, row_distances)
+                ]
+        return results
+
+    def _features(
+        self,
+        subjects: Sequence[Dict[str, Any]],
+        candidates: Sequence[Dict[str, Any]],
+        as_of: date
+    ) -> Tuple[np.ndarray, np.ndarray, bool]:
+        """
+        Build the raw feature matrices of the subjects and candidates.
+
+        Returns:
+            The subject matrix, the candidate matrix and whether distance is
+            given by two coordinate columns (miles east and north) instead of
+            the candidates' `distance` field
+        """
+        def attributes(record: Dict[str, Any]) -> List[float]:
+            year_built = _field(record, "year_built")
+            return [
+                _field(record, "size"),
+                as_of.year - year_built,
+                _field(record, "bedrooms"),
+                _field(record, "bathrooms")
+            ]
+
+        subject_coordinates = np.array([_coordinates(subject) for subject in subjects])
+        candidate_coordinates = np.array([_coordinates(candidate) for candidate in candidates])
+        geographic = bool(np.isfinite(subject_coordinates).all(axis=1).any() and np.isfinite(candidate_coordinates).all(axis=1).any())
+
+        subject_rows = [attributes(subject) for subject in subjects]
+        candidate_rows = [attributes(candidate) for candidate in candidates]
+        recency = [[_days_since(candidate.get("sale_date"), as_of)] for candidate in candidates]
+
+        if geographic:
+            # Equirectangular projection to miles around the candidates' mean latitude
+            cos_latitude = np.cos(np.radians(np.nanmean(candidate_coordinates[:, 0])))
+            projection = np.array([MILES_PER_DEGREE, MILES_PER_DEGREE * cos_latitude])
+            subject_matrix = np.hstack([subject_rows, subject_coordinates * projection, np.zeros((len(subjects), 1))])
+            candidate_matrix = np.hstack([candidate_rows, candidate_coordinates * projection, recency])
+        else:
+            distance = [[_number(candidate.get("distance"))] for candidate in candidates]
+            subject_matrix = np.hstack([subject_rows, np.zeros((len(subjects), 2))])
+            candidate_matrix = np.hstack([candidate_rows, distance, recency])
+
+        return subject_matrix.astype(float), candidate_matrix.astype(float), geographic
@@ -0,0 +1,212 @@
+"""
+Completion cache for the Appraisal AI Agent.
+This module caches deterministic LLM completions keyed by a hash of the full
+request, with an in-memory LRU tier and an optional SQLite tier on disk.
+"""
+import os
+import copy
+import json
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]],
+    temperature: float,
+    max_tokens: int
+) -> str:
+    """
+    Build the cache key for a completion request.
+
+    Args:
+        model: Model name
+        messages: Messages in API dict format
+        tools: Tools provided to the model, if any
+        temperature: Sampling temperature
+        max_tokens: Maximum number of tokens to generate
+
+    Returns:
+        SHA-256 hex digest of the canonical JSON encoding of the request
+    """
+    request = {
+        "model": model,
+        "messages": messages,
+        "tools": tools or None,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class CompletionCache:
+    """
+    Two-tier completion cache with TTL and size-based eviction.
+
+    The memory tier is an LRU bounded by `max_entries`. The disk tier, enabled when
+    `path` is set, is a SQLite database in WAL mode bounded by `max_disk_entries`
+    that survives restarts and is shared between worker processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        path: Optional[str] = None,
+        max_disk_entries: int = 10000
+    ):
+        """Initialize the cache, creating the disk database if needed."""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            connection = self._connection()
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    cache_key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_completions_created_at ON completions (created_at)")
+            connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the disk tier connection for the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached response.
+
+        Args:
+            key: Cache key from `make_cache_key`
+
+        Returns:
+            A copy of the cached response, so callers may modify it, or None if
+            it is missing or expired
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, response = entry
+                if now - created_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return copy.deepcopy(response)
+                del self._entries[key]
+                self.evictions += 1
+
+        if self.path:
+            try:
+                row = self._connection().execute(
+                    "SELECT response, created_at FROM completions WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl:
+                    response = json.loads(row[0])
+                    self._put_memory(key, copy.deepcopy(response), row[1])
+                    with self._lock:
+                        self.disk_hits += 1
+                    return response
+            except Exception as e:
+                logger.warning(f"Completion cache read failed: {str(e)}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Cache key from `make_cache_key`
+            response: Completion response to cache; a copy is stored, so the
+                caller may go on modifying it
+        """
+        now = time.time()
+        self._put_memory(key, copy.deepcopy(response), now)
+
+        if self.path:
+            try:
+                connection = self._connection()
+                connection.execute(
+                    "INSERT OR REPLACE INTO completions (cache_key, response, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(response, default=str), now)
+                )
+                # Drop expired rows, then the oldest rows beyond the size limit
+                connection.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+                connection.execute(
+                    """
+                    DELETE FROM completions WHERE cache_key IN (
+                        SELECT cache_key FROM completions ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_disk_entries,)
+                )
+                connection.commit()
+            except Exception as e:
+                logger.warning(f"Completion cache write failed: {str(e)}")
+
+    def _put_memory(self, key: str, response: Dict[str, Any], created_at: float) -> None:
+        """Store a response in the memory tier, evicting the least recently used entries."""
+        with self._lock:
+            self._entries[key] = (created_at, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers."""
+        with self._lock:
+            self._entries.clear()
+
+        if self.path:
+            connection = self._connection()
+            connection.execute("DELETE FROM completions")
+            connection.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss metrics for the cache."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
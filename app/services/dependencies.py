@@ -1,7 +1,13 @@
 """
 Service dependencies for FastAPI dependency injection.
 """
+from typing import Optional
+
+from app.core.config import settings
 from app.services.llm_service import LLMService
+from app.services.embedding_service import EmbeddingProvider, create_embedding_provider, create_embedding_provider_for_model
+from app.services.health_service import HealthMonitor
+from app.services.history_service import ConversationHistoryManager
 from app.services.property_data_service import PropertyDataService
 from app.services.web_search_service import WebSearchService
 
@@ -9,6 +15,10 @@ from app.services.web_search_service import WebSearchService
 _llm_service = None
 _property_data_service = None
 _web_search_service = None
+_embedding_provider = None
+_model_embedding_providers = {}
+_health_monitor = None
+_history_manager = None
 
 def get_llm_service() -> LLMService:
     """Get or create LLM service instance."""
@@ -17,6 +27,13 @@ def get_llm_service() -> LLMService:
         _llm_service = LLMService()
     return _llm_service
 
+async def close_llm_service() -> None:
+    """Close the LLM service connection pool if it was created."""
+    global _llm_service
+    if _llm_service is not None:
+        await _llm_service.close()
+        _llm_service = None
+
 def get_property_data_service() -> PropertyDataService:
     """Get or create property data service instance."""
     global _property_data_service, _web_search_service
@@ -32,3 +49,42 @@ def get_web_search_service() -> WebSearchService:
     if _web_search_service is None:
         _web_search_service = WebSearchService()
     return _web_search_service
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Get or create the configured embedding provider instance."""
+    global _embedding_provider
+    if _embedding_provider is None:
+        _embedding_provider = create_embedding_provider()
+    return _embedding_provider
+
+def get_embedding_provider_for_model(model_id: str) -> Optional[EmbeddingProvider]:
+    """Get or create the provider of an earlier embedding model, None if it cannot be recreated."""
+    if model_id not in _model_embedding_providers:
+        provider = create_embedding_provider_for_model(model_id)
+        if provider is None:
+            return None
+        _model_embedding_providers[model_id] = provider
+    return _model_embedding_providers[model_id]
+
+def get_health_monitor() -> HealthMonitor:
+    """Get or create the health monitor instance."""
+    global _health_monitor
+    if _health_monitor is None:
+        _health_monitor = HealthMonitor(
+            get_llm_service,
+            interval=settings.HEALTH_CHECK_INTERVAL,
+            timeout=settings.HEALTH_CHECK_TIMEOUT
+        )
+    return _health_monitor
+
+def get_history_manager() -> ConversationHistoryManager:
+    """Get or create the conversation history manager instance."""
+    global _history_manager
+    if _history_manager is None:
+        _history_manager = ConversationHistoryManager(
+            max_turns=settings.HISTORY_MAX_TURNS,
+            token_budget=settings.HISTORY_TOKEN_BUDGET,
+            summary_max_tokens=settings.HISTORY_SUMMARY_MAX_TOKENS,
+            cache_size=settings.HISTORY_SUMMARY_CACHE_SIZE
+        )
+    return _history_manager
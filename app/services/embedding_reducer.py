@@ -0,0 +1,235 @@
+"""
+Embedding dimensionality reduction for the Appraisal AI Agent.
+This module fits a PCA or random projection over full-dimension embeddings so
+that stored chunk vectors and query vectors can be scored at a lower dimension.
+"""
+import os
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import GaussianRandomProjection
+
+logger = logging.getLogger(__name__)
+
+REDUCTION_METHODS = ("pca", "random")
+
+class EmbeddingReducer:
+    """Projects full-dimension embeddings down to a smaller dimension."""
+
+    def __init__(self, method: str = "pca", dimension: int = 256, random_state: int = 42):
+        """
+        Initialize the embedding reducer.
+
+        Args:
+            method: Reduction method, 'pca' or 'random'
+            dimension: Target dimension
+            random_state: Seed for the projection
+        """
+        if method not in REDUCTION_METHODS:
+            raise ValueError(f"Unknown reduction method: {method}")
+
+        self.method = method
+        self.dimension = dimension
+        self.random_state = random_state
+        self.input_dimension: Optional[int] = None
+        self.projection = None
+        self.version = f"{method}-{dimension}"
+
+    def fit(self, embeddings: np.ndarray) -> "EmbeddingReducer":
+        """
+        Fit the projection on full-dimension embeddings.
+
+        Args:
+            embeddings: Array of shape (n_samples, input_dimension)
+
+        Returns:
+            The fitted reducer
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.dimension >= embeddings.shape[1]:
+            raise ValueError(
+                f"Target dimension {self.dimension} must be smaller than the embedding dimension {embeddings.shape[1]}"
+            )
+
+        if self.method == "pca":
+            if embeddings.shape[0] < self.dimension:
+                raise ValueError(
+                    f"PCA to {self.dimension} dimensions needs at least {self.dimension} embeddings, "
+                    f"got {embeddings.shape[0]}; use the 'random' method for small corpora"
+                )
+            projection = PCA(n_components=self.dimension, random_state=self.random_state)
+        else:
+            projection = GaussianRandomProjection(n_components=self.dimension, random_state=self.random_state)
+
+        projection.fit(normalize(embeddings))
+
+        self.projection = projection
+        self.input_dimension = embeddings.shape[1]
+        fingerprint = hashlib.sha256(self._components().tobytes()).hexdigest()[:16]
+        self.version = f"{self.method}-{self.dimension}-{fingerprint}"
+        return self
+
+    def transform(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Project embeddings to the target dimension.
+
+        Args:
+            embeddings: Array of shape (n_samples, input_dimension)
+
+        Returns:
+            Array of shape (n_samples, dimension) with L2-normalized rows
+        """
+        if self.projection is None:
+            raise ValueError("The embedding reducer has not been fitted")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[0] == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        return normalize(self.projection.transform(normalize(embeddings))).astype(np.float32)
+
+    def _components(self) -> np.ndarray:
+        """Get the projection matrix."""
+        components = self.projection.components_
+        return components.toarray() if hasattr(components, "toarray") else np.asarray(components)
+
+    def save(self, path: str) -> None:
+        """Save the reducer to disk."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingReducer":
+        """Load a reducer from disk."""
+        reducer = joblib.load(path)
+        if not isinstance(reducer, cls):
+            raise ValueError(f"{path} does not contain an {cls.__name__}")
+        return reducer
+
+
+def evaluate_recall(
+    embeddings: np.ndarray,
+    reducer: EmbeddingReducer,
+    k: int = 10,
+    sample_size: int = 200,
+    random_state: int = 42
+) -> Dict[str, Any]:
+    """
+    Measure how well the reduced vectors preserve full-dimension nearest neighbours.
+
+    A sample of the embeddings is used as queries against the whole set, and the
+    top-k neighbours at reduced dimension are compared with those at full dimension.
+
+    Args:
+        embeddings: Full-dimension embeddings of the corpus
+        reducer: Fitted reducer
+        k: Number of neighbours to compare
+        sample_size: Number of embeddings used as queries
+        random_state: Seed for sampling the queries
+
+    Returns:
+        Recall@k and the memory reduction of the reduced index
+    """
+    full = normalize(np.asarray(embeddings, dtype=np.float32))
+    reduced = reducer.transform(full)
+    n_samples = full.shape[0]
+    k = min(k, n_samples - 1)
+    if k < 1:
+        raise ValueError("At least 2 embeddings are required to evaluate recall")
+
+    rng = np.random.default_rng(random_state)
+    queries = rng.choice(n_samples, size=min(sample_size, n_samples), replace=False)
+
+    full_scores = full[queries] @ full.T
+    reduced_scores = reduced[queries] @ reduced.T
+
+    # A chunk is always its own nearest neighbour, so leave it out
+    full_scores[np.arange(len(queries)), queries] = -np.inf
+    reduced_scores[np.arange(len(queries)), queries] = -np.inf
+
+    full_top = np.argpartition(-full_scores, k - 1, axis=1)[:, :k]
+    reduced_top = np.argpartition(-reduced_scores, k - 1, axis=1)[:, :k]
+    overlap = [len(np.intersect1d(a, b, assume_unique=True)) for a, b in zip(full_top, reduced_top)]
+
+    report = {
+        "method": reducer.method,
+        "full_dimension": full.shape[1],
+        "reduced_dimension": reducer.dimension,
+        "memory_reduction": round(full.shape[1] / reducer.dimension, 2),
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": round(float(np.mean(overlap)) / k, 4)
+    }
+    if reducer.method == "pca":
+        report["explained_variance"] = round(float(np.sum(reducer.projection.explained_variance_ratio_)), 4)
+    return report
+
+
+# Loaded reducers, keyed by path and reloaded when the file on disk changes
+_reducers = {}
+_reducers_lock = threading.Lock()
+
+def get_reducer_path(path: str, version: Optional[str] = None) -> str:
+    """Get the path of the saved reducer, or of an earlier version of it."""
+    if version is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{version}{extension}"
+
+def get_embedding_reducer(path: str, version: Optional[str] = None) -> Optional[EmbeddingReducer]:
+    """
+    Get the fitted reducer stored at a path.
+
+    Args:
+        path: Path of the saved reducer
+        version: Version of the reducer to get, e.g. one that has since been
+            refitted; the current reducer when omitted
+
+    Returns:
+        The reducer, or None if none has been fitted yet (or the requested
+        version is no longer stored)
+    """
+    if version is not None:
+        current = get_embedding_reducer(path)
+        if current is not None and current.version == version:
+            return current
+        path = get_reducer_path(path, version)
+
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+
+    with _reducers_lock:
+        cached = _reducers.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            reducer = EmbeddingReducer.load(path)
+        except Exception as e:
+            logger.error(f"Error loading embedding reducer from {path}: {str(e)}")
+            reducer = None
+
+        _reducers[path] = (mtime, reducer)
+        return reducer
+
+def save_embedding_reducer(reducer: EmbeddingReducer, path: str) -> None:
+    """Save a fitted reducer and make it the active one for this process."""
+    # The reducer being replaced stays loadable by version, as the stored vectors
+    # are searched with it until a reindex switches them to the new one
+    previous = get_embedding_reducer(path)
+    if previous is not None and not os.path.exists(get_reducer_path(path, previous.version)):
+        previous.save(get_reducer_path(path, previous.version))
+
+    reducer.save(path)
+    with _reducers_lock:
+        _reducers[path] = (os.path.getmtime(path), reducer)
+    logger.info(f"Saved {reducer.method} embedding reducer ({reducer.dimension} dimensions) to {path}")
@@ -0,0 +1,409 @@
+"""
+Embedding providers for the Appraisal AI Agent.
+This module provides the pluggable embedding backends used by the RAG service
+and a persistent, content-addressed cache in front of them.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.services.embedding_reducer import REDUCTION_METHODS, EmbeddingReducer, get_embedding_reducer
+from app.services.local_embedding_service import get_local_embedding_model
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingProvider(ABC):
+    """Base class for embedding backends."""
+
+    dimension: int
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """Identifier of the model that produces the vectors."""
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One vector of length `dimension` per text
+        """
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Offline provider backed by the local scikit-learn embedding model."""
+
+    def __init__(self, dimension: int, version: Optional[str] = None):
+        """
+        Initialize the local embedding provider.
+
+        Args:
+            dimension: Size of the embedding vectors
+            version: Model version to embed with; the current model when omitted
+        """
+        self.dimension = dimension
+        self.version = version
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{get_local_embedding_model(self.dimension, version=self.version).version}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        model = get_local_embedding_model(self.dimension, version=self.version)
+        # CPU-bound for large batches, e.g. during a reindex, so kept off the event loop
+        embeddings = await asyncio.to_thread(model.embed, texts)
+        return embeddings.tolist()
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Provider for OpenAI-compatible embedding APIs such as Nebius."""
+
+    def __init__(self, model: str, dimension: int, api_key: str, base_url: str):
+        """Initialize the OpenAI-compatible embedding provider."""
+        self.model = model
+        self.dimension = dimension
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+    @property
+    def model_id(self) -> str:
+        return f"openai:{self.model}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+
+        response = await self.client.embeddings.create(model=self.model, input=texts)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+        if embeddings and len(embeddings[0]) != self.dimension:
+            raise ValueError(
+                f"Embedding model {self.model} returned {len(embeddings[0])} dimensions, "
+                f"expected EMBEDDING_DIMENSION={self.dimension}"
+            )
+        return embeddings
+
+
+class StubEmbeddingProvider(EmbeddingProvider):
+    """Deterministic pseudo-random embeddings for tests and load testing."""
+
+    def __init__(self, dimension: int):
+        """Initialize the stub embedding provider."""
+        self.dimension = dimension
+
+    @property
+    def model_id(self) -> str:
+        return f"stub:{self.dimension}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+            embeddings[i] = np.random.default_rng(seed).standard_normal(self.dimension)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings.tolist()
+
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache keyed by (model id, SHA-256 of text).
+
+    Backed by SQLite in WAL mode so it is shared across restarts and worker processes.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the cache, creating the database if needed."""
+        self.path = path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model_id TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model_id, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get the connection for the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, model_id: str, text_hashes: List[str]) -> Dict[str, List[float]]:
+        """Get the cached vectors for the given text hashes."""
+        found = {}
+        connection = self._connection()
+
+        # Stay below SQLite's bound parameter limit
+        for start in range(0, len(text_hashes), 500):
+            batch = text_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model_id = ? AND text_hash IN ({placeholders})",
+                [model_id, *batch]
+            ).fetchall()
+            for text_hash, vector in rows:
+                found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+        return found
+
+    def put_many(self, model_id: str, vectors: Dict[str, List[float]]) -> None:
+        """Store vectors for the given text hashes."""
+        now = time.time()
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model_id, text_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+            [
+                (model_id, text_hash, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for text_hash, vector in vectors.items()
+            ]
+        )
+        connection.commit()
+
+
+class CachedEmbeddingProvider(EmbeddingProvider):
+    """Provider wrapper that only sends texts missing from the cache to the backend."""
+
+    def __init__(self, provider: EmbeddingProvider, cache: EmbeddingCache, batch_size: int = 64):
+        """Initialize the cached embedding provider."""
+        self.provider = provider
+        self.cache = cache
+        self.batch_size = batch_size
+        self.dimension = provider.dimension
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model_id(self) -> str:
+        return self.provider.model_id
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        model_id = self.provider.model_id
+        text_hashes = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+
+        try:
+            found = self.cache.get_many(model_id, list(set(text_hashes)))
+        except Exception as e:
+            logger.error(f"Error reading embedding cache: {str(e)}")
+            found = {}
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+
+        self.hits += sum(1 for text_hash in text_hashes if text_hash in found)
+        self.misses += len(missing)
+
+        missing_hashes = list(missing)
+        for start in range(0, len(missing_hashes), self.batch_size):
+            batch = missing_hashes[start:start + self.batch_size]
+            embeddings = await self.provider.embed([missing[text_hash] for text_hash in batch])
+            computed = dict(zip(batch, embeddings))
+            found.update(computed)
+
+            try:
+                self.cache.put_many(model_id, computed)
+            except Exception as e:
+                logger.error(f"Error writing embedding cache: {str(e)}")
+
+        return [found[text_hash] for text_hash in text_hashes]
+
+
+class ReducedEmbeddingProvider(EmbeddingProvider):
+    """
+    Provider wrapper that projects vectors with the fitted embedding reducer.
+
+    Until a reducer matching the wrapped provider has been fitted, vectors pass
+    through at full dimension. A fitted reducer whose method or dimension differs
+    from the configured ones is an error rather than silently used.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        reducer_path: str,
+        method: Optional[str] = None,
+        dimension: Optional[int] = None,
+        version: Optional[str] = None
+    ):
+        """
+        Initialize the reduced embedding provider.
+
+        Args:
+            provider: Provider of the full-dimension vectors
+            reducer_path: Path of the fitted reducer
+            method: Reduction method the reducer must use, if any
+            dimension: Dimension the reducer must project to, if any
+            version: Reducer version to project with; the current reducer when omitted
+        """
+        self.provider = provider
+        self.reducer_path = reducer_path
+        self.method = method
+        self.reduced_dimension = dimension
+        self.version = version
+
+    @property
+    def reducer(self) -> Optional[EmbeddingReducer]:
+        """
+        The active reducer, if one has been fitted for the wrapped provider.
+
+        Raises:
+            ValueError: If the reducer's method or dimension differs from the configured ones
+        """
+        reducer = get_embedding_reducer(self.reducer_path, self.version)
+        if reducer is None or reducer.input_dimension != self.provider.dimension:
+            return None
+        if (self.method and reducer.method != self.method) or (self.reduced_dimension and reducer.dimension != self.reduced_dimension):
+            raise ValueError(
+                f"The embedding reducer at {self.reducer_path} projects with {reducer.method} to {reducer.dimension} "
+                f"dimensions, but {self.method} to {self.reduced_dimension} dimensions is configured; "
+                f"refit it with reindex_embeddings.py --reduce {self.method} --dimension {self.reduced_dimension}"
+            )
+        return reducer
+
+    @property
+    def dimension(self) -> int:
+        reducer = self.reducer
+        return reducer.dimension if reducer else self.provider.dimension
+
+    @property
+    def model_id(self) -> str:
+        reducer = self.reducer
+        return f"{self.provider.model_id}+{reducer.version}" if reducer else self.provider.model_id
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        embeddings = await self.provider.embed(texts)
+        reducer = self.reducer
+        if reducer is None:
+            return embeddings
+        return reducer.transform(np.asarray(embeddings, dtype=np.float32)).tolist()
+
+
+def _openai_provider(model: str) -> OpenAIEmbeddingProvider:
+    """Create a provider for a model of the configured OpenAI-compatible API."""
+    return OpenAIEmbeddingProvider(
+        model=model,
+        dimension=settings.EMBEDDING_DIMENSION,
+        api_key=settings.NEBIUS_API_KEY,
+        base_url=settings.NEBIUS_ENDPOINT.rsplit("/chat/completions", 1)[0]
+    )
+
+
+def _with_cache(provider: EmbeddingProvider) -> EmbeddingProvider:
+    """Wrap a provider in the persistent embedding cache, if enabled."""
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return provider
+    return CachedEmbeddingProvider(
+        provider,
+        EmbeddingCache(settings.EMBEDDING_CACHE_PATH),
+        batch_size=settings.EMBEDDING_BATCH_SIZE
+    )
+
+
+def create_embedding_provider(provider_name: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create the embedding provider configured in settings.
+
+    Args:
+        provider_name: Optional provider name overriding settings.EMBEDDING_PROVIDER
+
+    Returns:
+        The embedding provider, wrapped in the persistent cache and the
+        dimensionality reduction stage if enabled
+    """
+    provider_name = (provider_name or settings.EMBEDDING_PROVIDER).lower()
+
+    if provider_name == "local":
+        provider = LocalEmbeddingProvider(settings.EMBEDDING_DIMENSION)
+    elif provider_name == "openai":
+        provider = _openai_provider(settings.EMBEDDING_MODEL)
+    elif provider_name == "stub":
+        provider = StubEmbeddingProvider(settings.EMBEDDING_DIMENSION)
+    else:
+        raise ValueError(f"Unknown embedding provider: {provider_name}")
+
+    provider = _with_cache(provider)
+
+    # Reduce after the cache so refitting the reducer reuses the cached full vectors
+    reduction = settings.EMBEDDING_REDUCTION.lower()
+    if reduction in REDUCTION_METHODS:
+        provider = ReducedEmbeddingProvider(
+            provider,
+            settings.EMBEDDING_REDUCER_PATH,
+            method=reduction,
+            dimension=settings.EMBEDDING_REDUCED_DIMENSION
+        )
+    elif reduction != "none":
+        raise ValueError(f"Unknown embedding reduction: {settings.EMBEDDING_REDUCTION}")
+
+    logger.info(f"Using {provider_name} embedding provider with {reduction} reduction")
+    return provider
+
+
+def create_embedding_provider_for_model(model_id: str) -> Optional[EmbeddingProvider]:
+    """
+    Recreate the provider of an embedding model from its model ID, e.g. to embed
+    queries for stored vectors until a reindex switches them to another model.
+
+    Local models and reducers that have since been refitted are loaded by
+    version; OpenAI-compatible models are assumed to have EMBEDDING_DIMENSION.
+
+    Args:
+        model_id: Model ID the vectors were stored with
+
+    Returns:
+        The provider, or None if the model can no longer be recreated
+    """
+    base_model_id, _, reducer_version = model_id.partition("+")
+    provider_name, _, model = base_model_id.partition(":")
+
+    try:
+        if provider_name == "local":
+            # Local model versions are "hashing-<dimension>" or "lsa-<dimension>-<fingerprint>"
+            provider = LocalEmbeddingProvider(int(model.split("-")[1]), version=model)
+        elif provider_name == "openai":
+            provider = _openai_provider(model)
+        elif provider_name == "stub":
+            provider = StubEmbeddingProvider(int(model))
+        else:
+            return None
+
+        provider = _with_cache(provider)
+        if reducer_version:
+            provider = ReducedEmbeddingProvider(provider, settings.EMBEDDING_REDUCER_PATH, version=reducer_version)
+
+        # A reducer version that is no longer stored leaves vectors unreduced
+        if provider.model_id != model_id:
+            return None
+    except (IndexError, ValueError, OSError) as e:
+        logger.warning(f"Cannot recreate embedding model {model_id}: {str(e)}")
+        return None
+
+    return provider
@@ -0,0 +1,124 @@
+"""
+Health monitoring for the Appraisal AI Agent.
+This service checks the LLM backend and the database in the background and
+caches the result, so health probes never do I/O themselves.
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+class HealthMonitor:
+    """Periodically refreshed, cached status of the service dependencies."""
+
+    def __init__(
+        self,
+        get_llm_service: Callable[[], Any],
+        interval: float = 60,
+        timeout: float = 10
+    ):
+        """
+        Initialize the health monitor.
+
+        Args:
+            get_llm_service: Returns the LLM service to check
+            interval: Seconds between refreshes
+            timeout: Seconds allowed for each check
+        """
+        self.get_llm_service = get_llm_service
+        self.interval = interval
+        self.timeout = timeout
+
+        self.llm_status = "unknown"
+        self.database_status = "unknown"
+        self.checked_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        """Check the LLM backend and the database and cache the results."""
+        self.llm_status, self.database_status = await asyncio.gather(
+            self._check_llm(),
+            self._check_database()
+        )
+        self.checked_at = datetime.now()
+
+    async def _check_llm(self) -> str:
+        """Get the LLM status, only sending a probe if no real call succeeded recently."""
+        try:
+            llm_service = self.get_llm_service()
+
+            last_success_at = getattr(llm_service, "last_success_at", None)
+            if last_success_at is not None and time.time() - last_success_at < self.interval:
+                return "ok"
+
+            connected = await asyncio.wait_for(llm_service.check_connection(), self.timeout)
+            return "ok" if connected else "error: connection check failed"
+        except asyncio.TimeoutError:
+            return "error: connection check timed out"
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    async def _check_database(self) -> str:
+        """Get the database status by running a trivial query."""
+        def ping() -> None:
+            db = SessionLocal()
+            try:
+                db.execute(text("SELECT 1"))
+            finally:
+                db.close()
+
+        try:
+            await asyncio.wait_for(asyncio.to_thread(ping), self.timeout)
+            return "ok"
+        except asyncio.TimeoutError:
+            return "error: database check timed out"
+        except Exception as e:
+            return f"error: {str(e)}"
+
+    @property
+    def ready(self) -> bool:
+        """Whether the service can take traffic; the LLM only counts if HEALTH_REQUIRE_LLM is set."""
+        if self.database_status != "ok":
+            return False
+        return self.llm_status == "ok" or not settings.HEALTH_REQUIRE_LLM
+
+    def status(self) -> Dict[str, Any]:
+        """Get the cached status."""
+        return {
+            "ready": self.ready,
+            "llm_status": self.llm_status,
+            "database_status": self.database_status,
+            "checked_at": self.checked_at.isoformat() if self.checked_at else None
+        }
+
+    async def _run(self) -> None:
+        """Refresh the status until cancelled."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health check refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Start refreshing the status in the background."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background refresh."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,165 @@
+"""
+Conversation history compaction for the Appraisal AI Agent.
+This service keeps the most recent turns of a conversation verbatim, folds
+older turns into a rolling summary and caps the history to a token budget.
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.services.llm_service import Message
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a real estate appraiser and an AI assistant.
+Update the summary with the new messages below. Keep every property, address, figure, valuation,
+decision and open question that later turns may rely on. Answer with the updated summary only.
+"""
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimate the number of tokens in a text (about four characters per token)."""
+    return len(text or "") // 4 + 1
+
+def _message_tokens(message: Message) -> int:
+    """Estimate the tokens a message takes up in a prompt, including its tool calls."""
+    tokens = estimate_tokens(message.content) + 4
+    for tool_call in message.tool_calls or []:
+        tokens += estimate_tokens(str(tool_call.get("function", {})))
+    return tokens
+
+def _message_hash(message: Message) -> str:
+    """Hash a message so summarized prefixes can be recognised on later turns."""
+    return hashlib.sha256(f"{message.role}\x00{message.content}".encode()).hexdigest()
+
+def _split_turns(messages: List[Message]) -> List[List[Message]]:
+    """Group messages into turns, each starting at a user message with the replies and tool results that follow."""
+    turns = []
+    for message in messages:
+        if message.role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+class ConversationHistoryManager:
+    """Compacts long conversations before they are sent to the LLM."""
+
+    def __init__(
+        self,
+        max_turns: int = 6,
+        token_budget: int = 6000,
+        summary_max_tokens: int = 512,
+        cache_size: int = 1000
+    ):
+        """
+        Initialize the history manager.
+
+        Args:
+            max_turns: Number of recent turns kept verbatim; the last turn is
+                always kept, even when this is 0
+            token_budget: Maximum estimated tokens for the compacted history
+            summary_max_tokens: Maximum tokens for the rolling summary
+            cache_size: Number of conversations whose summary is cached
+        """
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_max_tokens = summary_max_tokens
+        self.cache_size = cache_size
+
+        # conversation key -> {"hashes": hashes of the summarized messages, "summary": text}
+        self._summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def compact(
+        self,
+        messages: List[Message],
+        llm_service: Any,
+        conversation_id: Optional[str] = None
+    ) -> List[Message]:
+        """
+        Compact a conversation history.
+
+        Args:
+            messages: The conversation without the system prompt
+            llm_service: LLM service used to write the summary
+            conversation_id: Identifier of the conversation; defaults to a hash of its first message
+
+        Returns:
+            The history to send: a summary of older turns as a system message
+            followed by the most recent turns. Turns beyond `max_turns` and turns
+            that do not fit the token budget are both summarized.
+        """
+        turns = _split_turns(messages)
+        total_tokens = sum(_message_tokens(message) for message in messages)
+        if len(turns) <= self.max_turns and total_tokens <= self.token_budget:
+            return messages
+
+        def turn_tokens(kept_turns: List[List[Message]]) -> int:
+            return sum(_message_tokens(message) for turn in kept_turns for message in turn)
+
+        # The last turn holds the current question, so it is kept even when max_turns is 0
+        split = max(len(turns) - max(self.max_turns, 1), 0)
+
+        # Move the oldest verbatim turns into the summary until the history fits the
+        # budget, leaving room for the summary itself
+        budget = self.token_budget - self.summary_max_tokens - _message_tokens(Message(role="system", content=SUMMARY_HEADER))
+        while split < len(turns) - 1 and turn_tokens(turns[split:]) > budget:
+            split += 1
+
+        older = [message for turn in turns[:split] for message in turn]
+        summary = None
+        if older:
+            key = conversation_id or _message_hash(messages[0])
+            summary = await self._get_summary(key, older, llm_service)
+
+        compacted = []
+        if summary:
+            compacted.append(Message(role="system", content=f"{SUMMARY_HEADER}\n{summary}"))
+        return compacted + [message for turn in turns[split:] for message in turn]
+
+    async def _get_summary(self, key: str, older: List[Message], llm_service: Any) -> Optional[str]:
+        """Get the rolling summary of the older messages, only summarizing messages not yet covered."""
+        hashes = [_message_hash(message) for message in older]
+        cached = self._summaries.get(key)
+
+        previous_summary = None
+        new_messages = older
+        if cached and hashes[:len(cached["hashes"])] == cached["hashes"]:
+            previous_summary = cached["summary"]
+            new_messages = older[len(cached["hashes"]):]
+            self._summaries.move_to_end(key)
+            if not new_messages:
+                return previous_summary
+
+        try:
+            summary = await self._summarize(previous_summary, new_messages, llm_service)
+        except Exception as e:
+            # Without a fresh summary, the older turns are dropped rather than failing the request
+            logger.warning(f"Error summarizing conversation history: {str(e)}")
+            return previous_summary
+
+        self._summaries[key] = {"hashes": hashes, "summary": summary}
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+        return summary
+
+    async def _summarize(self, previous_summary: Optional[str], messages: List[Message], llm_service: Any) -> str:
+        """Ask the LLM to fold new messages into the previous summary."""
+        transcript = "\n".join(
+            f"{message.role}: {message.content}" for message in messages if message.content
+        )
+        prompt = f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+
+        response = await llm_service.generate_completion(
+            messages=[
+                Message(role="system", content=SUMMARY_PROMPT),
+                Message(role="user", content=prompt)
+            ],
+            temperature=0,
+            max_tokens=self.summary_max_tokens
+        )
+        return response["choices"][0]["message"]["content"].strip()
@@ -0,0 +1,331 @@
+"""
+Resilience helpers for calls to the LLM backend.
+This module provides an adaptive (AIMD) concurrency limiter, the retry
+backoff policy and request hedging used by the LLM service.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import openai
+
+# HTTP statuses worth retrying; 429 and 503 also signal that the backend is overloaded
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+OVERLOAD_STATUS_CODES = {429, 503}
+
+def is_retryable_error(error: Exception) -> bool:
+    """Whether a failed LLM call may succeed if retried."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def is_overload_error(error: Exception) -> bool:
+    """Whether a failed LLM call indicates that the backend is overloaded."""
+    if isinstance(error, (openai.APITimeoutError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in OVERLOAD_STATUS_CODES
+    return False
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Get the delay before a retry using exponential backoff with full jitter.
+
+    Args:
+        attempt: Number of the retry, starting at 0
+        base_delay: Delay cap for the first retry in seconds
+        max_delay: Maximum delay in seconds
+
+    Returns:
+        A random delay between 0 and min(max_delay, base_delay * 2 ** attempt)
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Client-side concurrency gate with an AIMD limit.
+
+    The limit grows by about one slot per `limit` successful calls (additive
+    increase) and halves when a call is rejected with 429/503, times out or takes
+    longer than `latency_threshold` (multiplicative decrease). Only calls started
+    after the last decrease can cause another one, so a burst of failures from
+    requests sent at the old limit halves it once rather than collapsing it.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 16,
+        min_limit: int = 1,
+        max_limit: int = 100,
+        latency_threshold: float = 30.0
+    ):
+        """Initialize the limiter."""
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_threshold = latency_threshold
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+        self.increases = 0
+        self.decreases = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: Optional[float] = None) -> float:
+        """
+        Wait for a free slot.
+
+        Args:
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            The monotonic start time of the call, to pass to `release`
+
+        Raises:
+            asyncio.TimeoutError: If no slot became free within `timeout`
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while self.in_flight >= int(self.limit):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self.rejected += 1
+                raise asyncio.TimeoutError("Timed out waiting for an LLM concurrency slot")
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Pass on a wake-up this waiter can no longer use
+                if waiter.done() and not waiter.cancelled():
+                    self._waiters.remove(waiter)
+                    self._wake_waiters()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+        self.in_flight += 1
+        return time.monotonic()
+
+    def release(
+        self,
+        started_at: float,
+        overloaded: bool = False,
+        cancelled: bool = False,
+        latency: Optional[float] = None
+    ) -> None:
+        """
+        Free a slot and adapt the limit to the outcome of the call.
+
+        Args:
+            started_at: Start time returned by `acquire`
+            overloaded: Whether the call failed with an overload error
+            cancelled: Whether the call was cancelled, which says nothing about the backend
+            latency: Latency to judge the call by, when not the time since `started_at`
+                (e.g. the time a stream took to open, rather than to be read)
+        """
+        self.in_flight -= 1
+        if latency is None:
+            latency = time.monotonic() - started_at
+
+        if cancelled:
+            pass
+        elif overloaded or latency > self.latency_threshold:
+            if started_at >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = time.monotonic()
+                self.decreases += 1
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.increases += 1
+
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        """Wake as many waiters as there are free slots."""
+        free_slots = int(self.limit) - self.in_flight
+        for waiter in list(self._waiters)[:max(free_slots, 0)]:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get limiter metrics."""
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rejected": self.rejected
+        }
+
+
+class RequestHedger:
+    """
+    Hedges slow requests to cut tail latency.
+
+    If a call has not completed within the running percentile of recent
+    latencies, a duplicate is sent and whichever finishes first wins; the other
+    is cancelled. Hedges are paid for from a budget that earns `budget_ratio`
+    of a hedge per request, which caps the extra load on the backend.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        budget_ratio: float = 0.05,
+        min_samples: int = 20,
+        window: int = 1000,
+        max_burst: float = 10
+    ):
+        """Initialize the hedger."""
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.min_samples = min_samples
+        self.max_burst = max_burst
+
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._budget = 0.0
+
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Get the delay after which a request is hedged, or None until enough latencies are known."""
+        if not self._latencies or len(self._latencies) < self.min_samples:
+            return None
+        latencies = sorted(self._latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return latencies[index]
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a call, hedging it if it is slower than the latency percentile.
+
+        Args:
+            call: Coroutine function performing the request; called again for the hedge
+
+        Returns:
+            The result of the first call to succeed
+        """
+        self.requests += 1
+        self._budget = min(self.max_burst, self._budget + self.budget_ratio)
+        delay = self.hedge_delay()
+        started_at = time.monotonic()
+
+        tasks = {asyncio.ensure_future(call())}
+        hedge = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._budget >= 1:
+                self._budget -= 1
+                self.hedges += 1
+                hedge = asyncio.ensure_future(call())
+                tasks.add(hedge)
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        self._latencies.append(time.monotonic() - started_at)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hedging metrics."""
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+            "hedge_delay": self.hedge_delay()
+        }
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the LLM backend.
+
+    The circuit opens after `failure_threshold` consecutive failures and then
+    rejects calls immediately. After `recovery_timeout` seconds it lets
+    `half_open_max_calls` trial calls through: a success closes the circuit, a
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        """Initialize the circuit breaker."""
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_calls = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow_request(self) -> bool:
+        """Whether a call may go ahead; every allowed call must be followed by one `record_*` call."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self._trial_calls = 0
+
+        if self.state == "half_open":
+            if self._trial_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self._trial_calls += 1
+
+        return True
+
+    def record_success(self) -> None:
+        """Record a call that reached a healthy backend."""
+        self.consecutive_failures = 0
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        """Record a call that failed because of the backend."""
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def record_cancelled(self) -> None:
+        """Record a call that was cancelled before its outcome was known."""
+        if self.state == "half_open":
+            self._trial_calls -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get circuit breaker metrics."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
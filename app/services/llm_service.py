@@ -2,12 +2,27 @@
 LLM service for interacting with Nebius API to access language models.
 """
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional
+import httpx
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 from app.core.config import settings
+from app.services.completion_cache import CompletionCache, make_cache_key
+from app.services.single_flight import SingleFlight
+from app.services.model_router import create_model_router
+from app.services.metrics_service import llm_metrics
+from app.services.llm_resilience import (
+    AdaptiveConcurrencyLimiter,
+    CircuitBreaker,
+    RequestHedger,
+    backoff_delay,
+    is_overload_error,
+    is_retryable_error
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +32,35 @@ class Message(BaseModel):
     """Message model for LLM conversations."""
     role: str
     content: str
+    name: Optional[str] = None
+    tool_call_id: Optional[str] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+
+def format_messages(messages: List[Message]) -> List[Dict[str, Any]]:
+    """Convert Message objects to the dict format expected by the API."""
+    formatted_messages = []
+    for msg in messages:
+        formatted = {"role": msg.role, "content": msg.content}
+        if msg.name:
+            formatted["name"] = msg.name
+        if msg.tool_call_id:
+            formatted["tool_call_id"] = msg.tool_call_id
+        if msg.tool_calls:
+            formatted["tool_calls"] = msg.tool_calls
+        formatted_messages.append(formatted)
+    return formatted_messages
+
+class LLMServiceError(Exception):
+    """Raised when the LLM API call fails after all retries."""
+
+class LLMDeadlineExceeded(LLMServiceError):
+    """Raised when an LLM request does not complete before its deadline."""
+
+class LLMCircuitOpenError(LLMServiceError):
+    """Raised without calling the API while the circuit breaker is open."""
 
 class LLMService:
-    """Service for interacting with Nebius LLM API using OpenAI client."""
+    """Service for interacting with Nebius LLM API using the async OpenAI client."""
     
     def __init__(self):
         """Initialize the LLM service."""
@@ -27,15 +68,93 @@ class LLMService:
         self.base_url = settings.NEBIUS_ENDPOINT.rsplit("/chat/completions", 1)[0]
         self.model = settings.MODEL_NAME
         
-        # Initialize OpenAI client with Nebius configuration
-        self.client = OpenAI(
+        # Shared connection pool so concurrent requests reuse keep-alive connections
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+        )
+        
+        # Initialize async OpenAI client with Nebius configuration
+        self.client = AsyncOpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            http_client=self.http_client,
+            max_retries=0  # Retries are handled by _call_api
+        )
+        
+        # Cache for deterministic completions
+        self.cache = None
+        if settings.LLM_CACHE_ENABLED:
+            self.cache = CompletionCache(
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                ttl=settings.LLM_CACHE_TTL,
+                path=settings.LLM_CACHE_PATH or None,
+                max_disk_entries=settings.LLM_CACHE_MAX_DISK_ENTRIES
+            )
+        
+        # Adaptive client-side concurrency gate
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=settings.LLM_CONCURRENCY_INITIAL,
+            min_limit=settings.LLM_CONCURRENCY_MIN,
+            max_limit=settings.LLM_CONCURRENCY_MAX,
+            latency_threshold=settings.LLM_LATENCY_THRESHOLD
         )
+        self.retries = 0
+        self.last_success_at: Optional[float] = None
+        
+        # Fail fast while the backend is down
+        self.circuit_breaker = None
+        if settings.LLM_CIRCUIT_BREAKER_ENABLED:
+            self.circuit_breaker = CircuitBreaker(
+                failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                recovery_timeout=settings.LLM_CIRCUIT_RECOVERY_TIMEOUT
+            )
+        
+        # Optional hedging of slow requests
+        self.hedger = None
+        if settings.LLM_HEDGING_ENABLED:
+            self.hedger = RequestHedger(
+                percentile=settings.LLM_HEDGE_PERCENTILE,
+                budget_ratio=settings.LLM_HEDGE_BUDGET,
+                min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+            )
+        
+        # Coalescing of identical in-flight requests
+        self.single_flight = SingleFlight() if settings.LLM_COALESCE_REQUESTS else None
+        
+        # Routing of simple requests to a smaller model
+        self.router = create_model_router(settings)
         
         logger.info(f"Initialized LLM service with model: {self.model}")
         logger.info(f"Using base URL: {self.base_url}")
     
+    def get_stats(self) -> Dict[str, Any]:
+        """Get metrics for the cache, request coalescing, concurrency limiter, hedging, circuit breaker and model routing."""
+        return {
+            "cache": self.cache.stats() if self.cache else None,
+            "coalescing": self.single_flight.stats() if self.single_flight else None,
+            "limiter": {**self.limiter.stats(), "retries": self.retries},
+            "hedging": self.hedger.stats() if self.hedger else None,
+            "circuit_breaker": self.circuit_breaker.stats() if self.circuit_breaker else None,
+            "routing": self.router.stats() if self.router else None
+        }
+    
+    def select_model(self, formatted_messages: List[Dict[str, Any]], model: Optional[str] = None) -> str:
+        """Get the model for a request: the one asked for, else the router's choice, else MODEL_NAME."""
+        if model:
+            return model
+        if self.router is not None:
+            return self.router.route(formatted_messages)[0]
+        return self.model
+    
+    async def close(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        await self.client.close()
+    
     async def check_connection(self) -> bool:
         """
         Check if the connection to the LLM API is working.
@@ -43,7 +162,7 @@ class LLMService:
         """
         # Simple test query to check if the API is responsive
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant."},
@@ -62,7 +181,10 @@ class LLMService:
         messages: List[Message], 
         temperature: float = 0.7,
         max_tokens: int = 1024,
-        tools: Optional[List[Dict[str, Any]]] = None
+        tools: Optional[List[Dict[str, Any]]] = None,
+        use_cache: Optional[bool] = None,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a completion from the LLM.
@@ -72,44 +194,310 @@ class LLMService:
             temperature: Temperature for generation (0.0 to 1.0)
             max_tokens: Maximum number of tokens to generate
             tools: Optional list of tools to provide to the model
+            use_cache: Whether to use the completion cache; by default only
+                deterministic (temperature 0) requests are cached
+            timeout: Deadline in seconds for the request, including queueing
+                and retries (defaults to LLM_REQUEST_DEADLINE)
+            model: Model to use instead of the routed one
             
         Returns:
             The LLM response
+            
+        Raises:
+            LLMServiceError: If the request fails after all retries
+            LLMDeadlineExceeded: If the request does not complete within the deadline
         """
+        deadline = time.monotonic() + (timeout or settings.LLM_REQUEST_DEADLINE)
+        
         # Convert Message objects to dict format expected by API
-        formatted_messages = [{"role": msg.role, "content": msg.content} for msg in messages]
+        formatted_messages = format_messages(messages)
+        model = self.select_model(formatted_messages, model)
+        
+        if use_cache is None:
+            use_cache = temperature == 0
+        
+        # The same fingerprint keys the cache and request coalescing
+        request_key = make_cache_key(model, formatted_messages, tools, temperature, max_tokens)
+        use_cache = use_cache and self.cache is not None
+        
+        started_at = time.monotonic()
+        if use_cache:
+            cached_response = self.cache.get(request_key)
+            if cached_response is not None:
+                llm_metrics.record_request(model, time.monotonic() - started_at, cache="hit")
+                return cached_response
+        
+        def create() -> Awaitable[Dict[str, Any]]:
+            return self._create_completion(
+                model, formatted_messages, temperature, max_tokens, tools, deadline,
+                cache_key=request_key if use_cache else None
+            )
         
         try:
-            # Create completion request
-            if tools:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=formatted_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    tools=tools
-                )
+            if self.single_flight is None:
+                response = await create()
             else:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=formatted_messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
+                # Identical concurrent requests share one upstream call
+                response = await self.single_flight.do(request_key, create)
+        except LLMServiceError:
+            llm_metrics.record_request(model, time.monotonic() - started_at, status="error")
+            raise
+        
+        llm_metrics.record_request(model, time.monotonic() - started_at)
+        return response
+    
+    async def _create_completion(
+        self,
+        model: str,
+        formatted_messages: List[Dict[str, Any]],
+        temperature: float,
+        max_tokens: int,
+        tools: Optional[List[Dict[str, Any]]],
+        deadline: float,
+        cache_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Send a completion request to the API, caching the response under `cache_key` if given."""
+        request = {
+            "model": model,
+            "messages": formatted_messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if tools:
+            request["tools"] = tools
+        
+        if self.hedger is not None:
+            response = await self.hedger.run(lambda: self._call_api(request, deadline))
+        else:
+            response = await self._call_api(request, deadline)
+        
+        # Convert response to dictionary
+        result = response.model_dump()
+        llm_metrics.record_usage(model, result.get("usage"))
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+    
+    async def _call_api(self, request: Dict[str, Any], deadline: float, hold_slot: bool = False) -> Any:
+        """
+        Call the chat completions API through the circuit breaker and concurrency
+        limiter, retrying retryable errors with exponential backoff until the deadline.
+        
+        Args:
+            request: Keyword arguments for the chat completions API
+            deadline: Monotonic time by which the call must complete
+            hold_slot: Whether the limiter slot stays taken after the call
+                returns, e.g. while a stream is read
+            
+        Returns:
+            The API response, or with `hold_slot` the response and a function
+            that frees the slot
+        """
+        attempt = 0
+        while True:
+            if self.circuit_breaker is not None and not self.circuit_breaker.allow_request():
+                raise LLMCircuitOpenError("LLM backend is unavailable (circuit open)")
+            
+            remaining = deadline - time.monotonic()
+            try:
+                started_at = await self.limiter.acquire(timeout=remaining)
+            except asyncio.TimeoutError:
+                self._record_circuit("cancelled")
+                raise LLMDeadlineExceeded("LLM request deadline exceeded while waiting for capacity")
+            except asyncio.CancelledError:
+                self._record_circuit("cancelled")
+                raise
+            
+            outcome = "cancelled"
+            overloaded = False
+            held = False
+            try:
+                # The client's own timeout does not cover everything (e.g. waiting for a connection)
+                remaining = max(deadline - time.monotonic(), 0.001)
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(**request, timeout=remaining),
+                    timeout=remaining
                 )
+                outcome = "success"
+                self.last_success_at = time.time()
+                if not hold_slot:
+                    return response
+                held = True
+                return response, self._slot_releaser(started_at, time.monotonic() - started_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                overloaded = is_overload_error(e)
+                # Only errors that point at the backend count against the circuit
+                outcome = "failure" if is_retryable_error(e) else "success"
+            finally:
+                if not held:
+                    self.limiter.release(started_at, overloaded=overloaded, cancelled=outcome == "cancelled")
+                self._record_circuit(outcome)
             
-            # Convert response to dictionary
-            return response.model_dump()
+            logger.warning(f"LLM API call failed (attempt {attempt + 1}): {str(error)}")
+            if time.monotonic() >= deadline:
+                raise LLMDeadlineExceeded(f"LLM request deadline exceeded after {attempt + 1} attempts") from error
+            if not is_retryable_error(error) or attempt >= settings.LLM_MAX_RETRIES:
+                raise LLMServiceError(f"Exception during LLM API call: {str(error)}") from error
             
-        except Exception as e:
-            logger.error(f"Exception during LLM API call: {str(e)}")
-            return {"error": "Exception during API call", "details": str(e)}
+            delay = backoff_delay(attempt, settings.LLM_RETRY_BASE_DELAY, settings.LLM_RETRY_MAX_DELAY)
+            if time.monotonic() + delay >= deadline:
+                raise LLMDeadlineExceeded(f"LLM request deadline exceeded after {attempt + 1} attempts") from error
+            
+            self.retries += 1
+            llm_metrics.record_retry(request["model"])
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    def _slot_releaser(self, started_at: float, latency: float) -> Callable[[], None]:
+        """Get a function that frees a held limiter slot once, judging the call by `latency`."""
+        released = False
+        
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.limiter.release(started_at, latency=latency)
+        
+        return release
+    
+    def _record_circuit(self, outcome: str) -> None:
+        """Report the outcome of an allowed call ("success", "failure" or "cancelled") to the circuit breaker."""
+        if self.circuit_breaker is None:
+            return
+        if outcome == "success":
+            self.circuit_breaker.record_success()
+        elif outcome == "failure":
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_cancelled()
+    
+    async def stream_completion(
+        self,
+        messages: List[Message],
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a completion from the LLM.
+        
+        Args:
+            messages: List of messages in the conversation
+            temperature: Temperature for generation (0.0 to 1.0)
+            max_tokens: Maximum number of tokens to generate
+            tools: Optional list of tools to provide to the model
+            model: Model to use instead of the routed one
+            timeout: Deadline in seconds for opening the stream, including
+                queueing and retries (defaults to LLM_REQUEST_DEADLINE)
+            
+        Yields:
+            {"type": "token", "content": ...} for every content delta, then one
+            {"type": "message", "message": ..., "finish_reason": ...} with the
+            assembled assistant message, including any tool calls
+        """
+        formatted_messages = format_messages(messages)
+        model = self.select_model(formatted_messages, model)
+        request = {
+            "model": model,
+            "messages": formatted_messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        if settings.LLM_STREAM_INCLUDE_USAGE:
+            request["stream_options"] = {"include_usage": True}
+        if tools:
+            request["tools"] = tools
+        
+        # Only opening the stream is retried, as tokens are never replayed, but the
+        # limiter slot is held until the stream is read to the end or closed
+        started_at = time.monotonic()
+        try:
+            stream, release_slot = await self._call_api(
+                request,
+                started_at + (timeout or settings.LLM_REQUEST_DEADLINE),
+                hold_slot=True
+            )
+        except LLMServiceError:
+            llm_metrics.record_request(model, time.monotonic() - started_at, status="error")
+            raise
+        
+        content_parts = []
+        tool_calls = {}
+        finish_reason = None
+        chunks = 0
+        usage_recorded = False
+        completed = False
+        try:
+            async for chunk in stream:
+                # The final chunk carries the token usage and no choices
+                if chunk.usage is not None:
+                    llm_metrics.record_usage(model, chunk.usage.model_dump())
+                    usage_recorded = True
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                delta = choice.delta
+                if delta.content or delta.tool_calls:
+                    chunks += 1
+                
+                if delta.content:
+                    if not content_parts:
+                        llm_metrics.record_first_token(model, time.monotonic() - started_at)
+                    content_parts.append(delta.content)
+                    yield {"type": "token", "content": delta.content}
+                
+                # Tool calls arrive as fragments keyed by their index
+                for tool_call in delta.tool_calls or []:
+                    entry = tool_calls.setdefault(tool_call.index, {
+                        "id": None,
+                        "type": "function",
+                        "function": {"name": "", "arguments": ""}
+                    })
+                    if tool_call.id:
+                        entry["id"] = tool_call.id
+                    if tool_call.function:
+                        entry["function"]["name"] += tool_call.function.name or ""
+                        entry["function"]["arguments"] += tool_call.function.arguments or ""
+                
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+            
+            completed = True
+            llm_metrics.record_request(model, time.monotonic() - started_at)
+            yield {
+                "type": "message",
+                "message": {
+                    "role": "assistant",
+                    "content": "".join(content_parts) or None,
+                    "tool_calls": [tool_calls[index] for index in sorted(tool_calls)] or None
+                },
+                "finish_reason": finish_reason
+            }
+        finally:
+            release_slot()
+            if not usage_recorded:
+                # Streams closed early, or without usage reporting, are estimated at
+                # about four characters per prompt token and one token per delta
+                prompt_characters = sum(len(str(message.get("content") or "")) for message in formatted_messages)
+                llm_metrics.record_usage(model, {"prompt_tokens": prompt_characters // 4, "completion_tokens": chunks})
+            if not completed:
+                llm_metrics.record_request(model, time.monotonic() - started_at, status="cancelled")
+            await stream.close()
     
     async def generate_with_tools(
         self,
         messages: List[Message],
         tools: List[Dict[str, Any]],
         temperature: float = 0.7,
-        max_tokens: int = 1024
+        max_tokens: int = 1024,
+        use_cache: Optional[bool] = None,
+        timeout: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Generate a completion with tool calling capabilities.
@@ -119,6 +507,8 @@ class LLMService:
             tools: List of tools to provide to the model
             temperature: Temperature for generation
             max_tokens: Maximum number of tokens to generate
+            use_cache: Whether to use the completion cache
+            timeout: Deadline in seconds for the request (defaults to LLM_REQUEST_DEADLINE)
             
         Returns:
             The LLM response with tool calls
@@ -127,7 +517,9 @@ class LLMService:
             messages=messages,
             temperature=temperature,
             max_tokens=max_tokens,
-            tools=tools
+            tools=tools,
+            use_cache=use_cache,
+            timeout=timeout
         )
 
 # Alias for backward compatibility
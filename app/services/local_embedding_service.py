@@ -0,0 +1,279 @@
+"""
+Local embedding model for the Appraisal AI Agent.
+This module provides offline, deterministic text embeddings built on scikit-learn
+so that RAG ingestion and retrieval work without network access.
+"""
+import os
+import hashlib
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import joblib
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = "app/data/embeddings"
+MODEL_FILENAME = "local_embedding_model.joblib"
+
+class LocalEmbeddingModel:
+    """
+    Hashing-vectorizer + TF-IDF + truncated-SVD (LSA) embedding model.
+
+    Until the model has been fitted on a corpus, texts are embedded by signed
+    feature hashing straight into the output dimension, which is deterministic
+    and still preserves lexical similarity.
+    """
+
+    def __init__(
+        self,
+        dimension: int = 1536,
+        n_features: int = 2 ** 18,
+        max_vocabulary: int = 20000,
+        max_components: int = 384,
+        random_state: int = 42
+    ):
+        """
+        Initialize the local embedding model.
+
+        Args:
+            dimension: Size of the output embedding vectors
+            n_features: Number of hashed term features
+            max_vocabulary: Maximum number of hashed features kept after fitting
+            max_components: Maximum number of SVD components; remaining dimensions are zero
+            random_state: Seed used for the SVD
+        """
+        self.dimension = dimension
+        self.n_features = n_features
+        self.max_vocabulary = max_vocabulary
+        self.max_components = max_components
+        self.random_state = random_state
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            stop_words="english",
+            alternate_sign=False,
+            norm=None
+        )
+        self.fallback_vectorizer = HashingVectorizer(
+            n_features=dimension,
+            ngram_range=(1, 2),
+            stop_words="english",
+            alternate_sign=True,
+            norm=None
+        )
+        self.columns: Optional[np.ndarray] = None
+        self.tfidf: Optional[TfidfTransformer] = None
+        self.svd: Optional[TruncatedSVD] = None
+        self.fitted_documents = 0
+        self.version = f"hashing-{dimension}"
+
+    @property
+    def is_fitted(self) -> bool:
+        """Whether the TF-IDF/SVD stages have been fitted on a corpus."""
+        return self.svd is not None
+
+    def fit(self, texts: List[str]) -> "LocalEmbeddingModel":
+        """
+        Fit the TF-IDF weights and SVD projection on a corpus.
+
+        Args:
+            texts: Corpus of texts, typically all document chunks
+
+        Returns:
+            The fitted model
+        """
+        if len(texts) < 3:
+            raise ValueError("At least 3 texts are required to fit the embedding model")
+
+        counts = self.vectorizer.transform(texts)
+
+        # Keep only the hashed features seen in the corpus, most frequent first,
+        # so the stored SVD components stay small
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        columns = np.flatnonzero(document_frequency)
+        if len(columns) > self.max_vocabulary:
+            top = np.argsort(document_frequency[columns], kind="stable")[::-1][:self.max_vocabulary]
+            columns = np.sort(columns[top])
+        if len(columns) < 2:
+            raise ValueError("The corpus does not contain enough distinct terms to fit the embedding model")
+
+        counts = counts[:, columns]
+        tfidf = TfidfTransformer(sublinear_tf=True).fit(counts)
+        weighted = tfidf.transform(counts)
+
+        n_components = min(self.dimension, self.max_components, weighted.shape[0] - 1, weighted.shape[1] - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        svd.fit(weighted)
+        svd.components_ = svd.components_.astype(np.float32)
+
+        self.columns = columns
+        self.tfidf = tfidf
+        self.svd = svd
+        self.fitted_documents = len(texts)
+
+        # Identifies the vectors this model produces, e.g. for embedding caches
+        fingerprint = hashlib.sha256(columns.tobytes() + svd.components_.tobytes()).hexdigest()[:16]
+        self.version = f"lsa-{self.dimension}-{fingerprint}"
+        return self
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dimension) with L2-normalized rows
+        """
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        if self.is_fitted:
+            counts = self.vectorizer.transform(texts)[:, self.columns]
+            reduced = self.svd.transform(self.tfidf.transform(counts))
+            if reduced.shape[1] < self.dimension:
+                reduced = np.pad(reduced, ((0, 0), (0, self.dimension - reduced.shape[1])))
+        else:
+            hashed = self.fallback_vectorizer.transform(texts)
+            hashed.data = np.sign(hashed.data) * np.log1p(np.abs(hashed.data))
+            reduced = hashed.toarray()
+
+        return normalize(reduced).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        """Save the model to disk."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalEmbeddingModel":
+        """Load a model from disk."""
+        model = joblib.load(path)
+        if not isinstance(model, cls):
+            raise ValueError(f"{path} does not contain a {cls.__name__}")
+        return model
+
+
+# Loaded models, keyed by path and reloaded when the file on disk changes
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model_path(model_dir: str = DEFAULT_MODEL_DIR, version: Optional[str] = None) -> str:
+    """Get the path of the saved local embedding model, or of an earlier version of it."""
+    if version is None:
+        return os.path.join(model_dir, MODEL_FILENAME)
+    root, extension = os.path.splitext(MODEL_FILENAME)
+    return os.path.join(model_dir, f"{root}-{version}{extension}")
+
+def get_local_embedding_model(
+    dimension: int = 1536,
+    model_dir: str = DEFAULT_MODEL_DIR,
+    version: Optional[str] = None
+) -> LocalEmbeddingModel:
+    """
+    Get the local embedding model, loading the fitted model from disk if available.
+
+    Args:
+        dimension: Size of the output embedding vectors
+        model_dir: Directory the fitted model is stored in
+        version: Version of the model to get, e.g. one that has since been
+            refitted; the current model when omitted
+
+    Returns:
+        The local embedding model
+
+    Raises:
+        FileNotFoundError: If the requested version is no longer stored
+    """
+    if version is not None:
+        return _get_model_version(dimension, model_dir, version)
+
+    path = get_model_path(model_dir)
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    cache_key: Tuple[str, int] = (path, dimension)
+
+    with _models_lock:
+        cached = _models.get(cache_key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        model = None
+        if mtime is not None:
+            try:
+                model = LocalEmbeddingModel.load(path)
+                if model.dimension != dimension:
+                    logger.warning(
+                        f"Saved embedding model has dimension {model.dimension}, expected {dimension}; ignoring it"
+                    )
+                    model = None
+            except Exception as e:
+                logger.error(f"Error loading embedding model from {path}: {str(e)}")
+                model = None
+
+        if model is None:
+            model = LocalEmbeddingModel(dimension=dimension)
+
+        _models[cache_key] = (mtime, model)
+        return model
+
+def _get_model_version(dimension: int, model_dir: str, version: str) -> LocalEmbeddingModel:
+    """Get a specific version of the local embedding model."""
+    current = get_local_embedding_model(dimension, model_dir)
+    if current.version == version:
+        return current
+    if version == f"hashing-{dimension}":
+        # The unfitted model needs nothing from disk
+        return LocalEmbeddingModel(dimension=dimension)
+
+    path = get_model_path(model_dir, version)
+    cache_key: Tuple[str, int] = (path, dimension)
+    with _models_lock:
+        cached = _models.get(cache_key)
+        if cached:
+            return cached[1]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Local embedding model {version} is no longer stored in {model_dir}")
+        model = LocalEmbeddingModel.load(path)
+        _models[cache_key] = (os.path.getmtime(path), model)
+        return model
+
+def fit_local_embedding_model(
+    texts: List[str],
+    dimension: int = 1536,
+    model_dir: str = DEFAULT_MODEL_DIR
+) -> LocalEmbeddingModel:
+    """
+    Fit a new local embedding model on a corpus and save it to disk.
+
+    Args:
+        texts: Corpus of texts to fit on
+        dimension: Size of the output embedding vectors
+        model_dir: Directory to store the fitted model in
+
+    Returns:
+        The fitted model
+    """
+    model = LocalEmbeddingModel(dimension=dimension).fit(texts)
+
+    # The model being replaced stays loadable by version, as the stored vectors
+    # are searched with it until a reindex switches them to the new one
+    previous = get_local_embedding_model(dimension, model_dir)
+    if previous.is_fitted and not os.path.exists(get_model_path(model_dir, previous.version)):
+        previous.save(get_model_path(model_dir, previous.version))
+
+    path = get_model_path(model_dir)
+    model.save(path)
+
+    with _models_lock:
+        _models[(path, dimension)] = (os.path.getmtime(path), model)
+
+    logger.info(f"Fitted local embedding model on {len(texts)} texts and saved it to {path}")
+    return model
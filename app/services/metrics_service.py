@@ -0,0 +1,233 @@
+"""
+Metrics service for the Appraisal AI Agent.
+This module keeps in-process counters and histograms and renders them in the
+Prometheus text exposition format for the /metrics endpoint. The LLM service
+records every call here: latency, time to first token, tokens, cost, cache
+hits and retries, labelled by model and the API endpoint that made the call.
+"""
+import bisect
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+from app.core.config import settings
+
+# Route of the API request being served, e.g. "/api/v1/agent/stream"
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="unknown")
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15)
+
+def _escape(value: Any) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    """Format a label set as {name="value",...}."""
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    """Format a sample value, writing whole numbers without a decimal point."""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing count per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Initialize the counter."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        """Increase the count for a label set."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: Any) -> float:
+        """Get the count for a label set."""
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        """Render the counter in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        """Initialize the histogram."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record a value for a label set."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            entry["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def get_count(self, **labels: Any) -> int:
+        """Get the number of observations for a label set."""
+        entry = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return entry["count"] if entry else 0
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, entry in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(entry['sum'])}")
+            lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.metrics: List[Any] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Create and register a histogram."""
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class LLMMetrics:
+    """Per-call metrics of the LLM service."""
+
+    def __init__(self, registry: MetricsRegistry, prices: Optional[Dict[str, List[float]]] = None):
+        """
+        Initialize the LLM metrics.
+
+        Args:
+            registry: Registry to create the metrics in
+            prices: USD per million [prompt, completion] tokens by model
+        """
+        self.prices = prices or {}
+        labels = ("model", "endpoint")
+
+        self.requests = registry.counter(
+            "llm_requests_total", "LLM completion requests by outcome and cache result.", labels + ("status", "cache")
+        )
+        self.latency = registry.histogram(
+            "llm_request_duration_seconds", "LLM request latency, including queueing and retries.", labels + ("cache",)
+        )
+        self.time_to_first_token = registry.histogram(
+            "llm_time_to_first_token_seconds", "Time until the first streamed token.", labels, TTFT_BUCKETS
+        )
+        self.tokens = registry.counter("llm_tokens_total", "Tokens used by LLM calls.", labels + ("type",))
+        self.cost = registry.counter("llm_cost_usd_total", "Estimated LLM spend in US dollars.", labels)
+        self.retries = registry.counter("llm_retries_total", "Retried LLM API calls.", labels)
+
+    def record_request(self, model: str, latency: float, status: str = "success", cache: str = "miss") -> None:
+        """
+        Record a completed LLM request.
+
+        Args:
+            model: Model the request was sent to
+            latency: Seconds from the call to its response or error
+            status: "success", "error" or "cancelled" (a stream closed before its end)
+            cache: "hit" if the response came from the completion cache, else "miss"
+        """
+        endpoint = current_endpoint.get()
+        self.requests.inc(model=model, endpoint=endpoint, status=status, cache=cache)
+        self.latency.observe(latency, model=model, endpoint=endpoint, cache=cache)
+
+    def record_first_token(self, model: str, latency: float) -> None:
+        """Record the time to the first token of a stream."""
+        self.time_to_first_token.observe(latency, model=model, endpoint=current_endpoint.get())
+
+    def record_usage(self, model: str, usage: Optional[Dict[str, Any]]) -> None:
+        """Record the token usage reported by the API and its estimated cost."""
+        if not usage:
+            return
+        endpoint = current_endpoint.get()
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        self.tokens.inc(prompt_tokens, model=model, endpoint=endpoint, type="prompt")
+        self.tokens.inc(completion_tokens, model=model, endpoint=endpoint, type="completion")
+
+        if model in self.prices:
+            prompt_price, completion_price = self.prices[model]
+            cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+            self.cost.inc(cost, model=model, endpoint=endpoint)
+
+    def record_retry(self, model: str) -> None:
+        """Record a retried API call."""
+        self.retries.inc(model=model, endpoint=current_endpoint.get())
+
+
+class EndpointLabelMiddleware:
+    """ASGI middleware that sets `current_endpoint` to the route template of each request."""
+
+    def __init__(self, app: Any):
+        """Wrap an ASGI application."""
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or "app" not in scope:
+            await self.app(scope, receive, send)
+            return
+        
+        # Use the route template so path parameters do not create new label values
+        endpoint = "unknown"
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                endpoint = getattr(route, "path", endpoint)
+                break
+        
+        token = current_endpoint.set(endpoint)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+
+
+registry = MetricsRegistry()
+llm_metrics = LLMMetrics(registry, prices=settings.LLM_MODEL_PRICES)
@@ -0,0 +1,97 @@
+"""
+Model routing for the Appraisal AI Agent.
+This module classifies each LLM request with cheap heuristics and sends simple
+turns (greetings, status lookups, formatting) to a small, fast model and
+appraisal reasoning to the large model.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+class ModelRouter:
+    """Routes requests to a small or large model based on the latest user message."""
+
+    def __init__(
+        self,
+        small_model: str,
+        large_model: str,
+        simple_patterns: List[str],
+        complex_keywords: List[str],
+        simple_max_chars: int = 280
+    ):
+        """
+        Initialize the model router.
+
+        Args:
+            small_model: Model for simple requests
+            large_model: Model for everything else
+            simple_patterns: Regular expressions marking a message as simple
+            complex_keywords: Words or phrases that always require the large model
+            simple_max_chars: Messages longer than this always use the large model
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.simple_max_chars = simple_max_chars
+
+        self._simple_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in simple_patterns]
+        self._complex_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(keyword) for keyword in complex_keywords) + r")",
+            re.IGNORECASE
+        ) if complex_keywords else None
+
+        self.routes: Counter = Counter()
+
+    def classify(self, text: str) -> str:
+        """
+        Classify a user message.
+
+        Args:
+            text: The latest user message
+
+        Returns:
+            "simple" or "complex"
+        """
+        text = text.strip()
+        if not text or len(text) > self.simple_max_chars:
+            return "complex"
+        if self._complex_pattern and self._complex_pattern.search(text):
+            return "complex"
+        if any(pattern.search(text) for pattern in self._simple_patterns):
+            return "simple"
+        return "complex"
+
+    def route(self, messages: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """
+        Pick the model for a request.
+
+        Args:
+            messages: Messages in API dict format
+
+        Returns:
+            The model name and the intent it was chosen for
+        """
+        last_user_message = next(
+            (message.get("content") or "" for message in reversed(messages) if message["role"] == "user"),
+            ""
+        )
+        intent = self.classify(last_user_message)
+        model = self.small_model if intent == "simple" else self.large_model
+        self.routes[model] += 1
+        return model, intent
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of requests routed to each model."""
+        return dict(self.routes)
+
+def create_model_router(settings: Any) -> Optional[ModelRouter]:
+    """Create the model router from settings, or None if routing is disabled."""
+    if not settings.MODEL_ROUTING_ENABLED or not settings.SMALL_MODEL_NAME:
+        return None
+
+    return ModelRouter(
+        small_model=settings.SMALL_MODEL_NAME,
+        large_model=settings.MODEL_NAME,
+        simple_patterns=settings.ROUTER_SIMPLE_PATTERNS,
+        complex_keywords=settings.ROUTER_COMPLEX_KEYWORDS,
+        simple_max_chars=settings.ROUTER_SIMPLE_MAX_CHARS
+    )
@@ -2,22 +2,34 @@
 Property data service for fetching property information from various sources.
 """
 import httpx
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, List, Optional
 import json
 import os
 from datetime import datetime
 
 from app.core.config import settings
+from app.services.comparable_engine import ComparableEngine
+from app.services.spatial_index import SpatialIndex
 from app.services.web_search_service import WebSearchService
 
 class PropertyDataService:
     """Service for retrieving property data from various sources."""
     
-    def __init__(self, web_search_service: WebSearchService = None):
+    def __init__(
+        self,
+        web_search_service: WebSearchService = None,
+        sales_index: SpatialIndex = None,
+        comparable_engine: ComparableEngine = None
+    ):
         """Initialize the property data service."""
         self.cadastre_api_url = settings.CADASTRE_API_URL
         self.market_data_api_url = settings.MARKET_DATA_API_URL
         self.web_search_service = web_search_service or WebSearchService()
+        self.sales_index = sales_index or SpatialIndex()
+        self.comparable_engine = comparable_engine or ComparableEngine(
+            settings.COMPARABLE_FEATURE_WEIGHTS,
+            kd_tree_threshold=settings.COMPARABLE_KD_TREE_THRESHOLD
+        )
         
         # Create cache directory if it doesn't exist
         os.makedirs("app/data/cache", exist_ok=True)
@@ -58,11 +70,21 @@ class PropertyDataService:
         max_size: Optional[float] = None,
         min_price: Optional[float] = None,
         max_price: Optional[float] = None,
-        limit: int = 10
+        limit: int = 10,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        radius_miles: Optional[float] = None,
+        sold_within_months: Optional[float] = None,
+        subject: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """
         Get comparable properties based on criteria.
         
+        When the subject's coordinates are given and past sales of the property
+        type have been indexed, the nearest indexed sales are the candidates
+        instead of a search by location. When the subject property is given, a
+        larger pool of candidates is ranked by similarity to it.
+        
         Args:
             location: The location to search in
             property_type: The type of property
@@ -71,33 +93,135 @@ class PropertyDataService:
             min_price: Minimum property price
             max_price: Maximum property price
             limit: Maximum number of results to return
+            latitude: Latitude of the subject property
+            longitude: Longitude of the subject property
+            radius_miles: Maximum distance of sales from the subject
+            sold_within_months: Only sales made within this many months
+            subject: The subject property, in the property details format
             
         Returns:
-            A list of comparable properties
+            A list of comparable properties, most similar first when the subject
+            is given and nearest first when searched by coordinates
         """
-        # In a real implementation, this would call the market data API
-        # For demo purposes, we'll return mock data
-        comparables = await self._get_mock_comparables(
-            location, 
-            property_type,
-            limit=limit
-        )
+        # One extra candidate with a subject, as the subject itself may be among them
+        candidate_limit = max(limit, settings.COMPARABLE_CANDIDATE_POOL) + 1 if subject is not None else limit
         
-        # Filter by criteria
-        filtered_comparables = []
-        for comp in comparables:
-            if min_size and comp.get("size", 0) < min_size:
-                continue
-            if max_size and comp.get("size", 0) > max_size:
-                continue
-            if min_price and comp.get("price", 0) < min_price:
-                continue
-            if max_price and comp.get("price", 0) > max_price:
-                continue
-            filtered_comparables.append(comp)
+        if latitude is not None and longitude is not None and self.sales_index.count(property_type, sales_only=True):
+            filtered_comparables = self.sales_index.nearest(
+                latitude,
+                longitude,
+                property_type,
+                k=candidate_limit,
+                radius_miles=radius_miles,
+                sold_within_months=sold_within_months,
+                min_size=min_size,
+                max_size=max_size,
+                min_price=min_price,
+                max_price=max_price,
+                sales_only=True
+            )
+        else:
+            # In a real implementation, this would call the market data API
+            # For demo purposes, we'll return mock data
+            comparables = await self._get_mock_comparables(
+                location, 
+                property_type,
+                limit=candidate_limit
+            )
+            
+            # Filter by criteria
+            filtered_comparables = []
+            for comp in comparables:
+                if min_size and comp.get("size", 0) < min_size:
+                    continue
+                if max_size and comp.get("size", 0) > max_size:
+                    continue
+                if min_price and comp.get("price", 0) < min_price:
+                    continue
+                if max_price and comp.get("price", 0) > max_price:
+                    continue
+                filtered_comparables.append(comp)
         
+        if subject is not None:
+            # The subject is not a comparable of itself, e.g. when its own last sale is indexed
+            subject_ids = {str(subject[key]) for key in ("id", "property_id") if subject.get(key) is not None}
+            candidates = [comp for comp in filtered_comparables if str(comp.get("id")) not in subject_ids]
+            return self.comparable_engine.rank(subject, candidates, k=limit)
         return filtered_comparables[:limit]
     
+    def add_sales(self, sales: List[Dict[str, Any]]) -> int:
+        """
+        Index past sales or properties for comparable selection by location.
+        
+        Args:
+            sales: Sales with `latitude`, `longitude` and `type`, and optionally
+                `price`, `size` and `sale_date`; `price_per_sqft` is derived
+                from the price and size when not given
+            
+        Returns:
+            Number of sales indexed
+        """
+        return self.sales_index.add(self._with_price_per_sqft(sale) for sale in sales)
+    
+    @staticmethod
+    def _with_price_per_sqft(sale: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the price per square foot the valuation adjusts comparables by."""
+        if sale.get("price_per_sqft") is not None:
+            return sale
+        try:
+            price_per_sqft = round(float(sale["price"]) / float(sale["size"]), 2)
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            return sale
+        return {**sale, "price_per_sqft": price_per_sqft}
+    
+    def remove_sales(self, ids: List[Any]) -> int:
+        """
+        Remove indexed sales, e.g. of a property that was deleted or changed.
+        
+        Args:
+            ids: IDs of the sales to remove
+            
+        Returns:
+            Number of sales removed
+        """
+        return self.sales_index.remove(ids)
+    
+    def index_stored_properties(self, properties: Iterable[Any]) -> int:
+        """
+        Index the last sales of stored properties (`Property` rows) as comparable
+        sales, alongside the sales indexed through the API.
+        
+        The sale is read from the `last_sale_price` and `last_sale_date` of the
+        row's `features`, as properties have no sale columns.
+        
+        Args:
+            properties: Property rows; rows without coordinates or a sale price are skipped
+            
+        Returns:
+            Number of properties indexed
+        """
+        sales = []
+        for row in properties:
+            features = row.features if isinstance(row.features, dict) else {}
+            if features.get("last_sale_price") is None:
+                # Without a price the property cannot be a comparable
+                continue
+            sales.append({
+                "id": str(row.id),
+                "type": row.property_type,
+                "address": row.address,
+                "city": row.city,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+                "price": features["last_sale_price"],
+                "sale_date": features.get("last_sale_date"),
+                "size": row.square_feet,
+                "year_built": row.year_built,
+                "bedrooms": row.bedrooms,
+                "bathrooms": row.bathrooms
+            })
+        return self.add_sales(sales)
+    
     async def get_market_trends(self, location: str, property_type: str) -> Dict[str, Any]:
         """
         Get market trends for a specific location and property type.
@@ -4,6 +4,7 @@ This service handles document processing, embedding, and retrieval for the agent
 """
 import os
 import json
+import asyncio
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
@@ -11,20 +12,36 @@ from sqlalchemy import func, desc
 
 from app.models.rag import Document, DocumentChunk, RAGQuery, RAGQueryChunk
 from app.services.llm_service import LLMService
+from app.services.embedding_service import EmbeddingProvider, ReducedEmbeddingProvider
+from app.services.embedding_reducer import EmbeddingReducer, evaluate_recall, save_embedding_reducer
+from app.services.reindex_service import ReindexService
+from app.services.dependencies import get_embedding_provider, get_embedding_provider_for_model
+from app.services.local_embedding_service import LocalEmbeddingModel, fit_local_embedding_model
 from app.core.config import settings
 
 class RAGService:
     """Service for handling RAG operations."""
     
-    def __init__(self, db: Session, llm_service: Optional[LLMService] = None):
+    def __init__(
+        self,
+        db: Session,
+        llm_service: Optional[LLMService] = None,
+        embedding_provider: Optional[EmbeddingProvider] = None
+    ):
         """Initialize the RAG service."""
         self.db = db
         self.llm_service = llm_service
-        self.embedding_dimension = 1536  # Default for most embedding models
+        self.embedding_provider = embedding_provider or get_embedding_provider()
         
         # Create directories for storing embeddings if they don't exist
         os.makedirs("app/data/embeddings", exist_ok=True)
     
+    @property
+    def embedding_dimension(self) -> int:
+        """Dimension of the vectors of the embedding provider."""
+        # Read when needed, so that a mismatched reducer can still be refitted
+        return self.embedding_provider.dimension
+    
     async def add_document(
         self, 
         title: str, 
@@ -102,44 +119,49 @@ class RAGService:
         Returns:
             List of relevant document chunks with metadata
         """
-        # Generate embedding for the query
-        query_embedding = await self._generate_embedding(query)
+        # Generate embedding for the query with the model of the stored vectors
+        provider = self._active_embedding_provider()
+        query_embedding = await self._generate_embedding(query, provider)
         
         if not query_embedding:
             # Fallback to keyword search if embedding generation fails
             return self._keyword_search(query, document_type, top_k)
         
         # Find chunks with similar embeddings
-        results = []
-        chunks = self.db.query(DocumentChunk).all()
+        chunks_query = self.db.query(DocumentChunk, Document).join(
+            Document, DocumentChunk.document_id == Document.id
+        )
         
-        for chunk in chunks:
-            if chunk.embedding:
-                # Calculate cosine similarity
-                similarity = self._cosine_similarity(query_embedding, chunk.embedding)
-                
-                # Get document metadata
-                document = self.db.query(Document).filter(Document.id == chunk.document_id).first()
-                
-                # Filter by document type if specified
-                if document_type and document.document_type != document_type:
-                    continue
-                
-                results.append({
-                    "chunk_id": chunk.id,
-                    "document_id": chunk.document_id,
-                    "document_title": document.title,
-                    "document_type": document.document_type,
-                    "chunk_index": chunk.chunk_index,
-                    "content": chunk.content,
-                    "similarity": float(similarity)
-                })
+        if document_type:
+            chunks_query = chunks_query.filter(Document.document_type == document_type)
         
-        # Sort by similarity (descending)
-        results.sort(key=lambda x: x["similarity"], reverse=True)
+        # Vectors from another model, or of unknown model, are not comparable and are skipped until reindexed
+        model_id = provider.model_id
+        rows = [
+            (chunk, document) for chunk, document in chunks_query.all()
+            if chunk.embedding and chunk.embedding_model == model_id
+        ]
         
-        # Take top k results
-        top_results = results[:top_k]
+        if not rows:
+            # Nothing is indexed with a known model yet
+            return self._keyword_search(query, document_type, top_k)
+        
+        # Score all chunks with a single matrix-vector product
+        matrix = np.asarray([chunk.embedding for chunk, _ in rows], dtype=np.float32)
+        similarities = self._cosine_similarities(query_embedding, matrix)
+        
+        top_results = []
+        for i in np.argsort(-similarities, kind="stable")[:top_k]:
+            chunk, document = rows[i]
+            top_results.append({
+                "chunk_id": chunk.id,
+                "document_id": chunk.document_id,
+                "document_title": document.title,
+                "document_type": document.document_type,
+                "chunk_index": chunk.chunk_index,
+                "content": chunk.content,
+                "similarity": float(similarities[i])
+            })
         
         # Log the query for analytics
         self._log_query(query, query_embedding, top_results, user_id)
@@ -194,8 +216,9 @@ class RAGService:
         """
         
         # Generate response using LLM
+        degraded = False
         if self.llm_service:
-            from app.services.llm_service import Message
+            from app.services.llm_service import LLMCircuitOpenError, Message
             
             messages = [
                 Message(role="system", content=prompt),
@@ -210,6 +233,10 @@ class RAGService:
                 
                 if not response_content:
                     response_content = "I apologize, but I couldn't generate a proper response based on the available information."
+            except LLMCircuitOpenError:
+                # The LLM backend is down; return the retrieved documents only
+                response_content = "The language model is temporarily unavailable. These are the most relevant documents for your question."
+                degraded = True
             except Exception as e:
                 response_content = f"I apologize, but I encountered an error while generating a response: {str(e)}"
         else:
@@ -227,9 +254,91 @@ class RAGService:
         
         return {
             "response": response_content,
-            "sources": sources
+            "sources": sources,
+            "degraded": degraded
         }
     
+    async def reindex_embeddings(self, batch_size: int = 500) -> int:
+        """
+        Re-embed every chunk with the current provider and switch search over to the new vectors.
+        
+        Runs (or resumes) a checkpointed reindex job to completion.
+        
+        Args:
+            batch_size: Number of chunks to re-embed per batch
+            
+        Returns:
+            Number of chunks re-embedded
+        """
+        reindex_service = ReindexService(self.db, self.embedding_provider)
+        job = await reindex_service.run(reindex_service.start_job(), batch_size=batch_size)
+        
+        if job.status != "completed":
+            raise RuntimeError(f"Reindex job {job.id} {job.status}: {job.error or ''}")
+        return job.processed_chunks
+    
+    async def fit_embedding_reducer(
+        self,
+        method: str,
+        dimension: int,
+        k: int = 10,
+        batch_size: int = 500
+    ) -> Dict[str, Any]:
+        """
+        Fit the embedding dimensionality reduction over the stored chunk embeddings.
+        
+        Chunks whose stored vector is already reduced are re-embedded at full
+        dimension through the (cached) base provider.
+        
+        Args:
+            method: Reduction method, 'pca' or 'random'
+            dimension: Target dimension
+            k: Number of neighbours used to measure recall
+            batch_size: Number of chunks to load per batch
+            
+        Returns:
+            Recall and memory trade-off of the reduced index against full dimension
+            
+        Raises:
+            ValueError: If the reduction is active with another method or dimension
+        """
+        base_provider = self.embedding_provider
+        if isinstance(base_provider, ReducedEmbeddingProvider):
+            if (method, dimension) != (base_provider.method, base_provider.reduced_dimension):
+                raise ValueError(
+                    f"EMBEDDING_REDUCTION is configured as {base_provider.method} to {base_provider.reduced_dimension} "
+                    f"dimensions; fit that or change the settings first"
+                )
+            base_provider = base_provider.provider
+        
+        vectors = []
+        last_id = 0
+        while True:
+            chunks = self.db.query(DocumentChunk).filter(
+                DocumentChunk.id > last_id
+            ).order_by(DocumentChunk.id).limit(batch_size).all()
+            if not chunks:
+                break
+            
+            stale = [chunk for chunk in chunks if not chunk.embedding or chunk.embedding_model != base_provider.model_id]
+            refreshed = dict(zip(
+                [chunk.id for chunk in stale],
+                await base_provider.embed([chunk.content for chunk in stale])
+            )) if stale else {}
+            vectors.extend(refreshed.get(chunk.id, chunk.embedding) for chunk in chunks)
+            last_id = chunks[-1].id
+        
+        if not vectors:
+            raise ValueError("There are no document chunks to fit the embedding reducer on")
+        
+        embeddings = np.asarray(vectors, dtype=np.float32)
+        reducer = EmbeddingReducer(method=method, dimension=dimension).fit(embeddings)
+        report = evaluate_recall(embeddings, reducer, k=k)
+        save_embedding_reducer(reducer, settings.EMBEDDING_REDUCER_PATH)
+        
+        report["active"] = isinstance(self.embedding_provider, ReducedEmbeddingProvider)
+        return report
+    
     def get_document_by_id(self, document_id: int) -> Optional[Document]:
         """Get a document by ID."""
         return self.db.query(Document).filter(Document.id == document_id).first()
@@ -346,7 +455,9 @@ class RAGService:
                         end = sentence_break + 2
             
             chunks.append(text[start:end])
-            start = end - chunk_overlap
+            if end >= len(text):
+                break
+            start = max(end - chunk_overlap, start + 1)
         
         return chunks
     
@@ -354,63 +465,98 @@ class RAGService:
         """Generate embeddings for all chunks of a document."""
         chunks = self.db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).all()
         
-        for chunk in chunks:
-            embedding = await self._generate_embedding(chunk.content)
-            if embedding:
+        # Embedded like the stored vectors, so that the chunks are searchable until the next reindex
+        provider = self._active_embedding_provider()
+        model_id = provider.model_id
+        embeddings = await self._generate_embeddings([chunk.content for chunk in chunks], provider)
+        if embeddings:
+            for chunk, embedding in zip(chunks, embeddings):
                 chunk.embedding = embedding
+                chunk.embedding_model = model_id
                 self.db.add(chunk)
         
         self.db.commit()
     
-    async def _generate_embedding(self, text: str) -> Optional[List[float]]:
+    def _active_embedding_provider(self) -> EmbeddingProvider:
         """
-        Generate an embedding for a text using the LLM service.
+        Get the provider of the model the live chunk embeddings were built with.
         
-        In a production environment, this would use a dedicated embedding model.
-        For simplicity, we're using a mock implementation.
+        This is the configured provider, except while the stored vectors still come
+        from an earlier model: queries keep being embedded with that model until a
+        reindex switches the vectors over, instead of matching no chunks at all.
+        """
+        model_id = ReindexService(self.db, self.embedding_provider).get_active_model_id()
+        if model_id is None or model_id == self.embedding_provider.model_id:
+            return self.embedding_provider
+        
+        provider = get_embedding_provider_for_model(model_id)
+        if provider is None:
+            print(f"Embedding model {model_id} of the stored vectors is unavailable; reindex to search them")
+            return self.embedding_provider
+        return provider
+    
+    async def _generate_embedding(self, text: str, provider: Optional[EmbeddingProvider] = None) -> Optional[List[float]]:
+        """Generate an embedding for a single text."""
+        embeddings = await self._generate_embeddings([text], provider)
+        return embeddings[0] if embeddings else None
+    
+    async def _generate_embeddings(
+        self,
+        texts: List[str],
+        provider: Optional[EmbeddingProvider] = None
+    ) -> Optional[List[List[float]]]:
+        """
+        Generate embeddings for a batch of texts with the configured embedding provider,
+        or with `provider` if given.
+        
+        The provider is wrapped in a persistent cache, so a text is only embedded
+        once per model across re-ingestion, reindexing and repeated queries.
         """
-        # Mock implementation - in a real system, use a proper embedding model
         try:
-            # Simple hash-based embedding for demo purposes
-            import hashlib
-            
-            # Create a deterministic but unique embedding based on text hash
-            hash_obj = hashlib.md5(text.encode())
-            hash_bytes = hash_obj.digest()
-            
-            # Convert hash to a list of floats
-            embedding = []
-            for i in range(self.embedding_dimension):
-                # Use modulo to cycle through the hash bytes
-                byte_val = hash_bytes[i % len(hash_bytes)]
-                # Normalize to [-1, 1]
-                embedding.append((byte_val / 128.0) - 1.0)
-            
-            return embedding
+            return await (provider or self.embedding_provider).embed(texts)
         except Exception as e:
-            print(f"Error generating embedding: {str(e)}")
+            print(f"Error generating embeddings: {str(e)}")
             return None
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        if not vec1 or not vec2:
-            return 0.0
+    async def fit_embedding_model(self) -> Dict[str, Any]:
+        """
+        Fit the local embedding model on all document chunks.
         
-        try:
-            vec1 = np.array(vec1)
-            vec2 = np.array(vec2)
-            
-            dot_product = np.dot(vec1, vec2)
-            norm_vec1 = np.linalg.norm(vec1)
-            norm_vec2 = np.linalg.norm(vec2)
-            
-            if norm_vec1 == 0 or norm_vec2 == 0:
-                return 0.0
-            
-            return dot_product / (norm_vec1 * norm_vec2)
-        except Exception as e:
-            print(f"Error calculating cosine similarity: {str(e)}")
-            return 0.0
+        The corpus is read and the model fitted on a worker thread, so that other
+        requests are served meanwhile. Search keeps using the previous model until
+        the chunks are reindexed with the new one.
+        
+        Returns:
+            Statistics about the fitted model
+        """
+        # Compared case-insensitively, as in create_embedding_provider
+        if settings.EMBEDDING_PROVIDER.lower() != "local":
+            raise ValueError("The local embedding model is only used when EMBEDDING_PROVIDER is 'local'")
+        
+        model = await asyncio.to_thread(self._fit_local_embedding_model)
+        
+        return {
+            "fitted_documents": model.fitted_documents,
+            "components": model.svd.n_components,
+            "dimension": model.dimension
+        }
+    
+    def _fit_local_embedding_model(self) -> LocalEmbeddingModel:
+        """Fit the local embedding model on the stored chunks; blocking."""
+        contents = [content for (content,) in self.db.query(DocumentChunk.content).order_by(DocumentChunk.id).all()]
+        # The local provider embeds at full dimension, before any reduction stage
+        return fit_local_embedding_model(contents, settings.EMBEDDING_DIMENSION)
+    
+    def _cosine_similarities(self, query: List[float], matrix: np.ndarray) -> np.ndarray:
+        """Calculate cosine similarities between a vector and each row of a matrix."""
+        query = np.asarray(query, dtype=np.float32)
+        
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        dot_products = matrix @ query
+        
+        similarities = np.zeros(len(matrix), dtype=np.float32)
+        np.divide(dot_products, norms, out=similarities, where=norms > 0)
+        return similarities
     
     def _keyword_search(
         self, 
@@ -0,0 +1,176 @@
+"""
+Embedding reindex service for the Appraisal AI Agent.
+This service re-embeds every document chunk with the current embedding provider
+in resumable batches, writing to shadow columns and switching search over in a
+single transaction once all chunks are done.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, null, update
+from sqlalchemy.orm import Session
+
+from app.models.rag import DocumentChunk, EmbeddingReindexJob
+from app.services.embedding_service import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+# A running job that has not checkpointed for this long is assumed to have crashed
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+
+class ReindexService:
+    """Service for running resumable embedding reindex jobs."""
+
+    def __init__(self, db: Session, embedding_provider: EmbeddingProvider):
+        """Initialize the reindex service."""
+        self.db = db
+        self.embedding_provider = embedding_provider
+
+    def start_job(self) -> EmbeddingReindexJob:
+        """
+        Get the job to run for the current embedding model.
+
+        An unfinished (running or failed) job for the same model is resumed from
+        its checkpoint; unfinished jobs for other models are superseded.
+
+        Returns:
+            The job to run
+        """
+        target_model_id = self.embedding_provider.model_id
+
+        unfinished_jobs = self.db.query(EmbeddingReindexJob).filter(
+            EmbeddingReindexJob.status.in_(["running", "failed"])
+        ).order_by(EmbeddingReindexJob.id.desc()).all()
+
+        job = None
+        for unfinished_job in unfinished_jobs:
+            if job is None and unfinished_job.target_model_id == target_model_id:
+                job = unfinished_job
+            else:
+                unfinished_job.status = "superseded"
+                self.db.add(unfinished_job)
+
+        if job is None:
+            job = EmbeddingReindexJob(
+                target_model_id=target_model_id,
+                last_chunk_id=0,
+                processed_chunks=0
+            )
+
+        job.status = "running"
+        job.error = None
+        # Heartbeats are set from the application clock that `get_active_job` compares
+        # against, rather than left to the column default, which uses the database clock
+        job.updated_at = datetime.now()
+        job.total_chunks = self.db.query(func.count(DocumentChunk.id)).scalar() or 0
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_active_model_id(self) -> Optional[str]:
+        """
+        Get the model ID of the live embeddings, which queries must be embedded with.
+
+        Only `_switch` changes it, so search keeps using the previous model while
+        a job re-embeds the chunks into the shadow columns.
+        """
+        chunk_count = func.count(DocumentChunk.id)
+        row = self.db.query(DocumentChunk.embedding_model, chunk_count).filter(
+            DocumentChunk.embedding_model.isnot(None)
+        ).group_by(DocumentChunk.embedding_model).order_by(chunk_count.desc()).first()
+        return row[0] if row else None
+
+    def get_active_job(self) -> Optional[EmbeddingReindexJob]:
+        """Get the running job that has checkpointed recently, i.e. is being run by a worker."""
+        job = self.db.query(EmbeddingReindexJob).filter(
+            EmbeddingReindexJob.status == "running"
+        ).order_by(EmbeddingReindexJob.id.desc()).first()
+
+        if job and datetime.now() - job.updated_at < STALE_JOB_TIMEOUT:
+            return job
+        return None
+
+    async def run(self, job: EmbeddingReindexJob, batch_size: int = 500) -> EmbeddingReindexJob:
+        """
+        Run a job from its checkpoint until all chunks are re-embedded, then switch over.
+
+        Args:
+            job: The job to run
+            batch_size: Number of chunks to re-embed per batch
+
+        Returns:
+            The finished job
+        """
+        logger.info(f"Reindexing embeddings with {job.target_model_id} from chunk {job.last_chunk_id}")
+
+        try:
+            while True:
+                self.db.refresh(job)
+                if job.status != "running":
+                    logger.info(f"Reindex job {job.id} is {job.status}; stopping")
+                    return job
+
+                chunks = self.db.query(DocumentChunk).filter(
+                    DocumentChunk.id > job.last_chunk_id
+                ).order_by(DocumentChunk.id).limit(batch_size).all()
+                if not chunks:
+                    break
+
+                if self.embedding_provider.model_id != job.target_model_id:
+                    raise ValueError(
+                        f"The embedding model changed to {self.embedding_provider.model_id} during the reindex"
+                    )
+
+                embeddings = await self.embedding_provider.embed([chunk.content for chunk in chunks])
+                for chunk, embedding in zip(chunks, embeddings):
+                    chunk.shadow_embedding = embedding
+                    chunk.shadow_embedding_model = job.target_model_id
+                    self.db.add(chunk)
+
+                # The checkpoint is committed together with the batch it covers
+                job.last_chunk_id = chunks[-1].id
+                job.processed_chunks += len(chunks)
+                job.updated_at = datetime.now()
+                self.db.add(job)
+                self.db.commit()
+
+            self._switch(job)
+            logger.info(f"Reindex job {job.id} completed: {job.processed_chunks} chunks")
+        except Exception as e:
+            self.db.rollback()
+            job.status = "failed"
+            job.error = str(e)
+            self.db.add(job)
+            self.db.commit()
+            logger.error(f"Reindex job {job.id} failed: {str(e)}")
+
+        return job
+
+    def _switch(self, job: EmbeddingReindexJob) -> None:
+        """Move the shadow embeddings into place and complete the job in one transaction."""
+        self.db.execute(
+            update(DocumentChunk)
+            .where(DocumentChunk.shadow_embedding_model == job.target_model_id)
+            .values(
+                embedding=DocumentChunk.shadow_embedding,
+                embedding_model=DocumentChunk.shadow_embedding_model,
+                shadow_embedding=null(),
+                shadow_embedding_model=null()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        job.status = "completed"
+        job.completed_at = datetime.now()
+        self.db.add(job)
+        self.db.commit()
+        self.db.expire_all()
+
+    def get_job(self, job_id: int) -> Optional[EmbeddingReindexJob]:
+        """Get a reindex job by ID."""
+        return self.db.query(EmbeddingReindexJob).filter(EmbeddingReindexJob.id == job_id).first()
+
+    def get_jobs(self, limit: int = 20) -> List[EmbeddingReindexJob]:
+        """Get the most recent reindex jobs."""
+        return self.db.query(EmbeddingReindexJob).order_by(EmbeddingReindexJob.id.desc()).limit(limit).all()
@@ -0,0 +1,449 @@
+"""
+Portfolio revaluation service for the Appraisal AI Agent.
+This service revalues a whole portfolio on all CPU cores: the portfolio is split
+into chunks whose property data and comparables are fetched on the event loop,
+each chunk is valued by the valuation engine in a worker process, and its rows
+are appended to a CSV file as soon as it completes. The results file doubles as
+the checkpoint: rerunning a job skips every property already in it.
+"""
+import os
+import re
+import csv
+import json
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from app.core.config import settings
+from app.services.comparable_engine import ComparableEngine
+from app.services.valuation_engine import METHODS, value_properties
+from app.tools.tool_context import ToolContext
+
+logger = logging.getLogger(__name__)
+
+REVALUATION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+RESULT_FIELDS = ["property_id", "type", "city"] + list(METHODS) + ["reconciled"]
+
+# Comparables used for each property's sales comparison, as for the valuation calculator tool
+COMPARABLES_PER_PROPERTY = 5
+
+# Running revaluations by ID
+_revaluation_tasks: Dict[str, asyncio.Task] = {}
+_revaluation_runners: Dict[str, "PortfolioRevaluationRunner"] = {}
+
+class RevaluationRunningError(Exception):
+    """Raised when a new portfolio is posted for a revaluation that is still running."""
+
+def load_portfolio(path: str) -> List[Dict[str, Any]]:
+    """
+    Load a portfolio from a JSONL file.
+
+    Each line is a property with a unique `property_id` and either its data
+    (`type`, `details`, `valuation` and optionally `address` and `comparables`)
+    or nothing else, in which case its details are fetched.
+    """
+    properties = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                properties.append(json.loads(line))
+    return properties
+
+def read_completed_ids(path: str) -> Set[str]:
+    """
+    Get the IDs of the properties already in a results file.
+
+    A row left incomplete by a crash is removed so new results append cleanly.
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        content = f.read()
+
+    if content and not content.endswith("\n"):
+        content = content[:content.rfind("\n") + 1]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+
+    return {row["property_id"] for row in csv.DictReader(content.splitlines())}
+
+def select_comparables(
+    subjects: List[Dict[str, Any]],
+    comparables: List[Union[List[Dict[str, Any]], int]],
+    pools: List[List[Dict[str, Any]]],
+    comparable_engine: ComparableEngine
+) -> List[List[Dict[str, Any]]]:
+    """
+    Pick the comparables of the subjects that share candidate pools.
+
+    Args:
+        subjects: Properties in the property data format
+        comparables: For each subject, its comparables or the index of its pool in `pools`
+        pools: Candidate pools, each shared by the subjects of a city and property type
+        comparable_engine: Engine ranking the candidates by similarity to each subject
+
+    Returns:
+        The comparables of each subject
+    """
+    selected = list(comparables)
+    by_pool: Dict[int, List[int]] = {}
+    for i, entry in enumerate(comparables):
+        if isinstance(entry, int):
+            by_pool.setdefault(entry, []).append(i)
+
+    for pool_index, rows in by_pool.items():
+        # One extra, as a subject may be among its own candidates
+        ranked = comparable_engine.rank_many([subjects[i] for i in rows], pools[pool_index], k=COMPARABLES_PER_PROPERTY + 1)
+        for i, candidates in zip(rows, ranked):
+            own_id = str(subjects[i]["property_id"])
+            selected[i] = [comp for comp in candidates if str(comp.get("id")) != own_id][:COMPARABLES_PER_PROPERTY]
+    return selected
+
+def value_chunk(
+    subjects: List[Dict[str, Any]],
+    comparables: Optional[List[Union[List[Dict[str, Any]], int]]],
+    method: str,
+    pools: Optional[List[List[Dict[str, Any]]]] = None,
+    comparable_engine: Optional[ComparableEngine] = None
+) -> List[Dict[str, Any]]:
+    """
+    Value a chunk of properties into result rows. Runs in a worker process.
+
+    Args:
+        subjects: Properties in the property data format, each with a `property_id`
+        comparables: Comparable sales for each subject, or the index of its
+            candidate pool in `pools`; None when the method does not need them
+        method: Valuation method, as for `value_properties`
+        pools: Candidate pools to pick comparables from by similarity
+        comparable_engine: Engine ranking the pool candidates
+    """
+    if comparables is not None and pools:
+        comparables = select_comparables(subjects, comparables, pools, comparable_engine)
+    valuations = value_properties(subjects, comparables, method)
+    return [
+        {
+            "property_id": subject["property_id"],
+            "type": subject.get("type", ""),
+            "city": (subject.get("address") or {}).get("city", ""),
+            **valuation
+        }
+        for subject, valuation in zip(subjects, valuations)
+    ]
+
+
+class PortfolioRevaluationRunner:
+    """Values a portfolio in chunks across a process pool and streams the results to CSV."""
+
+    def __init__(
+        self,
+        property_service: Any,
+        method: str = "all",
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+        comparable_engine: Optional[ComparableEngine] = None
+    ):
+        """
+        Initialize the revaluation runner.
+
+        Args:
+            property_service: Property data service that missing details and
+                comparables are fetched with
+            method: Valuation method, as for `value_properties`
+            chunk_size: Number of properties valued per worker task
+            workers: Number of worker processes (defaults to the number of CPUs)
+            comparable_engine: Engine picking each property's comparables from the
+                candidates of its city and type (defaults to the configured weights)
+        """
+        if method not in METHODS + ("all",):
+            raise ValueError(f"Unknown valuation method: {method}")
+
+        self.property_service = property_service
+        self.method = method
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.comparable_engine = comparable_engine or ComparableEngine(
+            settings.COMPARABLE_FEATURE_WEIGHTS,
+            kd_tree_threshold=settings.COMPARABLE_KD_TREE_THRESHOLD
+        )
+
+        self.counts = {"total": 0, "skipped": 0, "completed": 0, "failed": 0}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def progress(self) -> Dict[str, Any]:
+        """Get the counts of the run so far, its elapsed time and its throughput in properties per second."""
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        processed = self.counts["completed"] + self.counts["failed"]
+        return {
+            **self.counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "properties_per_second": round(processed / elapsed, 1) if elapsed > 0 else 0.0
+        }
+
+    async def run(
+        self,
+        properties: List[Dict[str, Any]],
+        output_path: str,
+        errors_path: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Value the properties not yet in the results file.
+
+        Args:
+            properties: The portfolio, each property with a unique `property_id`
+            output_path: CSV file that result rows are appended to
+            errors_path: JSONL file for properties that could not be valued (defaults
+                to `<output>.errors.jsonl`); they are retried on the next run
+
+        Returns:
+            Counts of total, skipped, completed and failed properties
+        """
+        if errors_path is None:
+            errors_path = f"{os.path.splitext(output_path)[0]}.errors.jsonl"
+
+        ids = [str(item.get("property_id", "")) for item in properties]
+        if "" in ids:
+            raise ValueError("Each property in the portfolio needs a property_id")
+        if len(set(ids)) != len(ids):
+            raise ValueError("Portfolio property IDs must be unique")
+
+        completed_ids = read_completed_ids(output_path)
+        pending = [item for item in properties if str(item["property_id"]) not in completed_ids]
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+
+        self.counts.update(total=len(properties), skipped=len(properties) - len(pending))
+        self.started_at = time.monotonic()
+        logger.info(f"Revaluing {len(pending)} properties in {len(chunks)} chunks ({self.counts['skipped']} already valued)")
+
+        # Candidate comparables are shared by all properties of a city and type, so they are fetched once per job
+        context = ToolContext(self.property_service)
+        # Bounds the chunks being fetched or valued at once, and so the memory they hold
+        semaphore = asyncio.Semaphore(self.workers * 2)
+        loop = asyncio.get_running_loop()
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        write_header = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        # Spawned rather than forked workers, since forking a process with running threads is unsafe
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            with open(output_path, "a", encoding="utf-8", newline="") as output, open(errors_path, "w", encoding="utf-8") as errors:
+                writer = csv.DictWriter(output, fieldnames=RESULT_FIELDS)
+                if write_header:
+                    writer.writeheader()
+
+                def record_errors(failures: List[Tuple[Any, str]]) -> None:
+                    self.counts["failed"] += len(failures)
+                    for property_id, error in failures:
+                        errors.write(json.dumps({"property_id": property_id, "error": error}) + "\n")
+                    errors.flush()
+
+                async def run_chunk(chunk: List[Dict[str, Any]]) -> None:
+                    async with semaphore:
+                        resolved = await asyncio.gather(*[self._resolve(item, context) for item in chunk])
+                        subjects = [property_data for property_data, error in resolved if error is None]
+                        record_errors([(item["property_id"], error) for item, (_, error) in zip(chunk, resolved) if error is not None])
+                        if not subjects:
+                            return
+
+                        # Subjects sharing a candidate pool refer to it by index, so each pool is sent once
+                        pools: List[List[Dict[str, Any]]] = []
+                        pool_indexes: Dict[int, int] = {}
+                        comparables = []
+                        for subject in subjects:
+                            candidates = subject.pop("comparable_pool", None)
+                            if candidates is None:
+                                comparables.append(subject.pop("comparables", []))
+                            else:
+                                if id(candidates) not in pool_indexes:
+                                    pool_indexes[id(candidates)] = len(pools)
+                                    pools.append(candidates)
+                                comparables.append(pool_indexes[id(candidates)])
+                        try:
+                            rows = await loop.run_in_executor(
+                                pool,
+                                value_chunk,
+                                subjects,
+                                comparables if self.method in ("sales_comparison", "all") else None,
+                                self.method,
+                                pools,
+                                self.comparable_engine
+                            )
+                        except Exception as e:
+                            logger.warning(f"Revaluation chunk failed: {str(e)}")
+                            record_errors([(subject["property_id"], str(e)) for subject in subjects])
+                            return
+
+                        writer.writerows(rows)
+                        output.flush()
+                        self.counts["completed"] += len(rows)
+
+                await asyncio.gather(*[run_chunk(chunk) for chunk in chunks])
+        finally:
+            pool.shutdown(cancel_futures=True)
+            self.finished_at = time.monotonic()
+
+        logger.info(f"Revaluation finished: {self.progress()}")
+        return dict(self.counts)
+
+    async def _resolve(self, item: Dict[str, Any], context: ToolContext) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Get the data and comparables of a portfolio property, or the error that prevented it."""
+        try:
+            property_data = dict(item)
+            if "type" not in property_data:
+                details = await self.property_service.get_property_details(str(item["property_id"]))
+                property_data = {**details, **property_data}
+
+            if self.method in ("sales_comparison", "all") and "comparables" not in property_data:
+                location = (property_data.get("address") or {}).get("city", "")
+                property_type = property_data.get("type", "")
+                coordinates = (property_data.get("address") or {}).get("coordinates") or {}
+                if coordinates.get("latitude") is not None and self.property_service.sales_index.count(property_type, sales_only=True):
+                    # Indexed sales are searched around each property, ranked by similarity to it
+                    property_data["comparables"] = await self.property_service.get_comparable_properties(
+                        location=location,
+                        property_type=property_type,
+                        limit=COMPARABLES_PER_PROPERTY,
+                        latitude=coordinates.get("latitude"),
+                        longitude=coordinates.get("longitude"),
+                        subject=property_data
+                    )
+                else:
+                    # Ranked against each property in the worker processes
+                    property_data["comparable_pool"] = await context.get_comparable_properties(
+                        location=location,
+                        property_type=property_type,
+                        limit=settings.COMPARABLE_CANDIDATE_POOL
+                    )
+            return property_data, None
+        except Exception as e:
+            logger.warning(f"Could not fetch property {item.get('property_id')} for revaluation: {str(e)}")
+            return None, str(e)
+
+
+def get_revaluation_paths(revaluation_id: str) -> Dict[str, str]:
+    """Get the portfolio, results and errors file paths of a stored revaluation."""
+    if not REVALUATION_ID_PATTERN.match(revaluation_id):
+        raise ValueError("Revaluation IDs may only contain letters, digits, '-' and '_'")
+
+    base = os.path.join(settings.REVALUATION_DIR, revaluation_id)
+    return {
+        "portfolio": f"{base}.portfolio.jsonl",
+        "options": f"{base}.options.json",
+        "results": f"{base}.csv",
+        "errors": f"{base}.errors.jsonl"
+    }
+
+def start_revaluation(
+    revaluation_id: str,
+    property_service: Any,
+    properties: Optional[List[Dict[str, Any]]] = None,
+    method: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None
+) -> None:
+    """
+    Start or resume a stored portfolio revaluation in the background.
+
+    Args:
+        revaluation_id: ID of the revaluation
+        property_service: Property data service to fetch missing data with
+        properties: Portfolio of a new revaluation; when omitted the stored
+            portfolio is resumed
+        method: Valuation method, as for `value_properties` (defaults to
+            "all", or to the stored method when resuming)
+        chunk_size: Properties per worker task (defaults to the setting, or to
+            the stored chunk size when resuming)
+        workers: Number of worker processes (defaults to the setting)
+
+    Raises:
+        ValueError: If the revaluation ID or method is invalid
+        RevaluationRunningError: If a portfolio is given for a revaluation that
+            is still running
+        FileNotFoundError: If no portfolio is given and the revaluation is not stored
+    """
+    paths = get_revaluation_paths(revaluation_id)
+    if revaluation_id in _revaluation_tasks and not _revaluation_tasks[revaluation_id].done():
+        if properties is not None:
+            raise RevaluationRunningError(f"Revaluation {revaluation_id} is still running")
+        return
+
+    if properties is not None:
+        options = {"method": method or "all", "chunk_size": chunk_size or settings.REVALUATION_CHUNK_SIZE}
+    elif os.path.exists(paths["portfolio"]):
+        options = {"method": "all", "chunk_size": settings.REVALUATION_CHUNK_SIZE}
+        if os.path.exists(paths["options"]):
+            with open(paths["options"], "r", encoding="utf-8") as f:
+                options.update(json.load(f))
+        # Options given on resume override the stored ones
+        options.update({key: value for key, value in (("method", method), ("chunk_size", chunk_size)) if value})
+    else:
+        raise FileNotFoundError(f"Revaluation {revaluation_id} not found")
+
+    runner = PortfolioRevaluationRunner(
+        property_service,
+        method=options["method"],
+        chunk_size=options["chunk_size"],
+        workers=workers or settings.REVALUATION_WORKERS
+    )
+
+    if properties is not None:
+        os.makedirs(settings.REVALUATION_DIR, exist_ok=True)
+        with open(paths["portfolio"], "w", encoding="utf-8") as f:
+            for item in properties:
+                f.write(json.dumps(item) + "\n")
+        # A new portfolio starts from scratch
+        if os.path.exists(paths["results"]):
+            os.remove(paths["results"])
+    with open(paths["options"], "w", encoding="utf-8") as f:
+        json.dump(options, f)
+
+    _revaluation_runners[revaluation_id] = runner
+    _revaluation_tasks[revaluation_id] = asyncio.ensure_future(
+        runner.run(load_portfolio(paths["portfolio"]), paths["results"], paths["errors"])
+    )
+
+def get_revaluation_status(revaluation_id: str) -> Dict[str, Any]:
+    """Get the progress and throughput of a stored revaluation."""
+    paths = get_revaluation_paths(revaluation_id)
+    if not os.path.exists(paths["portfolio"]):
+        raise FileNotFoundError(f"Revaluation {revaluation_id} not found")
+
+    def count_lines(path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.endswith("\n"))
+
+    task = _revaluation_tasks.get(revaluation_id)
+    runner = _revaluation_runners.get(revaluation_id)
+    if runner is not None:
+        progress = runner.progress()
+        progress["completed"] += progress.pop("skipped")
+    else:
+        progress = {
+            "total": count_lines(paths["portfolio"]),
+            "completed": max(count_lines(paths["results"]) - 1, 0),  # without the header row
+            "failed": count_lines(paths["errors"]),
+            "elapsed_seconds": 0.0,
+            "properties_per_second": 0.0
+        }
+
+    if task is not None and not task.done():
+        status = "running"
+    elif task is not None and task.cancelled():
+        status = "cancelled"
+    elif task is not None and task.exception() is not None:
+        status = "failed"
+    elif progress["completed"] >= progress["total"]:
+        status = "completed"
+    else:
+        status = "incomplete"
+
+    return {"revaluation_id": revaluation_id, "status": status, **progress}
@@ -0,0 +1,65 @@
+"""
+Request coalescing for the Appraisal AI Agent.
+Concurrent callers asking for the same key share a single in-flight call
+instead of each triggering their own.
+"""
+import copy
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+class SingleFlight:
+    """Coalesces concurrent async calls with the same key into one shared task."""
+
+    def __init__(self):
+        """Initialize the single-flight group."""
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `func` unless a call for `key` is already in flight, then await its result.
+
+        The shared task is shielded, so a caller that is cancelled does not cancel
+        the call for the others still waiting on it.
+
+        Args:
+            key: Fingerprint of the request
+            func: Coroutine function performing the request
+
+        Returns:
+            A copy of the result of the shared call for each caller, so that one
+            caller modifying it does not affect the others (exceptions propagate
+            to every caller)
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        """Remove a finished task so later calls start a fresh request."""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved if every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls currently in flight."""
+        return len(self._in_flight)
+
+    def stats(self) -> Dict[str, int]:
+        """Get coalescing metrics."""
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight
+        }
@@ -0,0 +1,410 @@
+"""
+Spatial index for the Appraisal AI Agent.
+This module indexes properties and past sales by latitude and longitude so that
+comparable selection can ask for the k nearest sales of a property type within
+a radius and a recent sale period, instead of scanning every sale in Python.
+"""
+import logging
+import threading
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.8
+DAYS_PER_MONTH = 30.4375
+
+def _sale_day(value: Any) -> float:
+    """Convert a sale date to days since the epoch, NaN when it is missing or invalid."""
+    try:
+        return float(np.datetime64(str(value)[:10], "D").astype(np.int64))
+    except (TypeError, ValueError):
+        return np.nan
+
+def _number(value: Any) -> float:
+    """Convert a value to float, NaN when it is missing or not numeric."""
+    try:
+        return np.nan if value is None else float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def haversine_miles(points: np.ndarray, origin: np.ndarray) -> np.ndarray:
+    """
+    Get great-circle distances in miles.
+
+    Args:
+        points: (n, 2) latitudes and longitudes in radians
+        origin: (2,) latitude and longitude in radians
+
+    Returns:
+        (n,) distances from `origin` to each point
+    """
+    dlat = points[:, 0] - origin[0]
+    dlon = points[:, 1] - origin[1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(origin[0]) * np.cos(points[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class _Points:
+    """Records of one property type with their coordinates, sale days, sizes and prices as arrays."""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.coordinates = np.radians(np.array([[r["latitude"], r["longitude"]] for r in records], dtype=float).reshape(-1, 2))
+        self.sale_days = np.array([_sale_day(r.get("sale_date")) for r in records], dtype=float)
+        self.sizes = np.array([_number(r.get("size")) for r in records], dtype=float)
+        self.prices = np.array([_number(r.get("price")) for r in records], dtype=float)
+
+    def extend(self, other: "_Points") -> "_Points":
+        """Get the records of both sets, without converting them again."""
+        points = _Points([])
+        points.records = self.records + other.records
+        points.coordinates = np.concatenate([self.coordinates, other.coordinates])
+        points.sale_days = np.concatenate([self.sale_days, other.sale_days])
+        points.sizes = np.concatenate([self.sizes, other.sizes])
+        points.prices = np.concatenate([self.prices, other.prices])
+        return points
+
+    def select(self, keep: np.ndarray) -> "_Points":
+        """Get the records where `keep` is True."""
+        points = _Points([])
+        points.records = [record for record, kept in zip(self.records, keep) if kept]
+        points.coordinates = self.coordinates[keep]
+        points.sale_days = self.sale_days[keep]
+        points.sizes = self.sizes[keep]
+        points.prices = self.prices[keep]
+        return points
+
+    def matching(self, ids: Set[str]) -> np.ndarray:
+        """Whether each record's `id` is one of `ids`."""
+        return np.array([str(record.get("id")) in ids for record in self.records], dtype=bool)
+
+    def mask(
+        self,
+        indexes: np.ndarray,
+        min_sale_day: Optional[float],
+        min_size: Optional[float],
+        max_size: Optional[float],
+        min_price: Optional[float],
+        max_price: Optional[float],
+        sales_only: bool = False
+    ) -> np.ndarray:
+        """Whether the records at `indexes` pass the sale date, size and price filters."""
+        keep = np.ones(len(indexes), dtype=bool)
+        # Comparisons with NaN are False, so records missing a filtered field are left out
+        if min_sale_day is not None:
+            keep &= self.sale_days[indexes] >= min_sale_day
+        if min_size is not None:
+            keep &= self.sizes[indexes] >= min_size
+        if max_size is not None:
+            keep &= self.sizes[indexes] <= max_size
+        if min_price is not None:
+            keep &= self.prices[indexes] >= min_price
+        if max_price is not None:
+            keep &= self.prices[indexes] <= max_price
+        if sales_only:
+            keep &= ~np.isnan(self.prices[indexes])
+        return keep
+
+
+class _TypeIndex:
+    """
+    BallTree over the records of one property type, plus the records added since
+    it was built. Records removed from the tree are only marked as removed until
+    the next rebuild. While a rebuild runs, the buffer it is merging stays in
+    `merging` and the ids removed meanwhile are kept in `removed_ids`.
+    """
+
+    def __init__(self):
+        self.tree: Optional[BallTree] = None
+        self.indexed = _Points([])
+        self.removed = np.zeros(0, dtype=bool)
+        self.merging = _Points([])
+        self.buffer = _Points([])
+        self.rebuilding = False
+        self.removed_ids: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.indexed.records) - int(self.removed.sum()) + len(self.merging.records) + len(self.buffer.records)
+
+    def scanned(self) -> List[_Points]:
+        """Get the records that queries scan directly rather than through the tree."""
+        return [points for points in (self.merging, self.buffer) if points.records]
+
+    def sales(self) -> int:
+        """Get the number of records with a sale price."""
+        known = ~np.isnan(self.indexed.prices) & ~self.removed
+        return int(known.sum()) + sum(int((~np.isnan(points.prices)).sum()) for points in self.scanned())
+
+
+class SpatialIndex:
+    """
+    Index of properties and past sales by location, for each property type.
+
+    Each type has a BallTree with the haversine metric over the records added
+    before its last rebuild. Records added since are kept in a buffer that
+    queries scan directly, and the tree is rebuilt once the buffer grows past
+    `rebuild_ratio` of the tree (and at least `min_buffer` records), so adding
+    properties stays cheap while queries stay sub-linear. Trees are built on a
+    background thread without holding the lock and swapped in when done, so
+    request handlers adding or removing records never wait for a rebuild.
+    """
+
+    def __init__(self, leaf_size: int = 40, min_buffer: int = 256, rebuild_ratio: float = 0.1, background: bool = True):
+        """
+        Initialize an empty index.
+
+        Args:
+            leaf_size: Leaf size of the ball trees
+            min_buffer: Records a type buffers before its tree is rebuilt
+            rebuild_ratio: Buffer size, relative to the tree, that triggers a rebuild
+            background: Whether trees are rebuilt on a background thread rather
+                than by the call that triggered the rebuild
+        """
+        self.leaf_size = leaf_size
+        self.min_buffer = min_buffer
+        self.rebuild_ratio = rebuild_ratio
+        self.background = background
+
+        self._types: Dict[str, _TypeIndex] = {}
+        self._lock = threading.Lock()
+        self._rebuilds: Dict[str, threading.Thread] = {}
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add properties or sales to the index.
+
+        Args:
+            records: Records with `latitude`, `longitude` and `type`, and
+                optionally `price`, `size` and `sale_date` (ISO format) to
+                filter on; records without coordinates are skipped
+
+        Returns:
+            Number of records added
+        """
+        new_records: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            if np.isnan(_number(record.get("latitude"))) or np.isnan(_number(record.get("longitude"))):
+                continue
+            new_records.setdefault(record.get("type", ""), []).append(dict(record))
+        # Converted outside the lock so that queries are not held up
+        new_points = {property_type: _Points(type_records) for property_type, type_records in new_records.items()}
+
+        with self._lock:
+            for property_type, points in new_points.items():
+                index = self._types.setdefault(property_type, _TypeIndex())
+                index.buffer = index.buffer.extend(points)
+            stale = [property_type for property_type in new_points if self._needs_rebuild(self._types[property_type])]
+        for property_type in stale:
+            self._start_rebuild(property_type)
+        return sum(len(type_records) for type_records in new_records.values())
+
+    def remove(self, ids: Iterable[Any]) -> int:
+        """
+        Remove records from the index, e.g. when a property is deleted or changed.
+
+        Args:
+            ids: The `id` values of the records to remove
+
+        Returns:
+            Number of records removed
+        """
+        ids = {str(record_id) for record_id in ids}
+        removed = 0
+        stale = []
+        with self._lock:
+            for property_type, index in self._types.items():
+                for name in ("merging", "buffer"):
+                    points = getattr(index, name)
+                    matched = points.matching(ids)
+                    if matched.any():
+                        setattr(index, name, points.select(~matched))
+                        removed += int(matched.sum())
+
+                in_tree = index.indexed.matching(ids) & ~index.removed
+                if in_tree.any():
+                    index.removed |= in_tree
+                    removed += int(in_tree.sum())
+                if index.rebuilding:
+                    # The running rebuild took its records before these were removed
+                    index.removed_ids |= ids
+                if self._needs_rebuild(index):
+                    stale.append(property_type)
+        for property_type in stale:
+            self._start_rebuild(property_type)
+        return removed
+
+    def wait(self) -> None:
+        """Wait for the rebuilds running on background threads to finish."""
+        while True:
+            with self._lock:
+                threads = list(self._rebuilds.values())
+            if not threads:
+                return
+            for thread in threads:
+                thread.join()
+
+    def count(self, property_type: Optional[str] = None, sales_only: bool = False) -> int:
+        """Get the number of indexed records (or only of sales, with a price), of one property type or in total."""
+        with self._lock:
+            if property_type is not None:
+                indexes = [self._types[property_type]] if property_type in self._types else []
+            else:
+                indexes = list(self._types.values())
+            return sum(index.sales() if sales_only else len(index) for index in indexes)
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        property_type: str,
+        k: int = 10,
+        radius_miles: Optional[float] = None,
+        sold_within_months: Optional[float] = None,
+        min_size: Optional[float] = None,
+        max_size: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        as_of: Optional[date] = None,
+        sales_only: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the nearest records of a property type.
+
+        Args:
+            latitude: Latitude of the subject property
+            longitude: Longitude of the subject property
+            property_type: Type of the records to return
+            k: Maximum number of records to return
+            radius_miles: Maximum distance from the subject
+            sold_within_months: Only records sold within this many months of `as_of`
+            min_size: Minimum size
+            max_size: Maximum size
+            min_price: Minimum price
+            max_price: Maximum price
+            as_of: Date the sale period ends (defaults to today)
+            sales_only: Only records with a sale price, leaving out properties
+                that are indexed by location only
+
+        Returns:
+            Up to `k` records, nearest first, each with its `distance` in miles
+        """
+        origin = np.radians([latitude, longitude])
+        min_sale_day = None
+        if sold_within_months is not None:
+            min_sale_day = _sale_day((as_of or date.today()).isoformat()) - sold_within_months * DAYS_PER_MONTH
+        filters = (min_sale_day, min_size, max_size, min_price, max_price, sales_only)
+
+        with self._lock:
+            index = self._types.get(property_type)
+            if index is None or k <= 0:
+                return []
+
+            candidates = []
+            if index.tree is not None:
+                candidates.extend(self._query_tree(index, origin, k, radius_miles, filters))
+
+            for points in index.scanned():
+                distances = haversine_miles(points.coordinates, origin)
+                keep = points.mask(np.arange(len(distances)), *filters)
+                if radius_miles is not None:
+                    keep &= distances <= radius_miles
+                candidates.extend((distances[i], points.records[i]) for i in np.flatnonzero(keep))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [{**record, "distance": round(float(distance), 2)} for distance, record in candidates[:k]]
+
+    def _query_tree(
+        self,
+        index: _TypeIndex,
+        origin: np.ndarray,
+        k: int,
+        radius_miles: Optional[float],
+        filters: Tuple[Any, ...]
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Get (distance, record) candidates from a type's tree that pass the filters."""
+        points = index.indexed
+        size = len(points.records)
+
+        if radius_miles is not None:
+            indexes, distances = index.tree.query_radius(
+                origin[None, :], r=radius_miles / EARTH_RADIUS_MILES, return_distance=True, sort_results=True
+            )
+            indexes, distances = indexes[0], distances[0]
+            keep = points.mask(indexes, *filters) & ~index.removed[indexes]
+        else:
+            # Widen the search until k records pass the filters or the whole tree has been searched
+            m = k
+            while True:
+                distances, indexes = index.tree.query(origin[None, :], k=min(m, size))
+                indexes, distances = indexes[0], distances[0]
+                keep = points.mask(indexes, *filters) & ~index.removed[indexes]
+                if keep.sum() >= k or m >= size:
+                    break
+                m *= 4
+
+        return [(distances[i] * EARTH_RADIUS_MILES, points.records[indexes[i]]) for i in np.flatnonzero(keep)[:k]]
+
+    def _needs_rebuild(self, index: _TypeIndex) -> bool:
+        """Whether a type's buffer or removed records have outgrown its tree; call with the lock held."""
+        if index.rebuilding:
+            return False
+        threshold = max(self.min_buffer, self.rebuild_ratio * len(index.indexed.records))
+        return len(index.buffer.records) >= threshold or index.removed.sum() >= threshold
+
+    def _start_rebuild(self, property_type: str) -> None:
+        """Rebuild a type's tree on a background thread, or in this thread when `background` is off."""
+        if not self.background:
+            self._rebuild(property_type)
+            return
+        with self._lock:
+            if property_type in self._rebuilds:
+                return
+            thread = threading.Thread(target=self._rebuild, args=(property_type,), name=f"spatial-index-{property_type}", daemon=True)
+            self._rebuilds[property_type] = thread
+        thread.start()
+
+    def _rebuild(self, property_type: str) -> None:
+        """Rebuild a type's tree over all its records, dropping removed ones, and swap it in."""
+        stale = False
+        started = False
+        try:
+            with self._lock:
+                index = self._types[property_type]
+                if index.rebuilding:
+                    return
+                index.rebuilding = True
+                started = True
+                index.merging, index.buffer = index.buffer, _Points([])
+                index.removed_ids = set()
+                indexed, kept, merging = index.indexed, ~index.removed, index.merging
+
+            # Built without the lock; queries meanwhile use the old tree and scan `merging`
+            points = indexed.select(kept).extend(merging)
+            tree = BallTree(points.coordinates, leaf_size=self.leaf_size, metric="haversine") if points.records else None
+
+            with self._lock:
+                index.indexed = points
+                index.tree = tree
+                index.removed = points.matching(index.removed_ids)
+                index.merging = _Points([])
+                index.removed_ids = set()
+                index.rebuilding = False
+                stale = self._needs_rebuild(index)
+        except Exception as e:
+            logger.error(f"Error rebuilding the {property_type} spatial index: {str(e)}")
+            if started:
+                with self._lock:
+                    # The old tree stays in use and the taken records are scanned until the next rebuild
+                    index.buffer = index.merging.extend(index.buffer)
+                    index.merging = _Points([])
+                    index.removed_ids = set()
+                    index.rebuilding = False
+        finally:
+            with self._lock:
+                self._rebuilds.pop(property_type, None)
+        if stale:
+            self._start_rebuild(property_type)
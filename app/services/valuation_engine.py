@@ -0,0 +1,206 @@
+"""
+Valuation engine for the Appraisal AI Agent.
+This module values many properties at once with NumPy: the sales comparison,
+cost and income approaches and their reconciliation are computed as array
+operations over all subject properties and their comparables, so a portfolio
+revaluation of thousands of properties costs a handful of vector operations
+instead of a Python loop per property.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+METHODS = ("sales_comparison", "cost", "income")
+
+# Reconciliation weights of the (sales comparison, cost, income) approaches by property type
+RECONCILIATION_WEIGHTS = {
+    "residential": (0.7, 0.3, 0.0),
+    "commercial": (0.3, 0.2, 0.5)
+}
+DEFAULT_RECONCILIATION_WEIGHTS = (0.5, 0.3, 0.2)
+
+# Cost approach assumptions
+REPLACEMENT_COST_PER_SQFT = {"residential": 200.0, "commercial": 300.0}
+EFFECTIVE_LIFE = 50  # years
+MAX_DEPRECIATION = 0.7
+LAND_VALUE_RATIO = 0.3  # share of the estimated value attributed to land
+VALUATION_YEAR = 2025
+
+# Income approach applies to these property types
+INCOME_PROPERTY_TYPES = ("commercial", "industrial")
+
+def _number(value: Any, default: float = np.nan) -> float:
+    """Convert a value to float, using `default` when it is missing or not numeric."""
+    try:
+        return default if value is None else float(value)
+    except (TypeError, ValueError):
+        return default
+
+def sales_comparison_values(
+    subject_size: np.ndarray,
+    comp_price: np.ndarray,
+    comp_size: np.ndarray,
+    comp_price_per_sqft: np.ndarray,
+    comp_mask: np.ndarray
+) -> np.ndarray:
+    """
+    Value subjects by the mean of their size-adjusted comparable prices.
+
+    Args:
+        subject_size: (n,) subject sizes, NaN when unknown
+        comp_price: (n, k) comparable prices
+        comp_size: (n, k) comparable sizes, NaN when unknown
+        comp_price_per_sqft: (n, k) comparable prices per square foot
+        comp_mask: (n, k) True where a comparable exists
+
+    Returns:
+        (n,) values; 0 for subjects without comparables
+    """
+    size_difference = subject_size[:, None] - comp_size
+    size_adjustment = np.where(np.isnan(size_difference), 0.0, size_difference * comp_price_per_sqft)
+    adjusted = np.where(comp_mask, comp_price + size_adjustment, 0.0)
+
+    counts = comp_mask.sum(axis=1)
+    return np.divide(adjusted.sum(axis=1), counts, out=np.zeros(len(subject_size)), where=counts > 0)
+
+def cost_approach_values(
+    cost_per_sqft: np.ndarray,
+    size: np.ndarray,
+    year_built: np.ndarray,
+    estimated_value: np.ndarray
+) -> np.ndarray:
+    """
+    Value subjects as land value plus depreciated replacement cost.
+
+    Args:
+        cost_per_sqft: (n,) replacement cost per square foot, NaN where the approach does not apply
+        size: (n,) sizes
+        year_built: (n,) construction years
+        estimated_value: (n,) prior estimated values, used to estimate land value
+
+    Returns:
+        (n,) values, NaN where the approach does not apply
+    """
+    depreciation_rate = np.minimum((VALUATION_YEAR - year_built) / EFFECTIVE_LIFE, MAX_DEPRECIATION)
+    replacement_cost = size * cost_per_sqft
+    return estimated_value * LAND_VALUE_RATIO + replacement_cost * (1 - depreciation_rate)
+
+def income_approach_values(
+    annual_rent: np.ndarray,
+    occupancy_rate: np.ndarray,
+    expenses: np.ndarray,
+    cap_rate: np.ndarray
+) -> np.ndarray:
+    """
+    Value subjects by direct capitalization of net operating income.
+
+    Args:
+        annual_rent: (n,) gross annual rents, NaN where the approach does not apply
+        occupancy_rate: (n,) occupancy rates
+        expenses: (n,) annual operating expenses
+        cap_rate: (n,) capitalization rates
+
+    Returns:
+        (n,) values, NaN where the approach does not apply or the cap rate is not positive
+    """
+    net_operating_income = annual_rent * occupancy_rate - expenses
+    return np.divide(net_operating_income, cap_rate, out=np.full(len(cap_rate), np.nan), where=cap_rate > 0)
+
+def reconcile_values(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Reconcile approach values into a weighted average.
+
+    Args:
+        values: (n, 3) values by approach, NaN where an approach does not apply
+        weights: (n, 3) weights by approach
+
+    Returns:
+        (n,) reconciled values over the positive values with positive weight, NaN where there are none
+    """
+    used = (np.nan_to_num(values) > 0) & (weights > 0)
+    total_weight = np.where(used, weights, 0.0).sum(axis=1)
+    weighted_sum = np.where(used, np.nan_to_num(values) * weights, 0.0).sum(axis=1)
+    return np.divide(weighted_sum, total_weight, out=np.full(len(values), np.nan), where=total_weight > 0)
+
+def value_properties(
+    subjects: Sequence[Dict[str, Any]],
+    comparables: Optional[Sequence[Sequence[Dict[str, Any]]]] = None,
+    method: str = "all"
+) -> List[Dict[str, float]]:
+    """
+    Value a batch of properties.
+
+    Args:
+        subjects: Properties in the property data format, i.e. with `type`,
+            `details` (`size`, `year_built`) and `valuation` (`estimated_value`
+            and optionally `income` with `annual_rent`, `occupancy_rate`,
+            `expenses` and `cap_rate`)
+        comparables: Comparable sales (`price`, `size`, `price_per_sqft`) for each
+            subject; required for the sales comparison approach
+        method: "sales_comparison", "cost", "income" or "all" (every approach
+            plus their reconciliation)
+
+    Returns:
+        The valuations of each subject by approach, rounded to cents; approaches
+        that do not apply to a property are left out
+    """
+    if method not in METHODS + ("all",):
+        raise ValueError(f"Unknown valuation method: {method}")
+
+    n = len(subjects)
+    types = [subject.get("type", "") for subject in subjects]
+    details = [subject.get("details") or {} for subject in subjects]
+    valuation = [subject.get("valuation") or {} for subject in subjects]
+    size = np.array([_number(detail.get("size")) for detail in details])
+
+    values = np.full((n, len(METHODS)), np.nan)
+
+    if method in ("sales_comparison", "all"):
+        if comparables is None:
+            raise ValueError("Comparables are required for the sales comparison approach")
+        k = max((len(comps) for comps in comparables), default=0)
+        comp_price = np.zeros((n, k))
+        comp_size = np.full((n, k), np.nan)
+        comp_price_per_sqft = np.zeros((n, k))
+        comp_mask = np.zeros((n, k), dtype=bool)
+        for i, comps in enumerate(comparables):
+            for j, comp in enumerate(comps):
+                comp_price[i, j] = _number(comp.get("price"), 0.0)
+                comp_size[i, j] = _number(comp.get("size"))
+                comp_price_per_sqft[i, j] = _number(comp.get("price_per_sqft"), 0.0)
+                comp_mask[i, j] = True
+        values[:, 0] = sales_comparison_values(size, comp_price, comp_size, comp_price_per_sqft, comp_mask)
+
+    if method in ("cost", "all"):
+        values[:, 1] = cost_approach_values(
+            np.array([REPLACEMENT_COST_PER_SQFT.get(property_type, np.nan) for property_type in types]),
+            np.nan_to_num(size),
+            np.array([_number(detail.get("year_built"), 2000) for detail in details]),
+            np.array([_number(item.get("estimated_value"), 0.0) for item in valuation])
+        )
+
+    if method in ("income", "all"):
+        income = [
+            (item.get("income") or {}) if property_type in INCOME_PROPERTY_TYPES else {}
+            for property_type, item in zip(types, valuation)
+        ]
+        values[:, 2] = income_approach_values(
+            np.array([_number(item.get("annual_rent"), 0.0) if item else np.nan for item in income]),
+            np.array([_number(item.get("occupancy_rate"), 0.9) for item in income]),
+            np.array([_number(item.get("expenses"), 0.0) for item in income]),
+            np.array([_number(item.get("cap_rate"), 0.07) for item in income])
+        )
+
+    values = np.round(values, 2)
+    reconciled = None
+    if method == "all":
+        weights = np.array([RECONCILIATION_WEIGHTS.get(property_type, DEFAULT_RECONCILIATION_WEIGHTS) for property_type in types])
+        reconciled = reconcile_values(values, weights)
+
+    results = []
+    for i in range(n):
+        result = {name: float(values[i, m]) for m, name in enumerate(METHODS) if not np.isnan(values[i, m])}
+        if reconciled is not None and not np.isnan(reconciled[i]):
+            result["reconciled"] = round(float(reconciled[i]), 2)
+        results.append(result)
+    return results
@@ -0,0 +1,132 @@
+"""
+Tool result cache for the Appraisal AI Agent.
+This module memoizes tool results keyed by the tool name and its canonicalized
+arguments, with a TTL for each tool, so that a lookup the model repeats within
+a conversation or across users is only computed once.
+"""
+import copy
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def make_tool_key(tool_name: str, args: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a tool call.
+
+    Args:
+        tool_name: Name of the tool
+        args: Arguments for the tool
+
+    Returns:
+        The tool name and a SHA-256 hex digest of the canonical JSON encoding of the arguments
+    """
+    encoded = json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{tool_name}:{hashlib.sha256(encoded.encode()).hexdigest()}"
+
+
+class ToolResultCache:
+    """
+    In-memory LRU cache of tool results with a TTL for each tool.
+
+    Only tools with a positive TTL in `ttls` are cached. Results are copied in and
+    out, so callers may modify the results they get.
+    """
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            ttls: Seconds a result stays valid, by tool name
+            max_entries: Maximum number of cached results
+        """
+        self.ttls = ttls
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        """Whether results of a tool are cached."""
+        return self.ttls.get(tool_name, 0) > 0
+
+    def get(self, tool_name: str, args: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached tool result.
+
+        Returns:
+            A copy of the cached result, or None if it is missing or expired
+        """
+        if not self.is_cacheable(tool_name):
+            return None
+
+        key = make_tool_key(tool_name, args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+        return None
+
+    def put(self, tool_name: str, args: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Cache a tool result for the TTL of its tool."""
+        if not self.is_cacheable(tool_name):
+            return
+
+        key = make_tool_key(tool_name, args)
+        expires_at = time.monotonic() + self.ttls[tool_name]
+        with self._lock:
+            self._entries[key] = (expires_at, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tool_name: Optional[str] = None, args: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Remove cached results, e.g. after the underlying data changed.
+
+        Args:
+            tool_name: Tool whose results to remove; all tools when omitted
+            args: Arguments of the single result to remove; all results of
+                `tool_name` when omitted
+
+        Returns:
+            Number of results removed
+        """
+        with self._lock:
+            if tool_name is None:
+                keys = list(self._entries)
+            elif args is not None:
+                keys = [key for key in [make_tool_key(tool_name, args)] if key in self._entries]
+            else:
+                keys = [key for key in self._entries if key.startswith(f"{tool_name}:")]
+
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss metrics for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
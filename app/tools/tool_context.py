@@ -0,0 +1,105 @@
+"""
+Request-scoped tool context for the Appraisal AI Agent.
+Tools executed for the same request share a ToolContext, which memoizes the
+property, comparable, trend and regulation lookups they make so that each
+input is fetched once, even when several tools or report sections need it at
+the same time.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.tools.tool_cache import make_tool_key
+
+class ToolContext:
+    """Memo of the data lookups made by the tools of one request."""
+
+    def __init__(self, property_service: Any):
+        """
+        Initialize an empty context.
+
+        Args:
+            property_service: Property data service the lookups are made with
+        """
+        self.property_service = property_service
+        self._lookups: Dict[str, asyncio.Future] = {}
+
+    async def _memoize(self, name: str, func: Callable[..., Awaitable[Any]], **kwargs: Any) -> Any:
+        """Run a lookup once per set of arguments; concurrent callers share the call in flight."""
+        key = make_tool_key(name, kwargs)
+        lookup = self._lookups.get(key)
+        if lookup is None:
+            lookup = asyncio.ensure_future(func(**kwargs))
+            self._lookups[key] = lookup
+        # Shielded so that one cancelled caller does not cancel the lookup for the others
+        return await asyncio.shield(lookup)
+
+    async def get_property_details(self, property_id: str) -> Dict[str, Any]:
+        """Get the details of a property."""
+        return await self._memoize(
+            "property_details",
+            self.property_service.get_property_details,
+            property_id=property_id
+        )
+
+    async def get_comparable_properties(
+        self,
+        location: str,
+        property_type: str,
+        min_size: Optional[float] = None,
+        max_size: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 10,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        subject: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Get comparable properties matching the criteria, ranked by similarity to `subject` when given."""
+        kwargs = {}
+        # Only passed when set, so that plain searches are shared and work with any property service
+        if latitude is not None and longitude is not None:
+            kwargs.update(latitude=latitude, longitude=longitude)
+        if subject is not None:
+            kwargs["subject"] = subject
+        return await self._memoize(
+            "comparable_properties",
+            self.property_service.get_comparable_properties,
+            location=location,
+            property_type=property_type,
+            min_size=min_size,
+            max_size=max_size,
+            min_price=min_price,
+            max_price=max_price,
+            limit=limit,
+            **kwargs
+        )
+
+    async def get_subject_comparables(self, property_data: Dict[str, Any], limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the sales most similar to a property, near it when it has coordinates, for its valuation."""
+        address = property_data.get("address") or {}
+        coordinates = address.get("coordinates") or {}
+        return await self.get_comparable_properties(
+            location=address.get("city", ""),
+            property_type=property_data.get("type", ""),
+            limit=limit,
+            latitude=coordinates.get("latitude"),
+            longitude=coordinates.get("longitude"),
+            subject=property_data
+        )
+
+    async def get_market_trends(self, location: str, property_type: str) -> Dict[str, Any]:
+        """Get the market trends for a location and property type."""
+        return await self._memoize(
+            "market_trends",
+            self.property_service.get_market_trends,
+            location=location,
+            property_type=property_type
+        )
+
+    async def search_property_regulations(self, location: str) -> List[Dict[str, Any]]:
+        """Get the property regulations for a location."""
+        return await self._memoize(
+            "property_regulations",
+            self.property_service.search_property_regulations,
+            location=location
+        )
@@ -5,20 +5,36 @@ import json
 from typing import Dict, Any, List, Optional
 import asyncio
 
-from app.services.property_data_service import PropertyDataService
+from app.core.config import settings
+from app.services.dependencies import get_property_data_service
 from app.services.web_search_service import WebSearchService
+from app.services.valuation_engine import value_properties
+from app.tools.tool_cache import ToolResultCache
+from app.tools.tool_context import ToolContext
 
 # Initialize services
-property_service = PropertyDataService()
 web_search_service = WebSearchService()
 
-async def execute_tool(tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+# Memoized results of tools with a TTL
+tool_cache = ToolResultCache(
+    ttls=settings.TOOL_CACHE_TTLS if settings.TOOL_CACHE_ENABLED else {},
+    max_entries=settings.TOOL_CACHE_MAX_ENTRIES
+)
+
+def create_tool_context() -> ToolContext:
+    """Create the lookup memo shared by the tools of one request."""
+    # The shared service, whose sales index is filled by the API and at startup
+    return ToolContext(get_property_data_service())
+
+async def execute_tool(tool_name: str, args: Dict[str, Any], context: Optional[ToolContext] = None) -> Dict[str, Any]:
     """
     Execute a tool with the given arguments.
     
     Args:
         tool_name: Name of the tool to execute
         args: Arguments for the tool
+        context: Lookups shared with the other tools of the same request;
+            a new context is used when omitted
         
     Returns:
         The result of the tool execution
@@ -30,15 +46,37 @@ async def execute_tool(tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         except:
             args = {}
     
-    # Execute the appropriate tool
+    cached_result = tool_cache.get(tool_name, args)
+    if cached_result is not None:
+        return cached_result
+    
+    result = await _dispatch_tool(tool_name, args, context or create_tool_context())
+    tool_cache.put(tool_name, args, result)
+    return result
+
+def invalidate_tool_results(tool_name: Optional[str] = None, args: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Remove memoized tool results, e.g. after the data behind a tool changed.
+    
+    Args:
+        tool_name: Tool whose results to remove; all tools when omitted
+        args: Arguments of the single result to remove
+        
+    Returns:
+        Number of results removed
+    """
+    return tool_cache.invalidate(tool_name, args)
+
+async def _dispatch_tool(tool_name: str, args: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
+    """Run the tool named `tool_name`."""
     if tool_name == "property_search":
-        return await _execute_property_search(args)
+        return await _execute_property_search(args, context)
     elif tool_name == "market_analysis":
-        return await _execute_market_analysis(args)
+        return await _execute_market_analysis(args, context)
     elif tool_name == "valuation_calculator":
-        return await _execute_valuation_calculator(args)
+        return await _execute_valuation_calculator(args, context)
     elif tool_name == "report_generator":
-        return await _execute_report_generator(args)
+        return await _execute_report_generator(args, context)
     elif tool_name == "compliance_checker":
         return await _execute_compliance_checker(args)
     elif tool_name == "image_analyzer":
@@ -48,7 +86,7 @@ async def execute_tool(tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
     else:
         raise ValueError(f"Unknown tool: {tool_name}")
 
-async def _execute_property_search(args: Dict[str, Any]) -> Dict[str, Any]:
+async def _execute_property_search(args: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
     """Execute the property search tool."""
     location = args.get("location")
     property_type = args.get("property_type")
@@ -62,7 +100,7 @@ async def _execute_property_search(args: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("Location and property_type are required")
     
     # Get comparable properties
-    comparables = await property_service.get_comparable_properties(
+    comparables = await context.get_comparable_properties(
         location=location,
         property_type=property_type,
         min_size=min_size,
@@ -87,7 +125,7 @@ async def _execute_property_search(args: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
-async def _execute_market_analysis(args: Dict[str, Any]) -> Dict[str, Any]:
+async def _execute_market_analysis(args: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
     """Execute the market analysis tool."""
     location = args.get("location")
     property_type = args.get("property_type")
@@ -97,16 +135,18 @@ async def _execute_market_analysis(args: Dict[str, Any]) -> Dict[str, Any]:
     if not location or not property_type:
         raise ValueError("Location and property_type are required")
     
-    # Get market trends
-    trends = await property_service.get_market_trends(
-        location=location,
-        property_type=property_type
-    ) if include_trends else None
+    async def get_trends():
+        if include_trends:
+            return await context.get_market_trends(location=location, property_type=property_type)
+        return None
+    
+    async def get_regulations():
+        if include_regulations:
+            return await context.search_property_regulations(location=location)
+        return None
     
-    # Get regulations
-    regulations = await property_service.search_property_regulations(
-        location=location
-    ) if include_regulations else None
+    # Get market trends and regulations concurrently
+    trends, regulations = await asyncio.gather(get_trends(), get_regulations())
     
     return {
         "location": location,
@@ -119,7 +159,7 @@ async def _execute_market_analysis(args: Dict[str, Any]) -> Dict[str, Any]:
                            if trends else "No trend data available."
     }
 
-async def _execute_valuation_calculator(args: Dict[str, Any]) -> Dict[str, Any]:
+async def _execute_valuation_calculator(args: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
     """Execute the valuation calculator tool."""
     property_id = args.get("property_id")
     method = args.get("method")
@@ -129,111 +169,14 @@ async def _execute_valuation_calculator(args: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("Property ID and valuation method are required")
     
     # Get property details
-    property_data = await property_service.get_property_details(property_id)
-    
-    # Calculate valuation based on method
-    valuations = {}
+    property_data = await context.get_property_details(property_id)
     
+    # Get the comparables most similar to the property for sales comparison approach
+    comparables = None
     if method == "sales_comparison" or method == "all":
-        # Get comparables for sales comparison approach
-        comparables = await property_service.get_comparable_properties(
-            location=property_data.get("address", {}).get("city", ""),
-            property_type=property_data.get("type", ""),
-            limit=5
-        )
-        
-        # Calculate adjusted values of comparables
-        adjusted_values = []
-        for comp in comparables:
-            # Apply adjustments (simplified for demo)
-            adjusted_value = comp.get("price", 0)
-            
-            # Size adjustment
-            if "size" in comp and "size" in property_data.get("details", {}):
-                size_diff = property_data["details"]["size"] - comp["size"]
-                size_adj = size_diff * (comp.get("price_per_sqft", 0))
-                adjusted_value += size_adj
-            
-            # Other adjustments would go here
-            
-            adjusted_values.append(adjusted_value)
-        
-        # Calculate average of adjusted values
-        sales_comparison_value = sum(adjusted_values) / len(adjusted_values) if adjusted_values else 0
-        valuations["sales_comparison"] = round(sales_comparison_value, 2)
-    
-    if method == "cost" or method == "all":
-        # Cost approach (simplified for demo)
-        # Land value + (Replacement cost - Depreciation)
-        if property_data.get("type") in ["residential", "commercial"]:
-            # Simplified calculation
-            year_built = property_data.get("details", {}).get("year_built", 2000)
-            current_year = 2025  # Hardcoded current year for demo
-            age = current_year - year_built
-            
-            # Replacement cost per square foot
-            replacement_cost_per_sqft = 200 if property_data.get("type") == "residential" else 300
-            
-            # Calculate replacement cost
-            size = property_data.get("details", {}).get("size", 0)
-            replacement_cost = size * replacement_cost_per_sqft
-            
-            # Calculate depreciation (simplified linear depreciation)
-            effective_life = 50  # years
-            depreciation_rate = min(age / effective_life, 0.7)  # Cap at 70% depreciation
-            depreciation = replacement_cost * depreciation_rate
-            
-            # Estimate land value (simplified)
-            land_value = property_data.get("valuation", {}).get("estimated_value", 0) * 0.3
-            
-            # Calculate cost approach value
-            cost_value = land_value + (replacement_cost - depreciation)
-            valuations["cost"] = round(cost_value, 2)
-    
-    if method == "income" or method == "all":
-        # Income approach (simplified for demo)
-        if property_data.get("type") in ["commercial", "industrial"]:
-            # Get income data from property
-            income_data = property_data.get("valuation", {}).get("income", {})
-            
-            if income_data:
-                annual_rent = income_data.get("annual_rent", 0)
-                occupancy_rate = income_data.get("occupancy_rate", 0.9)
-                expenses = income_data.get("expenses", 0)
-                cap_rate = income_data.get("cap_rate", 0.07)
-                
-                # Calculate net operating income (NOI)
-                effective_gross_income = annual_rent * occupancy_rate
-                noi = effective_gross_income - expenses
-                
-                # Calculate value using direct capitalization
-                if cap_rate > 0:
-                    income_value = noi / cap_rate
-                    valuations["income"] = round(income_value, 2)
-    
-    # Reconcile values if multiple methods used
-    if method == "all":
-        # Weighted average based on property type
-        if property_data.get("type") == "residential":
-            weights = {"sales_comparison": 0.7, "cost": 0.3, "income": 0.0}
-        elif property_data.get("type") == "commercial":
-            weights = {"sales_comparison": 0.3, "cost": 0.2, "income": 0.5}
-        else:
-            weights = {"sales_comparison": 0.5, "cost": 0.3, "income": 0.2}
-        
-        # Calculate weighted average
-        reconciled_value = 0
-        total_weight = 0
-        
-        for method_name, value in valuations.items():
-            weight = weights.get(method_name, 0)
-            if value > 0 and weight > 0:
-                reconciled_value += value * weight
-                total_weight += weight
-        
-        if total_weight > 0:
-            reconciled_value = reconciled_value / total_weight
-            valuations["reconciled"] = round(reconciled_value, 2)
+        comparables = [await context.get_subject_comparables(property_data)]
+    
+    valuations = value_properties([property_data], comparables, method)[0]
     
     return {
         "property_id": property_id,
@@ -247,7 +190,7 @@ async def _execute_valuation_calculator(args: Dict[str, Any]) -> Dict[str, Any]:
         "adjustments_applied": adjustments
     }
 
-async def _execute_report_generator(args: Dict[str, Any]) -> Dict[str, Any]:
+async def _execute_report_generator(args: Dict[str, Any], context: ToolContext) -> Dict[str, Any]:
     """Execute the report generator tool."""
     property_id = args.get("property_id")
     report_type = args.get("report_type", "summary")
@@ -262,7 +205,24 @@ async def _execute_report_generator(args: Dict[str, Any]) -> Dict[str, Any]:
         raise ValueError("Property ID is required")
     
     # Get property details
-    property_data = await property_service.get_property_details(property_id)
+    property_data = await context.get_property_details(property_id)
+    
+    async def get_valuation():
+        if "valuation" in include_sections:
+            return await _execute_valuation_calculator({"property_id": property_id, "method": "all"}, context)
+        return None
+    
+    async def get_market_analysis():
+        if "market_analysis" in include_sections:
+            return await _execute_market_analysis({
+                "location": property_data.get("address", {}).get("city", ""),
+                "property_type": property_data.get("type", ""),
+                "include_trends": True
+            }, context)
+        return None
+    
+    # The valuation and market analysis sections are independent, so compute them concurrently
+    valuation_data, market_data = await asyncio.gather(get_valuation(), get_market_analysis())
     
     # Generate report sections
     sections = {}
@@ -276,12 +236,6 @@ async def _execute_report_generator(args: Dict[str, Any]) -> Dict[str, Any]:
         }
     
     if "valuation" in include_sections:
-        # Get valuation data
-        valuation_data = await _execute_valuation_calculator({
-            "property_id": property_id,
-            "method": "all"
-        })
-        
         sections["valuation"] = {
             "title": "Valuation Analysis",
             "content": "The property has been valued using multiple approaches:",
@@ -289,13 +243,6 @@ async def _execute_report_generator(args: Dict[str, Any]) -> Dict[str, Any]:
         }
     
     if "market_analysis" in include_sections:
-        # Get market analysis
-        market_data = await _execute_market_analysis({
-            "location": property_data.get("address", {}).get("city", ""),
-            "property_type": property_data.get("type", ""),
-            "include_trends": True
-        })
-        
         sections["market_analysis"] = {
             "title": "Market Analysis",
             "content": market_data.get("analysis_summary", ""),
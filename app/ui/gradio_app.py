@@ -5,15 +5,17 @@ import gradio as gr
 import httpx
 import os
 import json
+import uuid
 from typing import List, Dict, Any
 import asyncio
 
 # Import services
-from app.services.llm_service import LLMService, Message
+from app.services.dependencies import get_llm_service
+from app.services.llm_service import Message
 from app.core.config import settings
 
-# Initialize services
-llm_service = LLMService()
+# Initialize services (shared with the API, whose shutdown closes the connection pool)
+llm_service = get_llm_service()
 
 class AppraisalAIUI:
     """Gradio UI for the Appraisal AI Agent."""
@@ -25,6 +27,7 @@ class AppraisalAIUI:
         api_port = int(os.getenv("PORT", "8001"))
         self.api_url = f"http://{api_host}:{api_port}{settings.API_V1_STR}"
         self.conversation_history = []
+        self.conversation_id = str(uuid.uuid4())
         self.current_property_id = None
         self.current_project_id = None
         print(f"UI initialized with API URL: {self.api_url}")
@@ -57,6 +60,7 @@ class AppraisalAIUI:
                     f"{self.api_url}/agent",
                     json={
                         "messages": [msg.dict() for msg in messages],
+                        "conversation_id": self.conversation_id,
                         "property_id": self.current_property_id,
                         "project_id": self.current_project_id
                     }
@@ -85,6 +89,7 @@ class AppraisalAIUI:
     def clear_conversation(self):
         """Clear the conversation history."""
         self.conversation_history = []
+        self.conversation_id = str(uuid.uuid4())
         return [], ""
     
     def search_properties(
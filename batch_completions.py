@@ -0,0 +1,52 @@
+"""
+Run a batch of LLM completions from a JSONL file of prompt jobs.
+Results are appended to a JSONL file as they complete; rerunning the same
+command resumes the batch, skipping jobs that already have a result.
+
+Each input line is an object with an `id` and either `messages` or a `prompt`
+(with an optional `system` prompt), e.g.
+    {"id": "property-17", "system": "You write appraisal reports.", "prompt": "Draft the market overview for ..."}
+
+Usage:
+    python batch_completions.py jobs.jsonl results.jsonl
+    python batch_completions.py jobs.jsonl results.jsonl --concurrency 64
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.llm_service import LLMService
+from app.services.batch_service import BatchCompletionRunner, load_jobs
+
+async def run_batch(jobs_path: str, output_path: str, concurrency: int):
+    """
+    Run the jobs in `jobs_path` that are not yet in `output_path`.
+    """
+    llm_service = LLMService()
+    try:
+        jobs = load_jobs(jobs_path)
+        print(f"Loaded {len(jobs)} jobs from {jobs_path}")
+
+        runner = BatchCompletionRunner(llm_service, concurrency=concurrency)
+        counts = await runner.run(jobs, output_path)
+        print(json.dumps(counts, indent=2))
+
+        if counts["failed"]:
+            print("Some jobs failed; rerun the same command to retry them.")
+    finally:
+        await llm_service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a batch of LLM completions.")
+    parser.add_argument("jobs", help="JSONL file of prompt jobs")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY, help="Jobs in progress at once")
+    args = parser.parse_args()
+
+    asyncio.run(run_batch(args.jobs, args.output, args.concurrency))
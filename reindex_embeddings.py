@@ -0,0 +1,54 @@
+"""
+Rewrite the stored RAG embeddings with the configured embedding provider.
+Optionally fits the dimensionality reduction stage first and reports its recall
+against full-dimension embeddings.
+
+Usage:
+    python reindex_embeddings.py
+    python reindex_embeddings.py --reduce pca --dimension 256
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.session import SessionLocal
+from app.core.config import settings
+from app.services.rag_service import RAGService
+
+async def reindex(reduce: str = None, dimension: int = None, k: int = 10, batch_size: int = 500):
+    """
+    Fit the embedding reducer if requested, then re-embed every document chunk.
+    """
+    db = SessionLocal()
+    try:
+        rag_service = RAGService(db)
+
+        if reduce:
+            print(f"Fitting {reduce} embedding reducer to {dimension} dimensions...")
+            report = await rag_service.fit_embedding_reducer(reduce, dimension, k=k, batch_size=batch_size)
+            print(json.dumps(report, indent=2))
+
+            if not report["active"]:
+                print("Reducer saved, but EMBEDDING_REDUCTION is 'none'; set it to apply the reducer and rerun.")
+                return
+
+        print(f"Re-embedding document chunks ({rag_service.embedding_dimension} dimensions)...")
+        count = await rag_service.reindex_embeddings(batch_size=batch_size)
+        print(f"Re-embedded {count} document chunks.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite stored RAG embeddings.")
+    parser.add_argument("--reduce", choices=["pca", "random"], help="Fit a dimensionality reduction stage first")
+    parser.add_argument("--dimension", type=int, default=settings.EMBEDDING_REDUCED_DIMENSION, help="Reduced dimension")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours used to measure recall")
+    parser.add_argument("--batch-size", type=int, default=500, help="Chunks per batch")
+    args = parser.parse_args()
+
+    asyncio.run(reindex(args.reduce, args.dimension, args.k, args.batch_size))
@@ -0,0 +1,286 @@
+"""
+OpenAI-compatible stub LLM server for offline load and latency testing.
+Point the app at it instead of the paid Nebius endpoint:
+
+    NEBIUS_ENDPOINT=http://localhost:9000/v1/chat/completions NEBIUS_API_KEY=stub
+
+It serves chat completions (plain and streamed, including tool calls),
+embeddings and the model list, with configurable latency and error injection.
+The configuration can be changed while running with POST /stub/config.
+
+Usage:
+    python stub_llm_server.py --port 9000
+    python stub_llm_server.py --latency lognormal:0.8,0.4 --token-latency 0.02 --error-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+class StubConfig(BaseModel):
+    """Behaviour of the stub server."""
+    latency: str = "fixed:0.2"  # fixed:<s>, uniform:<min>,<max> or lognormal:<median>,<sigma>
+    token_latency: float = 0.01  # seconds between streamed tokens
+    response_tokens: int = 50  # words in each generated answer
+    tool_call_rate: float = 1.0  # probability of calling a tool when tools are offered
+    error_rate: float = 0.0  # probability of an injected error response
+    error_status_codes: List[int] = [429, 500, 503]
+    timeout_rate: float = 0.0  # probability of never answering
+    embedding_dimension: int = 1536
+
+def sample_latency(spec: str) -> float:
+    """
+    Sample a latency in seconds from a distribution spec.
+
+    Args:
+        spec: fixed:<seconds>, uniform:<min>,<max> or lognormal:<median>,<sigma>
+
+    Returns:
+        The sampled latency
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+
+    if kind == "fixed":
+        return values[0]
+    if kind == "uniform":
+        return random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return random.lognormvariate(np.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+def _example_arguments(tool: Dict[str, Any]) -> Dict[str, Any]:
+    """Build plausible arguments for a tool from its JSON schema."""
+    parameters = tool.get("function", {}).get("parameters", {})
+    properties = parameters.get("properties", {})
+    examples = {"string": "Austin, TX", "number": 1.0, "integer": 1, "boolean": True, "array": [], "object": {}}
+
+    arguments = {}
+    for name in parameters.get("required", list(properties)):
+        schema = properties.get(name, {})
+        arguments[name] = schema["enum"][0] if schema.get("enum") else examples.get(schema.get("type"), "example")
+    return arguments
+
+def _answer(messages: List[Dict[str, Any]], length: int) -> str:
+    """Generate a deterministic stub answer for a conversation."""
+    last_message = next((message.get("content") or "" for message in reversed(messages)), "")
+    words = ["Stub", "response", "to:"] + last_message.split()[:10]
+    while len(words) < length:
+        words.append(f"token{len(words)}")
+    return " ".join(words[:max(length, 1)])
+
+def create_stub_app(config: Optional[StubConfig] = None) -> FastAPI:
+    """
+    Create the stub server application.
+
+    Args:
+        config: Initial behaviour; defaults to StubConfig()
+
+    Returns:
+        The FastAPI application, with the live config at `app.state.config`
+        and request counters at `app.state.stats`
+    """
+    app = FastAPI(title="Stub LLM Server")
+    app.state.config = config or StubConfig()
+    app.state.stats = {"requests": 0, "errors": 0, "timeouts": 0, "tool_calls": 0}
+
+    async def inject_failure() -> Optional[JSONResponse]:
+        """Wait for the sampled latency, then maybe return an injected error."""
+        stub_config = app.state.config
+        app.state.stats["requests"] += 1
+
+        if random.random() < stub_config.timeout_rate:
+            app.state.stats["timeouts"] += 1
+            await asyncio.sleep(3600)
+
+        await asyncio.sleep(sample_latency(stub_config.latency))
+
+        if random.random() < stub_config.error_rate:
+            app.state.stats["errors"] += 1
+            status_code = random.choice(stub_config.error_status_codes)
+            return JSONResponse(
+                status_code=status_code,
+                content={"error": {"message": f"Injected error {status_code}", "type": "stub_error", "code": status_code}}
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        failure = await inject_failure()
+        if failure is not None:
+            return failure
+
+        stub_config = app.state.config
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "stub-model")
+
+        # Call a tool unless the model is already answering tool results
+        tool_calls = None
+        if tools and messages and messages[-1].get("role") != "tool" and random.random() < stub_config.tool_call_rate:
+            tool = random.choice(tools)
+            tool_calls = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": tool["function"]["name"], "arguments": json.dumps(_example_arguments(tool))}
+            }]
+            app.state.stats["tool_calls"] += 1
+
+        content = None if tool_calls else _answer(messages, stub_config.response_tokens)
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        prompt_tokens = sum(len(str(message.get("content") or "").split()) for message in messages)
+        completion_tokens = len(content.split()) if content else 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content, "tool_calls": tool_calls},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            }
+
+        def chunk(delta: Optional[Dict[str, Any]], finish: Optional[str] = None, chunk_usage: Optional[Dict[str, int]] = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }
+            if chunk_usage is not None:
+                data["usage"] = chunk_usage
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            yield chunk({"role": "assistant", "content": ""})
+            if tool_calls:
+                yield chunk({"tool_calls": [{"index": 0, **tool_calls[0]}]})
+            else:
+                for i, word in enumerate(content.split()):
+                    await asyncio.sleep(stub_config.token_latency)
+                    yield chunk({"content": word if i == 0 else f" {word}"})
+            yield chunk({}, finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        failure = await inject_failure()
+        if failure is not None:
+            return failure
+
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+
+        dimension = app.state.config.embedding_dimension
+        data = []
+        for index, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(dimension)
+            data.append({"object": "embedding", "index": index, "embedding": (vector / np.linalg.norm(vector)).tolist()})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": len(texts), "total_tokens": len(texts)}
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]}
+
+    @app.get("/stub/config")
+    async def get_config():
+        return {"config": app.state.config, "stats": app.state.stats}
+
+    @app.post("/stub/config")
+    async def update_config(stub_config: StubConfig):
+        app.state.config = stub_config
+        return {"config": app.state.config, "stats": app.state.stats}
+
+    return app
+
+class StubServer:
+    """Runs the stub server in a background thread, e.g. from a load test."""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 9000):
+        """Initialize the in-process stub server."""
+        self.app = create_stub_app(config)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.endpoint = f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self) -> "StubServer":
+        """Start serving and wait until the server accepts connections."""
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.server.should_exit = True
+        self.thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an OpenAI-compatible stub LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="fixed:0.2", help="fixed:<s>, uniform:<min>,<max> or lognormal:<median>,<sigma>")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--response-tokens", type=int, default=50, help="Words in each generated answer")
+    parser.add_argument("--tool-call-rate", type=float, default=1.0, help="Probability of calling a tool when tools are offered")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error response")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Probability of never answering")
+    parser.add_argument("--embedding-dimension", type=int, default=1536)
+    args = parser.parse_args()
+
+    stub_config = StubConfig(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        response_tokens=args.response_tokens,
+        tool_call_rate=args.tool_call_rate,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        embedding_dimension=args.embedding_dimension
+    )
+    sample_latency(stub_config.latency)
+
+    print(f"Stub LLM server on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_stub_app(stub_config), host=args.host, port=args.port, log_level="warning")
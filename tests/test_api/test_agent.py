@@ -0,0 +1,237 @@
+"""Test the agent endpoints."""
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.agents import appraisal_agent
+from app.core.config import settings
+from app.main import app
+from app.services.dependencies import get_llm_service
+from app.services.llm_service import LLMCircuitOpenError, Message
+
+class FakeStreamingLLMService:
+    """LLM service that requests one tool call, then streams its answer."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def stream_completion(self, messages, tools=None, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            yield {
+                "type": "message",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{
+                        "id": "call_1",
+                        "type": "function",
+                        "function": {"name": "gis_mapper", "arguments": "{}"}
+                    }]
+                },
+                "finish_reason": "tool_calls"
+            }
+        else:
+            assert messages[-1].role == "tool" and messages[-1].tool_call_id == "call_1"
+            for token in ["The property", " is fine."]:
+                yield {"type": "token", "content": token}
+            yield {
+                "type": "message",
+                "message": {"role": "assistant", "content": "The property is fine.", "tool_calls": None},
+                "finish_reason": "stop"
+            }
+
+def parse_events(body: str):
+    """Parse a server-sent event stream into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_agent_events(client: TestClient):
+    """Tool calls, tool results and final tokens are streamed in order."""
+    app.dependency_overrides[get_llm_service] = FakeStreamingLLMService
+    try:
+        response = client.post("/api/v1/agent/stream", json={"messages": [{"role": "user", "content": "Map it"}]})
+    finally:
+        del app.dependency_overrides[get_llm_service]
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert [event for event, _ in events] == ["tool_call_start", "tool_call_end", "token", "token", "done"]
+    assert events[1][1]["name"] == "gis_mapper"
+    assert events[-1][1]["response"] == "The property is fine."
+
+class CachingLLMService:
+    """LLM service that records the cache flag of the completions it serves."""
+
+    def __init__(self):
+        self.use_cache = []
+
+    async def generate_with_tools(self, messages, tools=None, use_cache=None, **kwargs):
+        self.use_cache.append(use_cache)
+        return {"choices": [{"message": {"role": "assistant", "content": "Cached answer."}, "finish_reason": "stop"}]}
+
+def test_stream_agent_honours_use_cache(client: TestClient):
+    """With use_cache, streamed turns are served through the completion cache."""
+    llm_service = CachingLLMService()
+    app.dependency_overrides[get_llm_service] = lambda: llm_service
+    try:
+        response = client.post("/api/v1/agent/stream", json={"messages": [{"role": "user", "content": "Hi"}], "use_cache": True})
+    finally:
+        del app.dependency_overrides[get_llm_service]
+
+    events = parse_events(response.text)
+    assert llm_service.use_cache == [True]
+    assert events == [("token", {"content": "Cached answer.", "step": 1}), events[-1]]
+    assert events[-1][0] == "done" and events[-1][1]["response"] == "Cached answer."
+
+class UnavailableLLMService:
+    """LLM service whose circuit breaker is open."""
+
+    async def generate_with_tools(self, messages, tools=None, **kwargs):
+        raise LLMCircuitOpenError("LLM backend is unavailable (circuit open)")
+
+def test_agent_degrades_while_circuit_is_open(client: TestClient):
+    """Earlier tool results are summarized instead of failing the request."""
+    app.dependency_overrides[get_llm_service] = UnavailableLLMService
+    try:
+        response = client.post("/api/v1/agent", json={"messages": [
+            {"role": "user", "content": "Map it"},
+            {"role": "tool", "name": "gis_mapper", "tool_call_id": "call_1", "content": "{\"lat\": 30.27}"},
+            {"role": "user", "content": "Anything else?"}
+        ]})
+    finally:
+        del app.dependency_overrides[get_llm_service]
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["degraded"] is True
+    assert "**gis_mapper results:**" in data["response"]
+
+class UnavailableStreamingLLMService(UnavailableLLMService):
+    """Streaming LLM service whose circuit breaker is open."""
+
+    async def stream_completion(self, messages, tools=None, **kwargs):
+        raise LLMCircuitOpenError("LLM backend is unavailable (circuit open)")
+        yield
+
+def test_agent_values_the_property_while_circuit_is_open(client: TestClient):
+    """Without earlier tool results, the degraded response runs the valuation calculator."""
+    app.dependency_overrides[get_llm_service] = UnavailableStreamingLLMService
+    request = {"messages": [{"role": "user", "content": "What is it worth?"}], "property_id": "123"}
+    try:
+        data = client.post("/api/v1/agent", json=request).json()
+        events = parse_events(client.post("/api/v1/agent/stream", json=request).text)
+    finally:
+        del app.dependency_overrides[get_llm_service]
+
+    assert data["degraded"] is True and data["steps"] == 0
+    assert "**valuation_calculator results:**" in data["response"]
+    assert "Reconciled value: $" in data["response"]
+    assert events[-1][0] == "done" and events[-1][1]["steps"] == data["steps"]
+    assert events[-1][1]["response"] == data["response"]
+
+def tool_call(call_id, name, **arguments):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+class ScriptedLLMService:
+    """LLM service that answers each completion with the next scripted message."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.tools_offered = []
+
+    async def generate_with_tools(self, messages, tools=None, **kwargs):
+        self.tools_offered.append(bool(tools))
+        return {"choices": [{"message": self.messages.pop(0), "finish_reason": "stop"}]}
+
+def test_agent_loop_runs_tools_concurrently_over_several_steps(monkeypatch):
+    """Tool calls overlap, keep their order, fail or time out on their own and are not repeated."""
+    executed = []
+
+    async def fake_execute_tool(tool_name, args, context=None):
+        executed.append(tool_name)
+        await asyncio.sleep(args["delay"])
+        if tool_name == "market_analysis":
+            raise ValueError("no market data")
+        return {"tool": tool_name}
+
+    monkeypatch.setattr(appraisal_agent, "execute_tool", fake_execute_tool)
+    monkeypatch.setattr(settings, "TOOL_CALL_TIMEOUT", 0.5)
+    llm_service = ScriptedLLMService([
+        {"role": "assistant", "content": None, "tool_calls": [
+            tool_call("a", "gis_mapper", delay=0.3),
+            tool_call("b", "market_analysis", delay=0.1),
+            tool_call("c", "property_search", delay=0.3),
+            tool_call("d", "image_analyzer", delay=5)
+        ]},
+        {"role": "assistant", "content": None, "tool_calls": [tool_call("e", "gis_mapper", delay=0.3)]},
+        {"role": "assistant", "content": "Done.", "tool_calls": None}
+    ])
+    messages = [Message(role="user", content="Value it")]
+
+    started_at = time.monotonic()
+    result = asyncio.run(appraisal_agent.AppraisalAgent(llm_service, tools=[{}]).run(messages))
+    assert time.monotonic() - started_at < 1
+
+    assert result["response"] == "Done." and result["steps"] == 3
+    assert executed == ["gis_mapper", "market_analysis", "property_search", "image_analyzer"]
+    tool_messages = [message for message in messages if message.role == "tool"]
+    assert [message.tool_call_id for message in tool_messages] == ["a", "b", "c", "d", "e"]
+    contents = [json.loads(message.content) for message in tool_messages]
+    assert contents[0] == contents[4] == {"tool": "gis_mapper"}
+    assert contents[1] == {"error": "no market data"}
+    assert "timed out" in contents[3]["error"]
+
+def test_agent_loop_stops_at_max_steps():
+    """The last allowed completion is made without tools."""
+    llm_service = ScriptedLLMService([
+        {"role": "assistant", "content": None, "tool_calls": [tool_call("a", "unknown_tool")]},
+        {"role": "assistant", "content": "Final answer.", "tool_calls": None}
+    ])
+    agent = appraisal_agent.AppraisalAgent(llm_service, tools=[{}], max_steps=2)
+
+    result = asyncio.run(agent.run([Message(role="user", content="Hi")]))
+    assert result["response"] == "Final answer." and result["steps"] == 2
+    assert llm_service.tools_offered == [True, False]
+
+    with pytest.raises(ValueError):
+        appraisal_agent.AppraisalAgent(llm_service, max_steps=0)
+
+def test_agent_loop_keeps_to_its_time_budget(monkeypatch):
+    """Tool calls are cut off when the budget runs out and completions get the time left."""
+    async def slow_execute_tool(tool_name, args, context=None):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(appraisal_agent, "execute_tool", slow_execute_tool)
+    monkeypatch.setattr(appraisal_agent, "MIN_COMPLETION_TIMEOUT", 0.1)
+    monkeypatch.setattr(settings, "TOOL_CALL_TIMEOUT", 30)
+    llm_service = ScriptedLLMService([
+        {"role": "assistant", "content": None, "tool_calls": [tool_call("a", "gis_mapper")]},
+        {"role": "assistant", "content": "Out of time.", "tool_calls": None}
+    ])
+    timeouts = []
+    generate_with_tools = llm_service.generate_with_tools
+
+    async def record_timeout(messages, tools=None, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return await generate_with_tools(messages, tools=tools, **kwargs)
+
+    llm_service.generate_with_tools = record_timeout
+    messages = [Message(role="user", content="Value it")]
+
+    started_at = time.monotonic()
+    result = asyncio.run(appraisal_agent.AppraisalAgent(llm_service, tools=[{}], time_budget=0.3).run(messages))
+    assert time.monotonic() - started_at < 1
+
+    assert result["response"] == "Out of time." and result["steps"] == 2
+    assert "timed out" in json.loads(messages[-1].content)["error"]
+    assert llm_service.tools_offered == [True, False]
+    assert 0.2 < timeouts[0] <= 0.3 and timeouts[1] == 0.1
@@ -6,3 +6,26 @@ def test_health_check(client: TestClient):
     response = client.get("/api/v1/health")
     assert response.status_code == 200
     assert response.json()["status"] == "ok"
+
+def test_liveness(client: TestClient):
+    """Test liveness probe."""
+    response = client.get("/api/v1/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+def test_readiness_uses_cached_status(client: TestClient, monkeypatch):
+    """Test readiness probe reports the cached dependency status."""
+    from app.api.v1 import health
+    from app.services.health_service import HealthMonitor
+    health_monitor = HealthMonitor(get_llm_service=lambda: None)
+    monkeypatch.setattr(health, "get_health_monitor", lambda: health_monitor)
+
+    response = client.get("/api/v1/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unavailable"
+
+    health_monitor.database_status = "ok"
+    health_monitor.llm_status = "error: connection check failed"
+    response = client.get("/api/v1/health/ready")
+    assert response.status_code == 200
+    assert response.json()["llm_status"] == "error: connection check failed"
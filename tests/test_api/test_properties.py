@@ -0,0 +1,119 @@
+"""Test the property endpoints."""
+import asyncio
+from datetime import date
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.dependencies import get_property_data_service
+from app.tools.tool_executor import execute_tool
+
+def test_comparables_exclude_the_property_itself():
+    """A property indexed with its own last sale is not returned as its own comparable."""
+    client = TestClient(app)
+    sales = [
+        {"id": f"sale-{i}", "type": "residential", "latitude": 30.3 + i * 0.001, "longitude": -97.7,
+         "price": 400000, "size": 1800 + i * 50, "year_built": 1995, "sale_date": "2024-06-01"}
+        for i in range(6)
+    ]
+    assert client.post("/api/v1/properties/sales", json=sales).status_code == 200
+
+    created = client.post("/api/v1/properties", json={
+        "type": "residential",
+        "address": {"city": "Austin", "state": "TX", "coordinates": {"latitude": 30.3, "longitude": -97.7}},
+        "details": {"size": 2000, "year_built": 2000, "last_sale_price": 450000, "last_sale_date": "2024-09-01"}
+    }).json()
+
+    response = client.get(f"/api/v1/properties/{created['id']}/comparables", params={"limit": 3})
+    assert response.status_code == 200
+    comparables = response.json()["comparables"]
+    assert len(comparables) == 3
+    assert created["id"] not in [comp["id"] for comp in comparables]
+
+def test_deleted_and_moved_properties_leave_the_sales_index():
+    """Updating a property reindexes its sale; deleting it removes the sale."""
+    client = TestClient(app)
+    created = client.post("/api/v1/properties", json={
+        "type": "industrial",
+        "address": {"city": "Austin", "state": "TX", "coordinates": {"latitude": 30.3, "longitude": -97.7}},
+        "details": {"size": 20000, "last_sale_price": 2000000, "last_sale_date": "2024-09-01"}
+    }).json()
+    params = {"latitude": 30.3, "longitude": -97.7, "property_type": "industrial", "radius_miles": 5}
+
+    def nearby_ids():
+        return [sale["id"] for sale in client.get("/api/v1/properties/sales/nearest", params=params).json()]
+
+    assert created["id"] in nearby_ids()
+
+    moved = {"address": {"coordinates": {"latitude": 40.7, "longitude": -74.0}}}
+    assert client.put(f"/api/v1/properties/{created['id']}", json=moved).status_code == 200
+    assert created["id"] not in nearby_ids()
+
+    assert client.put(f"/api/v1/properties/{created['id']}", json={"address": {"coordinates": {"latitude": 30.3, "longitude": -97.7}}}).status_code == 200
+    assert nearby_ids().count(created["id"]) == 1
+
+    assert client.delete(f"/api/v1/properties/{created['id']}").status_code == 200
+    assert created["id"] not in nearby_ids()
+
+def test_valuation_tool_uses_the_indexed_sales(monkeypatch):
+    """Sales indexed through the API are the comparables of the valuation tool and batch endpoint."""
+    client = TestClient(app)
+    subject = {
+        "property_id": "indexed-sales-subject",
+        "type": "residential",
+        "address": {"city": "Boise", "coordinates": {"latitude": 43.6, "longitude": -116.2}},
+        "details": {"size": 2200, "year_built": 2001}
+    }
+
+    async def get_property_details(property_id):
+        return subject
+
+    monkeypatch.setattr(get_property_data_service(), "get_property_details", get_property_details)
+    sales = [
+        {"id": f"boise-sale-{i}", "type": "residential", "latitude": 43.6, "longitude": -116.2,
+         "price": 777777, "size": 2200, "year_built": 2001, "sale_date": date.today().isoformat()}
+        for i in range(5)
+    ]
+    assert client.post("/api/v1/properties/sales", json=sales).status_code == 200
+
+    result = asyncio.run(execute_tool("valuation_calculator", {"property_id": "indexed-sales-subject", "method": "sales_comparison"}))
+    assert result["valuations"]["sales_comparison"] == 777777
+
+    # The batch endpoint selects the same comparables as the tool
+    response = client.post("/api/v1/properties/valuation/batch", json={
+        "properties": [{"property_id": "indexed-sales-subject"}],
+        "method": "sales_comparison"
+    })
+    assert response.json()["results"][0]["valuations"] == result["valuations"]
+
+class FailingPropertyService:
+    """Property data service that knows one property and whose comparables lookup fails."""
+
+    def __init__(self):
+        self.lookups = []
+
+    async def get_property_details(self, property_id):
+        self.lookups.append(property_id)
+        if property_id != "known":
+            raise Exception("Failed to retrieve property data: no such property")
+        return {"type": "residential", "address": {"city": "Austin"}, "details": {"size": 2000}}
+
+    async def get_comparable_properties(self, **kwargs):
+        raise RuntimeError("market data API unavailable")
+
+def test_batch_valuation_errors():
+    """Unknown methods are rejected up front, only lookup misses are 404 and other failures are 5xx."""
+    property_service = FailingPropertyService()
+    app.dependency_overrides[get_property_data_service] = lambda: property_service
+    client = TestClient(app)
+    try:
+        response = client.post("/api/v1/properties/valuation/batch", json={"properties": [{"property_id": "known"}], "method": "guess"})
+        assert response.status_code == 400 and property_service.lookups == []
+
+        response = client.post("/api/v1/properties/valuation/batch", json={"properties": [{"property_id": "missing"}], "method": "cost"})
+        assert response.status_code == 404
+
+        response = client.post("/api/v1/properties/valuation/batch", json={"properties": [{"property_id": "known"}]})
+        assert response.status_code == 500
+    finally:
+        del app.dependency_overrides[get_property_data_service]
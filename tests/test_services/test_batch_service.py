@@ -0,0 +1,103 @@
+"""Test batch completions with resumable JSONL output."""
+import asyncio
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services import batch_service
+from app.services.batch_service import (
+    BatchCompletionRunner,
+    BatchRunningError,
+    get_batch_status,
+    read_completed_ids,
+    start_batch
+)
+
+class FlakyLLMService:
+    """LLM service that fails the jobs whose prompt is listed in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.prompts = []
+
+    async def generate_completion(self, messages, **kwargs):
+        prompt = messages[-1].content
+        self.prompts.append(prompt)
+        if prompt in self.failing:
+            raise RuntimeError("upstream error")
+        return {
+            "model": "test-model",
+            "choices": [{"message": {"content": prompt.upper()}, "finish_reason": "stop"}],
+            "usage": {"total_tokens": 3}
+        }
+
+def test_batch_resumes_and_retries_failed_jobs(tmp_path):
+    """Completed jobs are skipped on rerun; failed ones are retried."""
+    jobs = [{"id": i, "prompt": f"report {i}"} for i in range(5)]
+    output_path = str(tmp_path / "results.jsonl")
+
+    llm_service = FlakyLLMService(failing={"report 3"})
+    counts = asyncio.run(BatchCompletionRunner(llm_service, concurrency=2).run(jobs, output_path))
+    assert counts == {"total": 5, "skipped": 0, "completed": 4, "failed": 1}
+
+    # Simulate a crash in the middle of writing a line
+    with open(output_path, "a") as f:
+        f.write('{"id": 9, "cont')
+
+    llm_service = FlakyLLMService()
+    counts = asyncio.run(BatchCompletionRunner(llm_service, concurrency=2).run(jobs, output_path))
+    assert counts == {"total": 5, "skipped": 4, "completed": 1, "failed": 0}
+    assert llm_service.prompts == ["report 3"]
+
+    with open(output_path) as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(record["id"] for record in records) == [0, 1, 2, 3, 4]
+    assert records[-1]["content"] == "REPORT 3"
+    assert read_completed_ids(output_path) == {"0", "1", "2", "3", "4"}
+
+def test_new_jobs_replace_the_results_of_a_stored_batch(tmp_path, monkeypatch):
+    """Posting jobs under an existing ID starts over; a running batch refuses new jobs."""
+    monkeypatch.setattr(settings, "BATCH_DIR", str(tmp_path))
+    llm_service = FlakyLLMService()
+
+    async def run():
+        start_batch("reports", llm_service, jobs=[{"id": 0, "prompt": "first"}])
+        with pytest.raises(BatchRunningError):
+            start_batch("reports", llm_service, jobs=[{"id": 0, "prompt": "second"}])
+        await asyncio.sleep(0.1)
+        assert get_batch_status("reports")["status"] == "completed"
+
+        start_batch("reports", llm_service, jobs=[{"id": 0, "prompt": "second"}])
+        await asyncio.sleep(0.1)
+        with pytest.raises(ValueError):
+            start_batch("reports", llm_service, concurrency=0)
+        # Invalid jobs are refused before the stored results are replaced
+        for jobs in ([{"prompt": "no id"}], [{"id": 1}], [{"id": 1, "messages": [{"text": "hi"}]}]):
+            with pytest.raises(ValueError):
+                start_batch("reports", llm_service, jobs=jobs)
+
+    asyncio.run(run())
+    assert llm_service.prompts == ["first", "second"]
+    with open(tmp_path / "reports.jsonl") as f:
+        assert [json.loads(line)["content"] for line in f] == ["SECOND"]
+
+class HangingLLMService:
+    """LLM service whose completions never finish."""
+
+    async def generate_completion(self, messages, **kwargs):
+        await asyncio.sleep(3600)
+
+def test_cancelled_batch_reports_its_status(tmp_path, monkeypatch):
+    """A batch whose task was cancelled, e.g. at shutdown, is reported as cancelled."""
+    monkeypatch.setattr(settings, "BATCH_DIR", str(tmp_path))
+
+    async def run():
+        start_batch("hanging", HangingLLMService(), jobs=[{"id": 0, "prompt": "report"}])
+        await asyncio.sleep(0.05)
+        batch_service._batch_tasks["hanging"].cancel()
+        await asyncio.sleep(0.05)
+        return get_batch_status("hanging")
+
+    status = asyncio.run(run())
+    assert status["status"] == "cancelled" and status["completed"] == 0
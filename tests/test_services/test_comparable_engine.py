@@ -0,0 +1,49 @@
+"""Test the weighted k-NN comparable engine."""
+import random
+from datetime import date
+
+from app.services.comparable_engine import ComparableEngine
+
+SUBJECT = {"type": "residential", "details": {"size": 2000, "year_built": 2000, "bedrooms": 3, "bathrooms": 2}}
+
+def make_candidates(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "size": rng.randint(1000, 3000),
+            "year_built": rng.randint(1960, 2020),
+            "bedrooms": rng.randint(2, 5),
+            "bathrooms": rng.choice([1, 1.5, 2, 2.5, 3]),
+            "distance": round(rng.random() * 5, 1),
+            "sale_date": f"2024-{rng.randint(1, 12):02d}-15"
+        }
+        for i in range(count)
+    ]
+
+def test_weights_decide_the_ranking():
+    """The same candidates rank by the features their property type weighs."""
+    near = {"id": "near", "size": 3000, "year_built": 1960, "bedrooms": 5, "bathrooms": 4, "distance": 0.1, "sale_date": "2024-06-01"}
+    alike = {"id": "alike", "size": 2000, "year_built": 2000, "bedrooms": 3, "bathrooms": 2, "distance": 4.0, "sale_date": "2024-06-01"}
+    engine = ComparableEngine({
+        "residential": {"size": 1.0, "age": 1.0, "bedrooms": 1.0, "bathrooms": 1.0, "distance": 0.1},
+        "default": {"distance": 1.0}
+    })
+
+    ranked = engine.rank(SUBJECT, [near, alike], k=2, as_of=date(2025, 1, 1))
+    assert [c["id"] for c in ranked] == ["alike", "near"]
+    assert ranked[0]["similarity"] > ranked[1]["similarity"]
+
+    ranked = engine.rank({**SUBJECT, "type": "land"}, [near, alike], k=2, as_of=date(2025, 1, 1))
+    assert [c["id"] for c in ranked] == ["near", "alike"]
+
+def test_kd_tree_matches_brute_force():
+    """Large candidate pools are searched with a KD-tree and give the same neighbours."""
+    weights = {"default": {"size": 1.0, "age": 0.5, "bedrooms": 0.8, "bathrooms": 0.6, "distance": 1.0, "recency": 0.7}}
+    candidates = make_candidates(500)
+    subjects = [SUBJECT, {**SUBJECT, "details": {"size": 1200, "year_built": 1975}}]
+
+    brute_force = ComparableEngine(weights, kd_tree_threshold=10000).rank_many(subjects, candidates, k=10, as_of=date(2025, 1, 1))
+    kd_tree = ComparableEngine(weights, kd_tree_threshold=100).rank_many(subjects, candidates, k=10, as_of=date(2025, 1, 1))
+    assert [[c["id"] for c in ranked] for ranked in kd_tree] == [[c["id"] for c in ranked] for ranked in brute_force]
+    assert all(len(ranked) == 10 for ranked in kd_tree)
@@ -0,0 +1,54 @@
+"""Test the LLM completion cache."""
+import time
+
+from app.services.completion_cache import CompletionCache, make_cache_key
+
+def test_cache_key_depends_on_full_request():
+    """Any change to the request produces a different key."""
+    messages = [{"role": "user", "content": "Summarize compliance"}]
+    key = make_cache_key("model", messages, None, 0, 256)
+
+    assert key == make_cache_key("model", [dict(messages[0])], [], 0, 256)
+    assert key != make_cache_key("model", messages, None, 0, 512)
+    assert key != make_cache_key("other", messages, None, 0, 256)
+
+def test_lru_eviction_and_ttl():
+    """The memory tier evicts least recently used entries and expires old ones."""
+    cache = CompletionCache(max_entries=2, ttl=60)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    assert cache.get("a") == {"id": "a"}
+
+    cache.put("c", {"id": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+
+    cache.ttl = 0
+    assert cache.get("c") is None
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 2 and stats["misses"] == 2 and stats["evictions"] == 2
+
+def test_callers_get_their_own_copy():
+    """Modifying a cached or returned response does not change the cache."""
+    cache = CompletionCache(max_entries=2, ttl=60)
+    response = {"choices": [{"message": {"content": "cached"}}]}
+    cache.put("a", response)
+    response["choices"][0]["message"]["content"] = "changed by the caller"
+
+    first = cache.get("a")
+    first["choices"].clear()
+    assert cache.get("a") == {"choices": [{"message": {"content": "cached"}}]}
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Entries on disk are served by a new cache instance and bounded in number."""
+    path = str(tmp_path / "completions.sqlite3")
+    cache = CompletionCache(path=path, max_disk_entries=2)
+    for key in ["a", "b", "c"]:
+        cache.put(key, {"id": key})
+        time.sleep(0.01)
+
+    restarted = CompletionCache(path=path, max_disk_entries=2)
+    assert restarted.get("a") is None
+    assert restarted.get("c") == {"id": "c"}
+    assert restarted.stats()["disk_hits"] == 1
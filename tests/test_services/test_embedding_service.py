@@ -0,0 +1,52 @@
+"""Test the embedding providers and the persistent embedding cache."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.embedding_reducer import EmbeddingReducer, save_embedding_reducer
+from app.services.embedding_service import (
+    CachedEmbeddingProvider,
+    EmbeddingCache,
+    ReducedEmbeddingProvider,
+    StubEmbeddingProvider
+)
+
+class CountingProvider(StubEmbeddingProvider):
+    """Stub provider that records how many texts reach the backend."""
+
+    def __init__(self, dimension: int):
+        super().__init__(dimension)
+        self.embedded = 0
+
+    async def embed(self, texts):
+        self.embedded += len(texts)
+        return await super().embed(texts)
+
+def test_cache_is_shared_across_provider_instances(tmp_path):
+    """Texts are embedded once, even by a new provider reopening the same cache file."""
+    path = str(tmp_path / "cache.sqlite3")
+    texts = ["cap rate", "comparable sales", "cap rate"]
+
+    backend = CountingProvider(dimension=8)
+    first = asyncio.run(CachedEmbeddingProvider(backend, EmbeddingCache(path)).embed(texts))
+    assert backend.embedded == 2
+
+    restarted = CountingProvider(dimension=8)
+    second = asyncio.run(CachedEmbeddingProvider(restarted, EmbeddingCache(path)).embed(texts))
+    assert restarted.embedded == 0
+    assert first == second
+    assert first[0] == first[2]
+
+def test_reducer_must_match_the_configured_reduction(tmp_path):
+    """A reducer fitted with another method or dimension is refused instead of used."""
+    path = str(tmp_path / "reducer.joblib")
+    save_embedding_reducer(EmbeddingReducer("random", 4).fit(np.random.default_rng(0).normal(size=(20, 8))), path)
+
+    matching = ReducedEmbeddingProvider(StubEmbeddingProvider(8), path, method="random", dimension=4)
+    assert len(asyncio.run(matching.embed(["cap rate"]))[0]) == 4
+
+    for method, dimension in [("pca", 4), ("random", 6)]:
+        mismatched = ReducedEmbeddingProvider(StubEmbeddingProvider(8), path, method=method, dimension=dimension)
+        with pytest.raises(ValueError, match="refit"):
+            asyncio.run(mismatched.embed(["cap rate"]))
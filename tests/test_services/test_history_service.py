@@ -0,0 +1,62 @@
+"""Test conversation history compaction."""
+import asyncio
+
+from app.services.history_service import ConversationHistoryManager
+from app.services.llm_service import Message
+
+class FakeSummaryLLMService:
+    """LLM service that records summary prompts and answers with a numbered summary."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_completion(self, messages, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return {"choices": [{"message": {"content": f"summary {len(self.prompts)}"}}]}
+
+def conversation(turns):
+    """Build a conversation with the given number of user/assistant turns."""
+    messages = []
+    for i in range(turns):
+        messages.append(Message(role="user", content=f"question {i}"))
+        messages.append(Message(role="assistant", content=f"answer {i}"))
+    return messages
+
+def test_short_history_is_unchanged():
+    """Conversations within the turn limit and budget are sent as they are."""
+    history_manager = ConversationHistoryManager(max_turns=3)
+    messages = conversation(3)
+    assert asyncio.run(history_manager.compact(messages, FakeSummaryLLMService())) == messages
+
+def test_older_turns_are_summarized_incrementally():
+    """Older turns become a rolling summary that only covers new messages on later turns."""
+    history_manager = ConversationHistoryManager(max_turns=2)
+    llm_service = FakeSummaryLLMService()
+
+    compacted = asyncio.run(history_manager.compact(conversation(4), llm_service, "chat-1"))
+    assert compacted[0].role == "system" and "summary 1" in compacted[0].content
+    assert [message.content for message in compacted[1:]] == ["question 2", "answer 2", "question 3", "answer 3"]
+
+    compacted = asyncio.run(history_manager.compact(conversation(5), llm_service, "chat-1"))
+    assert "summary 2" in compacted[0].content
+    assert "summary 1" in llm_service.prompts[1]
+    assert "question 0" not in llm_service.prompts[1] and "question 2" in llm_service.prompts[1]
+
+    asyncio.run(history_manager.compact(conversation(5), llm_service, "chat-1"))
+    assert len(llm_service.prompts) == 2
+
+def test_history_is_capped_to_token_budget():
+    """The oldest verbatim turns are summarized when the history exceeds the budget."""
+    history_manager = ConversationHistoryManager(max_turns=4, token_budget=60, summary_max_tokens=20)
+    llm_service = FakeSummaryLLMService()
+    messages = conversation(2) + [Message(role="user", content="x" * 150)]
+
+    compacted = asyncio.run(history_manager.compact(messages, llm_service))
+    assert "summary 1" in compacted[0].content
+    assert [message.content for message in compacted[1:]] == ["x" * 150]
+    assert "question 0" in llm_service.prompts[0] and "answer 1" in llm_service.prompts[0]
+
+def test_zero_max_turns_keeps_only_the_last_turn():
+    history_manager = ConversationHistoryManager(max_turns=0)
+    compacted = asyncio.run(history_manager.compact(conversation(3), FakeSummaryLLMService()))
+    assert [message.content for message in compacted[1:]] == ["question 2", "answer 2"]
@@ -0,0 +1,169 @@
+"""Test the adaptive concurrency limiter, circuit breaker and LLM retries."""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.core.config import settings
+from app.services import llm_resilience
+from app.services.llm_resilience import AdaptiveConcurrencyLimiter, CircuitBreaker, RequestHedger
+from app.services.llm_service import LLMCircuitOpenError, LLMDeadlineExceeded, LLMService, LLMServiceError, Message
+
+def rate_limit_error():
+    """Build the error the OpenAI client raises for a 429 response."""
+    response = httpx.Response(429, request=httpx.Request("POST", "https://llm.example.com"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+class FakeResponse:
+    def model_dump(self):
+        return {"choices": [{"message": {"role": "assistant", "content": "ok"}}]}
+
+@pytest.fixture
+def llm_service(monkeypatch):
+    """LLM service with fast retries and its API call replaced per test."""
+    monkeypatch.setattr(settings, "NEBIUS_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    return LLMService()
+
+def test_limiter_increases_additively_and_halves_on_overload():
+    """Successes add about one slot per window; overload halves the limit once per burst."""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=10)
+
+    async def main():
+        for _ in range(5):
+            limiter.release(await limiter.acquire())
+        assert int(limiter.limit) == 5
+
+        starts = [await limiter.acquire() for _ in range(5)]
+        for started_at in starts:
+            limiter.release(started_at, overloaded=True)
+
+    asyncio.run(main())
+    assert int(limiter.limit) == 2
+    assert limiter.decreases == 1
+
+def test_limiter_queues_callers_beyond_the_limit():
+    """Callers wait for a slot and time out if none frees up."""
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+
+    async def main():
+        started_at = await limiter.acquire()
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.acquire(timeout=0.01)
+
+        waiter = asyncio.ensure_future(limiter.acquire(timeout=1))
+        await asyncio.sleep(0)
+        limiter.release(started_at)
+        limiter.release(await waiter)
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0 and limiter.rejected == 1
+
+def test_retries_rate_limit_errors(llm_service):
+    """Retryable errors are retried with backoff until the call succeeds."""
+    attempts = []
+
+    async def create(**request):
+        attempts.append(request)
+        if len(attempts) < 3:
+            raise rate_limit_error()
+        return FakeResponse()
+
+    llm_service.client.chat.completions.create = create
+    response = asyncio.run(llm_service.generate_completion([Message(role="user", content="hi")]))
+
+    assert response["choices"][0]["message"]["content"] == "ok"
+    assert len(attempts) == 3 and llm_service.retries == 2
+
+def test_raises_after_non_retryable_error_and_deadline(llm_service):
+    """Failures raise instead of returning an error payload."""
+    async def fail(**request):
+        raise ValueError("bad request")
+
+    async def slow(**request):
+        await asyncio.sleep(request["timeout"])
+        raise openai.APITimeoutError(request=httpx.Request("POST", "https://llm.example.com"))
+
+    messages = [Message(role="user", content="hi")]
+
+    llm_service.client.chat.completions.create = fail
+    with pytest.raises(LLMServiceError):
+        asyncio.run(llm_service.generate_completion(messages))
+
+    llm_service.client.chat.completions.create = slow
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(llm_service.generate_completion(messages, timeout=0.05))
+
+def test_hedger_sends_duplicate_for_stragglers_within_budget():
+    """A call slower than the latency percentile is hedged and the faster copy wins."""
+    hedger = RequestHedger(budget_ratio=0.5, min_samples=3)
+    delays = iter([0.001, 0.001, 0.001, 1.0, 0.001])
+    cancelled = []
+
+    async def call():
+        try:
+            await asyncio.sleep(next(delays))
+            return "ok"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        for _ in range(4):
+            assert await hedger.run(call) == "ok"
+
+    asyncio.run(main())
+    stats = hedger.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert cancelled == [True]
+
+def test_hedger_respects_budget():
+    """No hedge is sent once the budget is spent."""
+    hedger = RequestHedger(budget_ratio=0.0, min_samples=0)
+
+    async def call():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    assert asyncio.run(hedger.run(call)) == "ok"
+    assert hedger.hedges == 0
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    """Consecutive failures open the circuit; one trial call after the timeout closes it."""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+    now = [100.0]
+    monkeypatch.setattr(llm_resilience.time, "monotonic", lambda: now[0])
+
+    for _ in range(2):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow_request()
+
+    now[0] += 10
+    assert breaker.allow_request() and not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] += 10
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 0, "opened": 2, "rejected": 2}
+
+def test_open_circuit_fails_fast(llm_service):
+    """Calls are rejected without reaching the backend while the circuit is open."""
+    attempts = []
+
+    async def fail(**request):
+        attempts.append(request)
+        raise rate_limit_error()
+
+    llm_service.client.chat.completions.create = fail
+    llm_service.circuit_breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+
+    with pytest.raises(LLMCircuitOpenError):
+        asyncio.run(llm_service.generate_completion([Message(role="user", content="hi")]))
+    assert llm_service.circuit_breaker.state == "open"
+    assert len(attempts) == 1
@@ -0,0 +1,35 @@
+"""Test the local embedding model."""
+import numpy as np
+
+from app.services.local_embedding_service import LocalEmbeddingModel
+
+CORPUS = [
+    "Residential appraisal of a single family home with four bedrooms",
+    "Commercial retail property income approach using a seven percent cap rate",
+    "Market analysis shows residential prices rising over the last year",
+    "Cost approach with land value and depreciation of the improvements",
+    "Comparable sales for single family homes near the subject property",
+]
+
+def test_embed_is_deterministic_and_normalized():
+    """Unfitted embeddings are deterministic unit vectors of the configured dimension."""
+    model = LocalEmbeddingModel(dimension=64)
+    first = model.embed(CORPUS)
+    second = LocalEmbeddingModel(dimension=64).embed(CORPUS)
+
+    assert first.shape == (len(CORPUS), 64)
+    assert np.allclose(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-5)
+
+def test_fitted_model_ranks_related_text_first(tmp_path):
+    """A fitted model ranks lexically related texts above unrelated ones and survives a save/load."""
+    model = LocalEmbeddingModel(dimension=64).fit(CORPUS)
+    path = str(tmp_path / "model.joblib")
+    model.save(path)
+    loaded = LocalEmbeddingModel.load(path)
+
+    query = loaded.embed(["single family home comparable sales"])[0]
+    scores = loaded.embed(CORPUS) @ query
+
+    assert loaded.is_fitted
+    assert int(np.argmax(scores)) in (0, 4)
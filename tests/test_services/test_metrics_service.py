@@ -0,0 +1,40 @@
+"""Test the Prometheus metrics and LLM call instrumentation."""
+from app.services.metrics_service import LLMMetrics, MetricsRegistry, current_endpoint
+
+def test_render_prometheus_text_format():
+    """Counters and cumulative histogram buckets are rendered with their labels."""
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests.", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.5, 1))
+
+    requests.inc(endpoint='/a"b')
+    requests.inc(2, endpoint='/a"b')
+    for value in (0.2, 0.7, 3):
+        latency.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="/a\\"b"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.5"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 3.9",
+        "latency_seconds_count 3"
+    ]
+
+def test_llm_metrics_label_endpoint_and_estimate_cost():
+    """Usage is split into prompt and completion tokens and priced per model."""
+    metrics = LLMMetrics(MetricsRegistry(), prices={"big": [1.0, 2.0]})
+    token = current_endpoint.set("/api/v1/agent")
+    try:
+        metrics.record_usage("big", {"prompt_tokens": 1000, "completion_tokens": 500})
+        metrics.record_request("big", 0.3, cache="hit")
+    finally:
+        current_endpoint.reset(token)
+
+    assert metrics.tokens.get(model="big", endpoint="/api/v1/agent", type="completion") == 500
+    assert metrics.cost.get(model="big", endpoint="/api/v1/agent") == 0.002
+    assert metrics.requests.get(model="big", endpoint="/api/v1/agent", status="success", cache="hit") == 1
@@ -0,0 +1,41 @@
+"""Test routing of simple requests to the small model."""
+from app.core.config import settings
+from app.services.model_router import ModelRouter
+
+def make_router():
+    return ModelRouter(
+        small_model="small",
+        large_model="large",
+        simple_patterns=settings.ROUTER_SIMPLE_PATTERNS,
+        complex_keywords=settings.ROUTER_COMPLEX_KEYWORDS,
+        simple_max_chars=settings.ROUTER_SIMPLE_MAX_CHARS
+    )
+
+def test_classifies_simple_and_complex_turns():
+    """Greetings, status lookups and formatting are simple; appraisal reasoning is not."""
+    router = make_router()
+
+    for text in ["Hello!", "thanks", "What's the status of project 12?", "Rewrite that as bullet points"]:
+        assert router.classify(text) == "simple", text
+
+    for text in [
+        "Hi, can you estimate the value of 12 Oak St?",
+        "Run a sales comparison with three comps",
+        "Which zoning rules apply to this lot?",
+        "Format " + "x" * 300
+    ]:
+        assert router.classify(text) == "complex", text
+
+def test_routes_on_latest_user_message():
+    """The latest user message decides the model, and routes are counted."""
+    router = make_router()
+    messages = [
+        {"role": "system", "content": "You are an appraiser."},
+        {"role": "user", "content": "Explain the cap rate for this property"},
+        {"role": "assistant", "content": "..."},
+        {"role": "user", "content": "Thanks!"}
+    ]
+
+    assert router.route(messages) == ("small", "simple")
+    assert router.route(messages[:2]) == ("large", "complex")
+    assert router.stats() == {"small": 1, "large": 1}
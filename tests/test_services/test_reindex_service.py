@@ -0,0 +1,126 @@
+"""Test the resumable embedding reindex job."""
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.models.rag import Document, DocumentChunk
+from app.services import rag_service as rag_service_module
+from app.services.embedding_service import StubEmbeddingProvider
+from app.services.rag_service import RAGService
+from app.services.reindex_service import ReindexService
+
+class FailingOnceProvider(StubEmbeddingProvider):
+    """Stub provider whose second batch fails once, simulating a crash mid-job."""
+
+    def __init__(self, dimension: int):
+        super().__init__(dimension)
+        self.calls = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        if self.calls == 2:
+            raise RuntimeError("upstream error")
+        return await super().embed(texts)
+
+def test_reindex_resumes_from_checkpoint_and_switches(db_session):
+    """A failed job resumes after its last checkpoint and only then replaces the live vectors."""
+    document = Document(title="Guide", content="text", document_type="regulation")
+    db_session.add(document)
+    db_session.commit()
+    for i in range(5):
+        db_session.add(DocumentChunk(
+            document_id=document.id, chunk_index=i, content=f"chunk {i}",
+            embedding=[1.0, 0.0], embedding_model="old"
+        ))
+    db_session.commit()
+
+    provider = FailingOnceProvider(dimension=4)
+    reindex_service = ReindexService(db_session, provider)
+
+    job = asyncio.run(reindex_service.run(reindex_service.start_job(), batch_size=2))
+    assert job.status == "failed"
+    assert job.processed_chunks == 2
+    assert {chunk.embedding_model for chunk in db_session.query(DocumentChunk)} == {"old"}
+
+    job = asyncio.run(reindex_service.run(reindex_service.start_job(), batch_size=2))
+    assert job.status == "completed"
+    assert job.processed_chunks == 5
+    assert provider.calls == 4
+
+    chunks = db_session.query(DocumentChunk).all()
+    assert {chunk.embedding_model for chunk in chunks} == {provider.model_id}
+    assert all(len(chunk.embedding) == 4 and chunk.shadow_embedding is None for chunk in chunks)
+
+def test_active_job_is_judged_by_its_last_checkpoint(db_session):
+    """A running job is active until it has not checkpointed for STALE_JOB_TIMEOUT."""
+    reindex_service = ReindexService(db_session, StubEmbeddingProvider(dimension=4))
+    job = reindex_service.start_job()
+    assert reindex_service.get_active_job().id == job.id
+
+    job.updated_at = datetime.now() - timedelta(minutes=10)
+    db_session.commit()
+    assert reindex_service.get_active_job() is None
+
+def test_search_uses_the_stored_model_until_the_switch(db_session, monkeypatch):
+    """Queries are embedded with the model of the live vectors until a reindex switches them over."""
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    old_provider = StubEmbeddingProvider(dimension=4)
+    document = Document(title="Guide", content="text", document_type="regulation")
+    db_session.add(document)
+    db_session.commit()
+    contents = ["cap rate", "comparable sales", "cost approach"]
+    for i, (content, embedding) in enumerate(zip(contents, asyncio.run(old_provider.embed(contents)))):
+        db_session.add(DocumentChunk(
+            document_id=document.id, chunk_index=i, content=content,
+            embedding=embedding, embedding_model=old_provider.model_id
+        ))
+    # A vector of unknown model is not searched, even with a matching dimension
+    db_session.add(DocumentChunk(document_id=document.id, chunk_index=3, content="cap rate", embedding=[0.5] * 4))
+    db_session.commit()
+
+    new_provider = StubEmbeddingProvider(dimension=8)
+    rag_service = RAGService(db_session, embedding_provider=new_provider)
+
+    # Keyword search would only find the one chunk mentioning "sales"
+    results = asyncio.run(rag_service.search_documents("comparable sales"))
+    assert len(results) == 3
+    assert results[0]["content"] == "comparable sales" and abs(results[0]["similarity"] - 1.0) < 1e-5
+
+    reindex_service = ReindexService(db_session, new_provider)
+    job = asyncio.run(reindex_service.run(reindex_service.start_job()))
+    assert job.status == "completed"
+    assert reindex_service.get_active_model_id() == new_provider.model_id
+
+    results = asyncio.run(rag_service.search_documents("comparable sales"))
+    assert len(results) == 4
+    assert results[0]["content"] == "comparable sales" and abs(results[0]["similarity"] - 1.0) < 1e-5
+
+def test_fit_runs_off_the_event_loop_and_leaves_the_live_vectors(db_session, monkeypatch):
+    """The model is fitted on a worker thread; re-embedding is left to a reindex job."""
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "local")
+    document = Document(title="Guide", content="text", document_type="regulation")
+    db_session.add(document)
+    db_session.commit()
+    db_session.add(DocumentChunk(
+        document_id=document.id, chunk_index=0, content="cap rate",
+        embedding=[1.0, 0.0], embedding_model="old"
+    ))
+    db_session.commit()
+
+    fitted_on = {}
+
+    def fake_fit(texts, dimension):
+        fitted_on["texts"] = texts
+        fitted_on["thread"] = threading.current_thread()
+        return SimpleNamespace(fitted_documents=len(texts), svd=SimpleNamespace(n_components=1), dimension=dimension)
+
+    monkeypatch.setattr(rag_service_module, "fit_local_embedding_model", fake_fit)
+    rag_service = RAGService(db_session, embedding_provider=StubEmbeddingProvider(dimension=4))
+
+    stats = asyncio.run(rag_service.fit_embedding_model())
+    assert stats["fitted_documents"] == 1
+    assert fitted_on["texts"] == ["cap rate"]
+    assert fitted_on["thread"] is not threading.main_thread()
+    assert db_session.query(DocumentChunk).one().embedding_model == "old"
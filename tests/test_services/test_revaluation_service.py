@@ -0,0 +1,88 @@
+"""Test portfolio revaluations with resumable CSV output."""
+import asyncio
+import csv
+
+import pytest
+
+from app.core.config import settings
+from app.services import revaluation_service
+from app.services.comparable_engine import ComparableEngine
+from app.services.revaluation_service import (
+    PortfolioRevaluationRunner,
+    RevaluationRunningError,
+    get_revaluation_status,
+    select_comparables,
+    start_revaluation
+)
+from app.services.spatial_index import SpatialIndex
+
+class PortfolioPropertyService:
+    """Property data service that fails the properties listed in `missing` and counts comparable lookups."""
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.comparable_lookups = 0
+        self.sales_index = SpatialIndex()
+
+    async def get_property_details(self, property_id):
+        if property_id in self.missing:
+            raise RuntimeError("property not found")
+        return {"type": "residential", "address": {"city": "Austin"}, "details": {"size": 2000, "year_built": 2000}, "valuation": {"estimated_value": 500000}}
+
+    async def get_comparable_properties(self, location, property_type, **kwargs):
+        self.comparable_lookups += 1
+        return [{"price": 400000, "size": 1800, "price_per_sqft": 222}]
+
+def test_revaluation_resumes_and_retries_failed_properties(tmp_path):
+    """Chunks are valued in worker processes; valued properties are skipped on rerun."""
+    portfolio = [{"property_id": f"p{i}"} for i in range(7)]
+    output_path = str(tmp_path / "portfolio.csv")
+
+    property_service = PortfolioPropertyService(missing={"p5"})
+    runner = PortfolioRevaluationRunner(property_service, chunk_size=3, workers=2)
+    counts = asyncio.run(runner.run(portfolio, output_path))
+    assert counts == {"total": 7, "skipped": 0, "completed": 6, "failed": 1}
+    # One comparable lookup for the whole portfolio's city and type
+    assert property_service.comparable_lookups == 1
+
+    counts = asyncio.run(PortfolioRevaluationRunner(PortfolioPropertyService(), chunk_size=3, workers=2).run(portfolio, output_path))
+    assert counts == {"total": 7, "skipped": 6, "completed": 1, "failed": 0}
+
+    with open(output_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row["property_id"] for row in rows) == [f"p{i}" for i in range(7)]
+    assert {float(row["reconciled"]) for row in rows} == {416080.0}
+
+def test_resumed_revaluations_keep_their_method_and_chunk_size(tmp_path, monkeypatch):
+    """A revaluation resumes with its stored options and refuses a new portfolio while running."""
+    monkeypatch.setattr(settings, "REVALUATION_DIR", str(tmp_path))
+    portfolio = [{"property_id": f"p{i}"} for i in range(3)]
+
+    async def run():
+        start_revaluation("book", PortfolioPropertyService(), properties=portfolio, method="cost", chunk_size=2, workers=1)
+        with pytest.raises(RevaluationRunningError):
+            start_revaluation("book", PortfolioPropertyService(), properties=portfolio)
+        await revaluation_service._revaluation_tasks["book"]
+
+        start_revaluation("book", PortfolioPropertyService(), workers=1)
+        runner = revaluation_service._revaluation_runners["book"]
+        assert (runner.method, runner.chunk_size) == ("cost", 2)
+        revaluation_service._revaluation_tasks["book"].cancel()
+        await asyncio.sleep(0)
+        assert get_revaluation_status("book")["status"] == "cancelled"
+
+    asyncio.run(run())
+
+def test_comparables_are_picked_by_similarity_from_shared_pools():
+    """Each property gets the candidates of its pool most similar to it, never itself."""
+    engine = ComparableEngine({"default": {"size": 1.0}})
+    pool = [{"id": f"c{size}", "size": size, "price": size * 200} for size in range(1000, 3100, 100)]
+    subjects = [
+        {"property_id": "small", "type": "residential", "details": {"size": 1200}},
+        {"property_id": "c2500", "type": "residential", "details": {"size": 2500}}
+    ]
+
+    small, large = select_comparables(subjects, [0, 0], [pool], engine)
+    assert sorted(comp["size"] for comp in small) == [1000, 1100, 1200, 1300, 1400]
+    assert "c2500" not in [comp["id"] for comp in large]
+    assert [comp["size"] for comp in large][:4] == [2400, 2600, 2300, 2700]
@@ -0,0 +1,47 @@
+"""Test coalescing of identical in-flight requests."""
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+def test_concurrent_callers_share_one_call():
+    """Concurrent calls with the same key run once; later calls run again."""
+    single_flight = SingleFlight()
+    calls = []
+
+    async def request(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    async def main():
+        results = await asyncio.gather(
+            *[single_flight.do("a", lambda: request("a")) for _ in range(5)],
+            single_flight.do("b", lambda: request("b"))
+        )
+        assert single_flight.in_flight == 0
+        await single_flight.do("a", lambda: request("a"))
+        return results
+
+    results = asyncio.run(main())
+    assert results[:5] == [{"key": "a"}] * 5
+    # Each caller gets its own copy of the shared result
+    assert len({id(result) for result in results[:5]}) == 5
+    assert calls == ["a", "b", "a"]
+    assert single_flight.stats() == {"calls": 3, "coalesced": 4, "in_flight": 0}
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    """A caller giving up leaves the shared call running for the others."""
+    single_flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.do("a", request))
+        second = asyncio.ensure_future(single_flight.do("a", request))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,150 @@
+"""Test the spatial index of past sales used for comparable selection."""
+import random
+import threading
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from app.services import spatial_index
+from app.services.property_data_service import PropertyDataService
+from app.services.spatial_index import SpatialIndex, haversine_miles
+
+def make_sales(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "type": "residential" if i % 2 else "commercial",
+            "latitude": 30.2 + rng.random() * 0.2,
+            "longitude": -97.8 + rng.random() * 0.2,
+            "price": rng.randint(200000, 900000),
+            "sale_date": f"20{rng.randint(22, 25)}-{rng.randint(1, 12):02d}-15"
+        }
+        for i in range(count)
+    ]
+
+def brute_force(sales, latitude, longitude, k, radius_miles, since):
+    candidates = [s for s in sales if s["type"] == "residential" and s["sale_date"] >= since]
+    points = np.radians([[s["latitude"], s["longitude"]] for s in candidates])
+    distances = haversine_miles(points, np.radians([latitude, longitude]))
+    return [candidates[i]["id"] for i in np.argsort(distances)[:k] if distances[i] <= radius_miles]
+
+def test_nearest_matches_brute_force_while_adding_incrementally():
+    """Queries see sales in the tree and in the buffer added since its last rebuild."""
+    sales = make_sales(3000)
+    index = SpatialIndex(min_buffer=100)
+    index.add(sales[:2000])
+    # Added one at a time: the last ones stay buffered until enough accumulate
+    for sale in sales[2000:]:
+        index.add([sale])
+    assert index.count() == 3000
+
+    results = index.nearest(30.3, -97.7, "residential", k=8, radius_miles=3, sold_within_months=24, as_of=date(2025, 7, 1))
+    # 24 months of 30.4375 days before 2025-07-01
+    assert [r["id"] for r in results] == brute_force(sales, 30.3, -97.7, 8, 3, "2023-07-01")
+    assert all(r["type"] == "residential" for r in results)
+    assert [r["distance"] for r in results] == sorted(r["distance"] for r in results)
+
+def test_records_without_coordinates_are_skipped():
+    index = SpatialIndex()
+    assert index.add([{"type": "residential", "latitude": None, "longitude": -97.7}]) == 0
+    assert index.nearest(30.3, -97.7, "residential") == []
+
+def test_removed_records_are_not_returned():
+    """Removed records disappear from the tree and the buffer, and are dropped on the next rebuild."""
+    sales = make_sales(400)
+    index = SpatialIndex(min_buffer=100)
+    index.add(sales[:300])
+    index.add(sales[300:350])
+    before = [r["id"] for r in index.nearest(30.3, -97.7, "residential", k=400)]
+    nearest = before[:3]
+
+    # One of the nearest from the tree and one from the buffer
+    buffered = next(s["id"] for s in sales[300:350] if s["type"] == "residential")
+    assert index.remove([nearest[0], buffered, "unknown"]) == 2
+    assert index.count() == 348
+
+    ids = [r["id"] for r in index.nearest(30.3, -97.7, "residential", k=400)]
+    assert ids == [i for i in before if i not in (nearest[0], buffered)]
+
+    index.add(sales[350:])
+    assert index.count() == 398
+    assert nearest[0] not in [r["id"] for r in index.nearest(30.3, -97.7, "residential", k=400)]
+
+def test_records_removed_while_a_tree_is_rebuilt_stay_removed(monkeypatch):
+    """Trees are built on a background thread while records keep being added and removed."""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_ball_tree(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        return BallTree(*args, **kwargs)
+
+    monkeypatch.setattr(spatial_index, "BallTree", slow_ball_tree)
+    sales = make_sales(200)
+    index = SpatialIndex(min_buffer=50)
+    index.add(sales[:100])
+    assert started.wait(5)
+
+    assert index.remove([1]) == 1
+    index.add(sales[100:120])
+    assert 1 not in [r["id"] for r in index.nearest(30.3, -97.7, "residential", k=200)]
+
+    release.set()
+    index.wait()
+    ids = [r["id"] for r in index.nearest(30.3, -97.7, "residential", k=200)]
+    assert sorted(ids) == [s["id"] for s in sales[:120] if s["type"] == "residential" and s["id"] != 1]
+    assert index.count() == 119
+
+def test_a_failed_rebuild_keeps_the_records_and_is_retried(monkeypatch):
+    """Records taken by a rebuild that fails are scanned until a later rebuild succeeds."""
+    failures = []
+
+    def failing_ball_tree(*args, **kwargs):
+        if not failures:
+            failures.append(True)
+            raise MemoryError("out of memory")
+        return BallTree(*args, **kwargs)
+
+    monkeypatch.setattr(spatial_index, "BallTree", failing_ball_tree)
+    sales = make_sales(120)
+    index = SpatialIndex(min_buffer=20, background=False)
+    index.add(sales[:60])
+    assert failures and index.count() == 60
+    assert len(index.nearest(30.3, -97.7, "commercial", k=100)) == 30
+
+    index.add(sales[60:])
+    assert index.count() == 120
+    assert index._types["commercial"].tree is not None
+    assert len(index.nearest(30.3, -97.7, "commercial", k=100)) == 60
+
+def test_properties_without_a_price_are_left_out_of_sales():
+    index = SpatialIndex()
+    index.add(make_sales(10) + [{"id": "p1", "type": "residential", "latitude": 30.3, "longitude": -97.7}])
+    assert index.count("residential") == 6
+    assert index.count("residential", sales_only=True) == 5
+    assert index.nearest(30.3, -97.7, "residential", k=1)[0]["id"] == "p1"
+    assert "p1" not in [r["id"] for r in index.nearest(30.3, -97.7, "residential", sales_only=True)]
+
+def test_stored_properties_are_indexed_by_their_last_sale():
+    """Stored properties with a sale price become comparable sales, with a price per square foot."""
+    def row(row_id, features):
+        return SimpleNamespace(
+            id=row_id, property_type="residential", address="1 Main St", city="Austin",
+            latitude=30.3, longitude=-97.7, square_feet=2000, year_built=2000,
+            bedrooms=3, bathrooms=2, features=features
+        )
+
+    service = PropertyDataService(sales_index=SpatialIndex())
+    indexed = service.index_stored_properties([
+        row(1, {"last_sale_price": 500000, "last_sale_date": "2024-05-01"}),
+        row(2, {"pool": True}),
+        row(3, None)
+    ])
+
+    assert indexed == 1
+    sales = service.sales_index.nearest(30.3, -97.7, "residential", sales_only=True)
+    assert [(sale["id"], sale["price_per_sqft"]) for sale in sales] == [("1", 250.0)]
+
@@ -0,0 +1,112 @@
+"""Test the LLM service against the OpenAI-compatible stub server."""
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.services.llm_service import LLMDeadlineExceeded, LLMService, LLMServiceError, Message
+from app.services.metrics_service import llm_metrics
+from app.tools.tool_registry import get_available_tools
+from stub_llm_server import StubConfig, create_stub_app
+
+@pytest.fixture
+def stub_app():
+    return create_stub_app(StubConfig(latency="fixed:0", token_latency=0, response_tokens=5))
+
+@pytest.fixture
+def llm_service(stub_app, monkeypatch):
+    """LLM service whose client talks to the stub app in-process."""
+    monkeypatch.setattr(settings, "NEBIUS_API_KEY", "stub")
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    llm_service = LLMService()
+    llm_service.client = AsyncOpenAI(
+        api_key="stub",
+        base_url="http://stub/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app)),
+        max_retries=0
+    )
+    return llm_service
+
+def test_completion_tool_call_and_stream(llm_service):
+    """Plain, tool-calling and streamed completions follow the OpenAI format."""
+    async def main():
+        response = await llm_service.generate_completion([Message(role="user", content="Hello there")])
+        assert response["choices"][0]["message"]["content"].startswith("Stub response to: Hello there")
+
+        response = await llm_service.generate_completion(
+            [Message(role="user", content="Market trends in Austin")],
+            tools=get_available_tools(["market_analysis"])
+        )
+        tool_call = response["choices"][0]["message"]["tool_calls"][0]
+        assert tool_call["function"]["name"] == "market_analysis"
+
+        events = [event async for event in llm_service.stream_completion([Message(role="user", content="Hi")])]
+        assert [event["type"] for event in events] == ["token"] * 5 + ["message"]
+        assert events[-1]["message"]["content"] == "".join(event["content"] for event in events[:-1])
+
+    asyncio.run(main())
+
+def test_streams_hold_their_limiter_slot_until_closed(llm_service, stub_app):
+    """A stream counts against the concurrency limit while it is read, not only while it opens."""
+    async def main():
+        stream = llm_service.stream_completion([Message(role="user", content="Hi")])
+        assert (await stream.__anext__())["type"] == "token"
+        assert llm_service.limiter.in_flight == 1
+        await stream.aclose()
+        assert llm_service.limiter.in_flight == 0
+
+    asyncio.run(main())
+
+def test_calls_are_cut_off_at_the_deadline(llm_service, stub_app):
+    stub_app.state.config.latency = "fixed:5"
+
+    async def main():
+        started_at = asyncio.get_running_loop().time()
+        with pytest.raises(LLMDeadlineExceeded):
+            await llm_service.generate_completion([Message(role="user", content="Hello")], timeout=0.2)
+        assert asyncio.get_running_loop().time() - started_at < 1
+        assert llm_service.limiter.in_flight == 0
+
+    asyncio.run(main())
+
+def test_error_injection(llm_service, stub_app):
+    """Injected errors reach the LLM service as failed calls."""
+    stub_app.state.config.error_rate = 1.0
+    stub_app.state.config.error_status_codes = [503]
+
+    with pytest.raises(LLMServiceError):
+        asyncio.run(llm_service.generate_completion([Message(role="user", content="Hello")]))
+    assert stub_app.state.stats["errors"] == 1
+
+def test_calls_are_recorded_in_metrics(llm_service):
+    """Streamed calls record their time to first token and the usage of the final chunk."""
+    model = "metrics-test-model"
+    first_tokens = llm_metrics.time_to_first_token.get_count(model=model, endpoint="unknown")
+
+    async def main():
+        await llm_service.generate_completion([Message(role="user", content="Hello")], model=model)
+        return [event async for event in llm_service.stream_completion([Message(role="user", content="Hi")], model=model)]
+
+    asyncio.run(main())
+    assert llm_metrics.time_to_first_token.get_count(model=model, endpoint="unknown") == first_tokens + 1
+    assert llm_metrics.requests.get(model=model, endpoint="unknown", status="success", cache="miss") == 2
+    assert llm_metrics.tokens.get(model=model, endpoint="unknown", type="completion") == 10
+
+def test_abandoned_streams_are_recorded_in_metrics(llm_service, monkeypatch):
+    """A stream closed early, or without usage reporting, still records an estimate of its tokens."""
+    model = "abandoned-stream-model"
+    monkeypatch.setattr(settings, "LLM_STREAM_INCLUDE_USAGE", False)
+
+    async def main():
+        stream = llm_service.stream_completion([Message(role="user", content="x" * 40)], model=model)
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert llm_metrics.requests.get(model=model, endpoint="unknown", status="cancelled", cache="miss") == 1
+    assert llm_metrics.tokens.get(model=model, endpoint="unknown", type="completion") == 2
+    assert llm_metrics.tokens.get(model=model, endpoint="unknown", type="prompt") == 10
@@ -0,0 +1,54 @@
+"""Test memoization of tool results."""
+import asyncio
+
+from app.tools import tool_executor
+from app.tools.tool_cache import ToolResultCache
+
+def test_cache_canonicalizes_args_and_expires(monkeypatch):
+    """Arguments match regardless of key order; entries expire with their tool's TTL."""
+    now = [0.0]
+    monkeypatch.setattr("app.tools.tool_cache.time.monotonic", lambda: now[0])
+    cache = ToolResultCache(ttls={"market_analysis": 10, "property_search": 1}, max_entries=2)
+
+    cache.put("market_analysis", {"location": "Austin", "property_type": "residential"}, {"trend": 3})
+    cache.put("valuation_calculator", {"property_id": "1"}, {"value": 1})
+    assert cache.get("market_analysis", {"property_type": "residential", "location": "Austin"}) == {"trend": 3}
+    assert cache.get("valuation_calculator", {"property_id": "1"}) is None
+
+    cache.get("market_analysis", {"property_type": "residential", "location": "Austin"})["trend"] = 99
+    cache.put("property_search", {"location": "Austin"}, {"count": 2})
+    now[0] = 5
+    assert cache.get("property_search", {"location": "Austin"}) is None
+    assert cache.get("market_analysis", {"location": "Austin", "property_type": "residential"}) == {"trend": 3}
+
+def test_cache_is_bounded_and_invalidated():
+    """The least recently used result is evicted first; invalidation removes a tool's results."""
+    cache = ToolResultCache(ttls={"property_search": 60}, max_entries=2)
+    for city in ["Austin", "Dallas", "Houston"]:
+        cache.put("property_search", {"location": city}, {"city": city})
+
+    assert cache.get("property_search", {"location": "Austin"}) is None
+    assert cache.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+    assert cache.invalidate("property_search", {"location": "Dallas"}) == 1
+    assert cache.invalidate("property_search") == 1
+    assert cache.stats()["entries"] == 0
+
+def test_execute_tool_reuses_cached_results(monkeypatch):
+    """A repeated tool call is served from the cache until it is invalidated."""
+    calls = []
+
+    async def fake_compliance_checker(args):
+        calls.append(args)
+        return {"report_id": args["report_id"], "overall_compliant": True}
+
+    monkeypatch.setattr(tool_executor, "_execute_compliance_checker", fake_compliance_checker)
+    monkeypatch.setattr(tool_executor, "tool_cache", ToolResultCache(ttls={"compliance_checker": 60}))
+
+    async def main():
+        for _ in range(2):
+            await tool_executor.execute_tool("compliance_checker", '{"report_id": "report_7", "standards": ["USPAP"]}')
+        tool_executor.invalidate_tool_results("compliance_checker")
+        return await tool_executor.execute_tool("compliance_checker", {"standards": ["USPAP"], "report_id": "report_7"})
+
+    assert asyncio.run(main())["overall_compliant"] is True
+    assert len(calls) == 2
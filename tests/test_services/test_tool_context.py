@@ -0,0 +1,46 @@
+"""Test the request-scoped lookup memo shared by tools."""
+import asyncio
+
+from app.tools.tool_context import ToolContext
+from app.tools.tool_executor import execute_tool
+
+class CountingPropertyService:
+    """Property data service that counts its lookups and yields to other tasks while fetching."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_property_details(self, property_id):
+        self.calls.append("details")
+        await asyncio.sleep(0.01)
+        return {"type": "residential", "address": {"city": "Austin"}, "details": {"size": 2000, "year_built": 2000}, "valuation": {"estimated_value": 500000}}
+
+    async def get_comparable_properties(self, location, property_type, **kwargs):
+        self.calls.append("comparables")
+        self.comparable_kwargs = kwargs
+        await asyncio.sleep(0.01)
+        return [{"price": 400000, "size": 1800, "price_per_sqft": 222}]
+
+    async def get_market_trends(self, location, property_type):
+        self.calls.append("trends")
+        await asyncio.sleep(0.01)
+        return {"price_trends": {"last_year": 4.2}, "days_on_market": {"current": 30}}
+
+def test_report_fetches_each_input_once():
+    """The report, its valuation and a later valuation call share one set of lookups."""
+    property_service = CountingPropertyService()
+    context = ToolContext(property_service)
+    args = {"property_id": "7", "include_sections": ["property_description", "valuation", "market_analysis", "reconciliation"]}
+
+    async def main():
+        report = await execute_tool("report_generator", args, context)
+        valuation = await execute_tool("valuation_calculator", {"property_id": "7", "method": "sales_comparison"}, context)
+        return report, valuation
+
+    report, valuation = asyncio.run(main())
+    assert sorted(property_service.calls) == ["comparables", "details", "trends"]
+    assert report["sections"]["reconciliation"]["final_value"] > 0
+    assert report["sections"]["market_analysis"]["data"]["price_trends"]["last_year"] == 4.2
+    assert valuation["valuations"]["sales_comparison"] == report["sections"]["valuation"]["data"]["sales_comparison"]
+    # Comparables are ranked by similarity to the property being valued
+    assert property_service.comparable_kwargs["subject"]["details"]["size"] == 2000
@@ -0,0 +1,33 @@
+"""Test the vectorized valuation engine."""
+import pytest
+
+from app.services.valuation_engine import value_properties
+
+HOUSE = {"type": "residential", "details": {"size": 2000, "year_built": 2000}, "valuation": {"estimated_value": 500000}}
+OFFICE = {
+    "type": "commercial",
+    "details": {"size": 10000, "year_built": 2015},
+    "valuation": {
+        "estimated_value": 1000000,
+        "income": {"annual_rent": 500000, "occupancy_rate": 0.9, "expenses": 100000, "cap_rate": 0.07}
+    }
+}
+
+def test_values_a_batch_by_every_approach():
+    """Each property is valued by the approaches that apply to it and reconciled by its type's weights."""
+    comparables = [[{"price": 400000, "size": 1800, "price_per_sqft": 222}], []]
+
+    house, office = value_properties([HOUSE, OFFICE], comparables)
+
+    assert house == {"sales_comparison": 444400.0, "cost": 350000.0, "reconciled": 416080.0}
+    # Without comparables the sales comparison value is 0 and left out of the reconciliation
+    assert office == {"sales_comparison": 0.0, "cost": 2700000.0, "income": 5000000.0, "reconciled": 4342857.14}
+
+def test_single_method():
+    """A single approach needs no comparables unless it is the sales comparison."""
+    assert value_properties([HOUSE, OFFICE], method="income") == [{}, {"income": 5000000.0}]
+
+    with pytest.raises(ValueError):
+        value_properties([HOUSE], method="sales_comparison")
+    with pytest.raises(ValueError):
+        value_properties([HOUSE], method="auction")